@@ -0,0 +1,295 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+from fastapi.responses import JSONResponse
+from . import principal_cache
+from .client_address import client_address
+from .db_pool import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+# Admission control in front of every API route, so one client cannot starve the rest.
+# A pure ASGI middleware sorts each request into a route class: auth (/v1/auth/*), submit (writes
+# to /api/forms and /v1/form-data) or list (reads from them); /internal, /metrics, / and the docs
+# are never limited. Then:
+# - at most ADMISSION_MAX_CONCURRENT requests run at once, by default the database pool's size
+#   plus overflow; ADMISSION_MAX_QUEUE more wait up to ADMISSION_QUEUE_TIMEOUT_SECONDS for a slot,
+#   and anything beyond that is shed with 503 and Retry-After instead of queueing on the pool.
+# - per-client limits: a token bucket per route class, RATE_LIMIT_<CLASS>="<requests per second>/
+#   <burst>", and ADMISSION_MAX_PER_CLIENT slots and queue places per client, so a client firing in
+#   parallel cannot fill the queue ahead of everyone else. Beyond them a client gets 429 with
+#   Retry-After. Login and list ship with loose buckets (5/50 and 50/500) that stop a looping client
+#   but leave room for a depot behind one NAT address, which is one client until its users log in;
+#   submit and the per-client cap are off ("0") so offline syncs are never refused. Size them from
+#   /internal/admission (see README.md).
+#   The client is the user when their bearer token is in the principal cache (verified before), so
+#   made-up tokens cannot mint fresh buckets, otherwise its address (app/client_address.py,
+#   the same one read-your-writes uses).
+# Buckets and slots are per process, so with N workers a client gets up to N times its rate.
+# List page sizes are capped separately, by `le=MAX_LIST_LIMIT` on the routes' limit parameter.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "0"))  # 0: no per-client cap
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(ADMISSION_MAX_CONCURRENT * 4)))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "0.5"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "100000"))  # most buckets kept per route class
+ADMISSION_RETRY_AFTER_SECONDS = 1
+MAX_LIST_LIMIT = int(os.getenv("MAX_LIST_LIMIT", "1000"))
+
+AUTH, SUBMIT, LIST = "auth", "submit", "list"
+
+def _rate_limit(route_class: str, default: str) -> Optional[Tuple[float, float]]:
+    """(requests per second, burst) from RATE_LIMIT_<CLASS>, None when the class is unlimited"""
+    value = os.getenv(f"RATE_LIMIT_{route_class.upper()}", default).strip()
+    rate, _, burst = value.partition("/")
+    rate = float(rate or 0)
+    if rate <= 0:
+        return None
+    return rate, max(float(burst or rate), 1.0)
+
+RATE_LIMITS = {
+    AUTH: _rate_limit(AUTH, "5/50"),
+    SUBMIT: _rate_limit(SUBMIT, "0"),
+    LIST: _rate_limit(LIST, "50/500"),
+}
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Route class of a request, None for routes that are never limited"""
+    if path.startswith("/v1/auth/"):
+        return AUTH
+    if path.startswith("/api/forms") or path.startswith("/v1/form-data"):
+        return LIST if method in ("GET", "HEAD") else SUBMIT
+    return None
+
+def client_key(scope) -> str:
+    """Bucket key of a request: the cached user behind its bearer token, else its client address"""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            user = principal_cache.get(token.strip()) if scheme.lower() == "bearer" and token else None
+            if user is not None:
+                return f"user:{user.id}"
+            break
+    return f"client:{client_address(scope) or 'unknown'}"
+
+_lock = threading.Lock()
+# (route class, client key) -> [tokens, monotonic time of the last refill], least recently used first
+_buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+_bucket_counts: Dict[str, int] = {route_class: 0 for route_class in RATE_LIMITS}
+_stats = {
+    route_class: {"admitted": 0, "rate_limited": 0} for route_class in RATE_LIMITS
+}
+_slot_stats = {"queued": 0, "shed": 0, "queue_wait_seconds": 0.0, "max_active": 0, "over_client_limit": 0}
+# client key -> its requests holding or waiting for a slot
+_in_flight: Dict[str, int] = {}
+
+def take(route_class: str, key: str) -> Optional[float]:
+    """Spend one token of the client's bucket; None if allowed, else seconds until a token is back"""
+    limit = RATE_LIMITS.get(route_class)
+    if limit is None:
+        return None
+    rate, burst = limit
+    now = time.monotonic()
+    with _lock:
+        bucket = _buckets.get((route_class, key))
+        if bucket is None:
+            bucket = _buckets[(route_class, key)] = [burst, now]
+            _bucket_counts[route_class] += 1
+            if _bucket_counts[route_class] > ADMISSION_MAX_CLIENTS:
+                _evict(route_class)
+        else:
+            _buckets.move_to_end((route_class, key))
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            _stats[route_class]["admitted"] += 1
+            return None
+        _stats[route_class]["rate_limited"] += 1
+        return (1 - bucket[0]) / rate
+
+def enter(key: str) -> bool:
+    """Count a request of the client as in flight; False when it already has ADMISSION_MAX_PER_CLIENT"""
+    with _lock:
+        count = _in_flight.get(key, 0)
+        if 0 < ADMISSION_MAX_PER_CLIENT <= count:
+            _slot_stats["over_client_limit"] += 1
+            return False
+        _in_flight[key] = count + 1
+        return True
+
+def leave(key: str):
+    with _lock:
+        count = _in_flight.pop(key) - 1
+        if count:
+            _in_flight[key] = count
+
+def _evict(route_class: str):
+    # The least recently seen client of the class; a bucket idle that long has mostly refilled anyway
+    for bucket_key in _buckets:
+        if bucket_key[0] == route_class:
+            del _buckets[bucket_key]
+            _bucket_counts[route_class] -= 1
+            return
+
+class ConcurrencyLimiter:
+    """At most `limit` holders at once, a bounded FIFO of waiters, and waits that give up after a timeout"""
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting for one if needed; False when the queue is full or the wait timed out"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue or self.timeout <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter], timeout=self.timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)  # the client went away while waiting
+            raise
+        if waiter.done():
+            return True  # release() handed its slot over
+        self._abandon(waiter)
+        return False
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            self.release()  # a slot was handed over meanwhile; pass it on
+        else:
+            self._waiters.remove(waiter)
+            waiter.cancel()
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter, so nobody can overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+limiter = ConcurrencyLimiter(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_SECONDS)
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the global concurrency limit and the opt-in per-client limits"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route = route_class(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = client_key(scope)
+        retry_after = take(route, key)
+        if retry_after is None and not enter(key):
+            retry_after = ADMISSION_RETRY_AFTER_SECONDS
+        if retry_after is not None:
+            await _rejection(429, "Too many requests, please slow down", retry_after)(scope, receive, send)
+            return
+
+        try:
+            await self._admit(scope, receive, send)
+        finally:
+            leave(key)
+
+    async def _admit(self, scope, receive, send):
+        started = time.perf_counter()
+        if not await limiter.acquire():
+            with _lock:
+                _slot_stats["shed"] += 1
+            await _rejection(503, "Server is busy, please retry shortly", ADMISSION_RETRY_AFTER_SECONDS)(scope, receive, send)
+            return
+        waited = time.perf_counter() - started
+        with _lock:
+            _slot_stats["max_active"] = max(_slot_stats["max_active"], limiter.active)
+            if waited > 0.0005:
+                _slot_stats["queued"] += 1
+                _slot_stats["queue_wait_seconds"] += waited
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+def bucket_state(route_class: str, key: str, now: float) -> Optional[dict]:
+    limit = RATE_LIMITS.get(route_class)
+    bucket = _buckets.get((route_class, key))
+    if limit is None or bucket is None:
+        return None
+    rate, burst = limit
+    tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    return {"route_class": route_class, "client": key, "tokens": round(tokens, 2), "burst": burst,
+            "idle_seconds": round(now - bucket[1], 1)}
+
+def stats(client: Optional[str] = None, top: int = 20) -> dict:
+    """
+    Limits, admitted and rejected counts, concurrency slots, and bucket state: the `top` clients with
+    the fewest tokens left, or every bucket of one client key (e.g. "client:10.0.0.7" or "user:42")
+    """
+    now = time.monotonic()
+    with _lock:
+        if client is not None:
+            buckets = [bucket_state(route_class, client, now) for route_class in RATE_LIMITS]
+        else:
+            buckets = [bucket_state(route_class, key, now) for route_class, key in _buckets]
+            buckets = sorted((b for b in buckets if b is not None), key=lambda b: b["tokens"])[:top]
+        queued = _slot_stats["queued"]
+        result = {
+            "enabled": ADMISSION_ENABLED,
+            "rate_limits": {
+                route_class: {
+                    "per_second": limit[0] if limit else None,
+                    "burst": limit[1] if limit else None,
+                    "clients": _bucket_counts[route_class],
+                    **_stats[route_class],
+                }
+                for route_class, limit in RATE_LIMITS.items()
+            },
+            "concurrency": {
+                "limit": limiter.limit,
+                "active": limiter.active,
+                "queued": limiter.queued,
+                "max_queue": limiter.max_queue,
+                "max_per_client": ADMISSION_MAX_PER_CLIENT or None,
+                "over_client_limit": _slot_stats["over_client_limit"],
+                "clients_in_flight": len(_in_flight),
+                "queue_timeout_seconds": limiter.timeout,
+                "max_active": _slot_stats["max_active"],
+                "waited_for_slot": queued,
+                "avg_queue_wait_ms": round(_slot_stats["queue_wait_seconds"] / queued * 1000, 2) if queued else 0.0,
+                "shed": _slot_stats["shed"],
+            },
+            "max_list_limit": MAX_LIST_LIMIT,
+            "buckets": [b for b in buckets if b is not None],
+        }
+        if client is not None:
+            result["in_flight"] = _in_flight.get(client, 0)
+        return result
@@ -0,0 +1,380 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from typing import Optional, Tuple, List, Dict, Any
+from datetime import date, datetime
+from . import models, schemas, pagination, counters, search, stats, response_cache, hashing, principal_cache
+from .crud import (
+    wheel_specification_filters, bogie_checksheet_filters, wheel_specification_row, bogie_checksheet_row,
+    validate_batch, mark_batch_duplicates, insert_ignoring_duplicates,
+    WHEEL_SPECIFICATION_FIELDS, BOGIE_CHECKSHEET_FIELDS, list_projection
+)
+
+# Async counterparts of app/crud.py for the non-blocking request handlers
+
+# User CRUD operations
+async def get_user_by_phone(db: AsyncSession, phone_number: str):
+    """Get user by phone number"""
+    result = await db.execute(select(models.User).where(models.User.phone_number == phone_number))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    """Create a new user"""
+    # bcrypt is CPU bound, keep it off the event loop
+    hashed_password = await hashing.hash_password(user.password)
+    db_user = models.User(
+        phone_number=user.phone_number,
+        hashed_password=hashed_password
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def set_user_active(db: AsyncSession, user_id: int, is_active: bool):
+    """Activate or deactivate a user and drop their cached tokens"""
+    db_user = await db.get(models.User, user_id)
+    if db_user:
+        db_user.is_active = is_active
+        await db.commit()
+        principal_cache.invalidate_user(user_id)
+    return db_user
+
+# Row counters and opt-in totals
+async def _bump_counters(db: AsyncSession, form_type: str, submitted_by: Optional[str], bucket_date: Optional[str], delta: int = 1):
+    """Adjust the form counters inside the caller's transaction"""
+    response_cache.mark_changed(db, form_type)
+    await db.execute(counters.increment_statement(db.get_bind().dialect.name, form_type, submitted_by, bucket_date, delta))
+
+async def _bump_stats(db: AsyncSession, form_type: str, rows: List[Dict[str, Any]]):
+    """Add created forms (their column values) to the inspection statistics inside the caller's transaction"""
+    stmt = stats.increment_statement(db.get_bind().dialect.name, form_type, rows)
+    if stmt is not None:
+        await db.execute(stmt)
+
+async def _count_total(
+    db: AsyncSession,
+    model,
+    form_type: str,
+    criteria: list,
+    include_total: Optional[str],
+    counted: bool,
+    submitted_by: Optional[str] = None,
+    bucket_date: Optional[str] = None
+):
+    """
+    Total for a list endpoint, only when asked for.
+    include_total is None, "exact" or "estimate"; counted says the filters map onto a counter bucket.
+    Counter totals stay exact across deletes (a trigger subtracts them, see migration 11); the
+    inspection statistics in app/stats.py do not, and drift until --rebuild-stats.
+    """
+    if not include_total:
+        return None
+    if include_total == "estimate" and not criteria:
+        estimate_stmt = counters.estimate_statement(db.get_bind().dialect.name, model.__tablename__)
+        estimate = await db.scalar(estimate_stmt) if estimate_stmt is not None else None
+        if estimate is not None and estimate >= 0:
+            return estimate
+    if counted:
+        return await db.scalar(counters.count_statement(form_type, submitted_by, bucket_date))
+    return await db.scalar(select(func.count()).select_from(model).where(*criteria))
+
+# Form submission CRUD operations
+async def get_form_submission(db: AsyncSession, submission_id: int):
+    """Get form submission by ID"""
+    return await db.get(models.FormSubmission, submission_id)
+
+async def get_form_submissions(db: AsyncSession, skip: int = 0, limit: int = 10, user_id: Optional[int] = None, include_total: Optional[str] = None):
+    """Get form submissions with pagination and optional user filtering"""
+    criteria = []
+    if user_id:
+        criteria.append(models.FormSubmission.user_id == user_id)
+
+    total = await _count_total(
+        db, models.FormSubmission, counters.FORM_SUBMISSION, criteria, include_total,
+        counted=True, submitted_by=str(user_id) if user_id else None
+    )
+    result = await db.execute(select(models.FormSubmission).where(*criteria).offset(skip).limit(limit))
+
+    return {
+        "items": result.scalars().all(),
+        "total": total,
+        "skip": skip,
+        "limit": limit
+    }
+
+async def create_form_submission(db: AsyncSession, form: schemas.FormCreate, user_id: Optional[int] = None):
+    """Create a new form submission"""
+    db_form = models.FormSubmission(
+        name=form.name,
+        phone_number=form.phone_number,
+        email=form.email,
+        address=form.address,
+        user_id=user_id
+    )
+    db.add(db_form)
+    await _bump_counters(db, counters.FORM_SUBMISSION, str(user_id) if user_id else None, None)
+    await db.commit()
+    await db.refresh(db_form)
+    return db_form
+
+async def update_form_submission(db: AsyncSession, submission_id: int, form_update: schemas.FormUpdate):
+    """Update an existing form submission"""
+    db_form = await db.get(models.FormSubmission, submission_id)
+    if db_form:
+        update_data = form_update.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_form, field, value)
+        await db.commit()
+        await db.refresh(db_form)
+    return db_form
+
+async def delete_form_submission(db: AsyncSession, submission_id: int):
+    """Delete a form submission"""
+    db_form = await db.get(models.FormSubmission, submission_id)
+    if db_form:
+        await db.delete(db_form)
+        await _bump_counters(db, counters.FORM_SUBMISSION, str(db_form.user_id) if db_form.user_id else None, None, delta=-1)
+        await db.commit()
+    return db_form
+
+# KPA-Specific CRUD Operations
+
+# Wheel Specification CRUD
+async def create_wheel_specification(db: AsyncSession, wheel_spec: schemas.WheelSpecificationCreate, user_id: Optional[int] = None, commit: bool = True):
+    """
+    Create a new wheel specification form with a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns None if the form number already exists. Pass commit=False to commit later in the caller's transaction.
+    """
+    stmt = insert_ignoring_duplicates(db.get_bind().dialect.name, models.WheelSpecification, returning=models.WheelSpecification)
+    row = wheel_specification_row(wheel_spec, user_id)
+    db_wheel_spec = (await db.scalars(stmt, [row])).first()
+    if db_wheel_spec is None:
+        return None
+    await _bump_counters(db, counters.WHEEL_SPECIFICATION, wheel_spec.submittedBy, wheel_spec.submittedDate)
+    await _bump_stats(db, counters.WHEEL_SPECIFICATION, [row])
+    if commit:
+        await db.commit()
+    return db_wheel_spec
+
+async def create_wheel_specifications_batch(db: AsyncSession, items: List[Any], user_id: Optional[int] = None):
+    """Validate and insert a batch of wheel specifications in one transaction"""
+    forms, results = validate_batch(items, schemas.WheelSpecificationCreate)
+    created = set()
+    if forms:
+        dialect_name = db.get_bind().dialect.name
+        rows = [wheel_specification_row(form, user_id) for form in forms]
+        created = set((await db.scalars(insert_ignoring_duplicates(dialect_name, models.WheelSpecification), rows)).all())
+        if created:
+            response_cache.mark_changed(db, counters.WHEEL_SPECIFICATION)
+            await db.execute(counters.increment_many_statement(
+                dialect_name,
+                counters.WHEEL_SPECIFICATION,
+                [(form.submittedBy, form.submittedDate) for form in forms if form.formNumber in created]
+            ))
+            await _bump_stats(db, counters.WHEEL_SPECIFICATION, [row for row in rows if row["form_number"] in created])
+        await db.commit()
+    return mark_batch_duplicates(results, created)
+
+async def get_wheel_specifications(
+    db: AsyncSession,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[Tuple[datetime, int]] = None,
+    include_total: Optional[str] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    select_fields: Optional[Dict[str, Any]] = None,
+    q: Optional[str] = None
+):
+    """
+    Get wheel specifications with optional filtering, one page after the `after` cursor key or at `skip`.
+    field_filters come from document_filters.parse(), e.g. {"fields": {"wheelGauge": "1600"}}.
+    Items are rows of the select_fields columns, all of WHEEL_SPECIFICATION_FIELDS by default (see list_items()).
+    With q, the page is a ranked search over form numbers and inspector names (see app/search.py).
+    """
+    criteria = wheel_specification_filters(
+        form_number, submitted_by, submitted_date, db.get_bind().dialect.name, field_filters,
+        from_date=from_date, to_date=to_date
+    )
+    projection = list_projection(models.WheelSpecification, select_fields or WHEEL_SPECIFICATION_FIELDS)
+    if q:
+        # Ranked search pages: `after` is a search.decode_cursor() key and skip does not apply
+        result = await search.page(db, counters.WHEEL_SPECIFICATION, q, criteria, projection, limit, after, include_total)
+        return {**result, "skip": 0, "limit": limit}
+
+    total = await _count_total(
+        db, models.WheelSpecification, counters.WHEEL_SPECIFICATION, criteria, include_total,
+        counted=not (form_number or field_filters or from_date or to_date),
+        submitted_by=submitted_by, bucket_date=submitted_date.isoformat() if submitted_date else None
+    )
+    result = await db.execute(
+        select(*projection)
+        .where(*criteria, *pagination.keyset_filters(models.WheelSpecification, after))
+        .order_by(*pagination.keyset_order(models.WheelSpecification))
+        .offset(0 if after else skip)
+        .limit(limit + 1)
+    )
+    items = result.all()
+
+    return {
+        "items": items[:limit],
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": pagination.next_cursor(items, limit)
+    }
+
+async def get_wheel_specification_by_form_number(db: AsyncSession, form_number: str):
+    """Get wheel specification by form number"""
+    result = await db.execute(
+        select(models.WheelSpecification).where(models.WheelSpecification.form_number == form_number)
+    )
+    return result.scalars().first()
+
+# Bogie Checksheet CRUD
+async def create_bogie_checksheet(db: AsyncSession, bogie_checksheet: schemas.BogieChecksheetCreate, user_id: Optional[int] = None, commit: bool = True):
+    """
+    Create a new bogie checksheet form with a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns None if the form number already exists. Pass commit=False to commit later in the caller's transaction.
+    """
+    stmt = insert_ignoring_duplicates(db.get_bind().dialect.name, models.BogieChecksheet, returning=models.BogieChecksheet)
+    row = bogie_checksheet_row(bogie_checksheet, user_id)
+    db_bogie_checksheet = (await db.scalars(stmt, [row])).first()
+    if db_bogie_checksheet is None:
+        return None
+    await _bump_counters(db, counters.BOGIE_CHECKSHEET, bogie_checksheet.inspectionBy, bogie_checksheet.inspectionDate)
+    await _bump_stats(db, counters.BOGIE_CHECKSHEET, [row])
+    if commit:
+        await db.commit()
+    return db_bogie_checksheet
+
+async def create_bogie_checksheets_batch(db: AsyncSession, items: List[Any], user_id: Optional[int] = None):
+    """Validate and insert a batch of bogie checksheets in one transaction"""
+    forms, results = validate_batch(items, schemas.BogieChecksheetCreate)
+    created = set()
+    if forms:
+        dialect_name = db.get_bind().dialect.name
+        rows = [bogie_checksheet_row(form, user_id) for form in forms]
+        created = set((await db.scalars(insert_ignoring_duplicates(dialect_name, models.BogieChecksheet), rows)).all())
+        if created:
+            response_cache.mark_changed(db, counters.BOGIE_CHECKSHEET)
+            await db.execute(counters.increment_many_statement(
+                dialect_name,
+                counters.BOGIE_CHECKSHEET,
+                [(form.inspectionBy, form.inspectionDate) for form in forms if form.formNumber in created]
+            ))
+            await _bump_stats(db, counters.BOGIE_CHECKSHEET, [row for row in rows if row["form_number"] in created])
+        await db.commit()
+    return mark_batch_duplicates(results, created)
+
+async def get_bogie_checksheets(
+    db: AsyncSession,
+    form_number: Optional[str] = None,
+    inspection_by: Optional[str] = None,
+    inspection_date: Optional[date] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[Tuple[datetime, int]] = None,
+    include_total: Optional[str] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    select_fields: Optional[Dict[str, Any]] = None,
+    q: Optional[str] = None
+):
+    """
+    Get bogie checksheets with optional filtering, one page after the `after` cursor key or at `skip`.
+    field_filters come from document_filters.parse(), e.g. {"bogie_details": {"bogieNo": "BG1234"}}.
+    Items are rows of the select_fields columns, all of BOGIE_CHECKSHEET_FIELDS by default (see list_items()).
+    With q, the page is a ranked search over form numbers and inspector names (see app/search.py).
+    """
+    criteria = bogie_checksheet_filters(
+        form_number, inspection_by, inspection_date, db.get_bind().dialect.name, field_filters,
+        from_date=from_date, to_date=to_date
+    )
+    projection = list_projection(models.BogieChecksheet, select_fields or BOGIE_CHECKSHEET_FIELDS)
+    if q:
+        # Ranked search pages: `after` is a search.decode_cursor() key and skip does not apply
+        result = await search.page(db, counters.BOGIE_CHECKSHEET, q, criteria, projection, limit, after, include_total)
+        return {**result, "skip": 0, "limit": limit}
+
+    total = await _count_total(
+        db, models.BogieChecksheet, counters.BOGIE_CHECKSHEET, criteria, include_total,
+        counted=not (form_number or field_filters or from_date or to_date),
+        submitted_by=inspection_by, bucket_date=inspection_date.isoformat() if inspection_date else None
+    )
+    result = await db.execute(
+        select(*projection)
+        .where(*criteria, *pagination.keyset_filters(models.BogieChecksheet, after))
+        .order_by(*pagination.keyset_order(models.BogieChecksheet))
+        .offset(0 if after else skip)
+        .limit(limit + 1)
+    )
+    items = result.all()
+
+    return {
+        "items": items[:limit],
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": pagination.next_cursor(items, limit)
+    }
+
+async def get_bogie_checksheet_by_form_number(db: AsyncSession, form_number: str):
+    """Get bogie checksheet by form number"""
+    result = await db.execute(
+        select(models.BogieChecksheet).where(models.BogieChecksheet.form_number == form_number)
+    )
+    return result.scalars().first()
+
+# Streaming exports
+async def stream_forms(db: AsyncSession, model, columns: list, criteria: list, batch_size: int = 1000):
+    """Yield lists of rows (the given columns, in keyset order) read batch_size at a time from a server-side cursor"""
+    result = await db.stream(
+        select(*columns)
+        .where(*criteria)
+        .order_by(*pagination.keyset_order(model))
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in result.partitions():
+        yield rows
+
+def stream_wheel_specifications(
+    db: AsyncSession,
+    columns: list,
+    form_number: Optional[str] = None,
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    batch_size: int = 1000
+):
+    """Every wheel specification matching the list endpoint's filters, as batches of rows"""
+    criteria = wheel_specification_filters(
+        form_number, submitted_by, submitted_date, db.get_bind().dialect.name, field_filters,
+        from_date=from_date, to_date=to_date
+    )
+    return stream_forms(db, models.WheelSpecification, columns, criteria, batch_size)
+
+def stream_bogie_checksheets(
+    db: AsyncSession,
+    columns: list,
+    form_number: Optional[str] = None,
+    inspection_by: Optional[str] = None,
+    inspection_date: Optional[date] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    batch_size: int = 1000
+):
+    """Every bogie checksheet matching the list endpoint's filters, as batches of rows"""
+    criteria = bogie_checksheet_filters(
+        form_number, inspection_by, inspection_date, db.get_bind().dialect.name, field_filters,
+        from_date=from_date, to_date=to_date
+    )
+    return stream_forms(db, models.BogieChecksheet, columns, criteria, batch_size)
@@ -1,16 +1,15 @@
+import hmac
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from . import models, schemas
-from .database import get_db
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, hashing, principal_cache, read_your_writes
+from .database import get_async_db, AsyncSessionLocal, async_read_session, reads_primary
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-change-in-production")
@@ -20,16 +19,24 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 # Security scheme
 security = HTTPBearer()
 
+# /internal/* and /metrics: callers must send this token (X-Internal-Token or Authorization: Bearer).
+# Without one configured they are served to loopback clients only.
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1"}
+
 def verify_password(plain_password, hashed_password):
     """Verify a plain password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.crypt_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Hash a password for storing in the database"""
-    return pwd_context.hash(password)
+    return hashing.crypt_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
+    # python-jose pulls in its crypto backends; imported on first use to keep start-up fast
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -48,11 +55,49 @@ def authenticate_user(db: Session, phone_number: str, password: str):
         return False
     return user
 
+async def async_authenticate_user(db: AsyncSession, phone_number: str, password: str):
+    """Authenticate a user by phone number and password, verifying on the hashing pool"""
+    result = await db.execute(select(models.User).where(models.User.phone_number == phone_number))
+    user = result.scalars().first()
+    if not user:
+        return False
+    if not await hashing.verify_password(password, user.hashed_password):
+        return False
+    return user
+
+async def rehash_password(user_id: int, old_hash: str, password: str):
+    """
+    Background task: re-hash a password that was stored with outdated parameters.
+    Skipped when the pool is busy (the next login retries) or the password changed meanwhile.
+    """
+    try:
+        new_hash = await hashing.hash_password(password)
+    except hashing.HashingPoolFull:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == user_id, models.User.hashed_password == old_hash)
+            .values(hashed_password=new_hash)
+        )
+        await db.commit()
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get the current authenticated user from JWT token"""
+    """
+    Get the current authenticated user from JWT token.
+    Returns a principal_cache.UserSnapshot; repeat calls with the same token are served from the cache.
+    """
+    started = time.perf_counter()
+    cached_user = principal_cache.get(credentials.credentials)
+    if cached_user is not None:
+        principal_cache.record(hit=True, seconds=time.perf_counter() - started)
+        return cached_user
+
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -67,7 +112,35 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.phone_number == token_data.phone_number).first()
-    if user is None:
+    result = await db.execute(select(models.User).where(models.User.phone_number == token_data.phone_number))
+    user = result.scalars().first()
+    if user is None or not user.is_active:
         raise credentials_exception
-    return user 
\ No newline at end of file
+
+    snapshot = principal_cache.UserSnapshot(id=user.id, phone_number=user.phone_number, is_active=user.is_active)
+    principal_cache.put(credentials.credentials, payload, snapshot)
+    principal_cache.record(hit=False, seconds=time.perf_counter() - started)
+    return snapshot
+
+def require_internal_access(request: Request, x_internal_token: Optional[str] = Header(None)):
+    """Dependency of the internal endpoints, which expose SQL, client addresses and server internals"""
+    if INTERNAL_TOKEN:
+        scheme, _, bearer = request.headers.get("authorization", "").partition(" ")
+        supplied = x_internal_token or (bearer.strip() if scheme.lower() == "bearer" else "")
+        if supplied and hmac.compare_digest(supplied.encode(), INTERNAL_TOKEN.encode()):
+            return
+    elif request.client and request.client.host in LOOPBACK_HOSTS:
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoints need a valid X-Internal-Token")
+
+async def get_user_write_db(request: Request, current_user: principal_cache.UserSnapshot = Depends(get_current_user)):
+    """Async session for a user's writes; the commit opens the read-your-writes window for the user and this client"""
+    async with AsyncSessionLocal() as db:
+        read_your_writes.track(db, read_your_writes.user_key(current_user.id), read_your_writes.client_key(request))
+        yield db
+
+async def get_user_read_db(request: Request, current_user: principal_cache.UserSnapshot = Depends(get_current_user)):
+    """Read-only async session for a user: a replica, unless the user or this client wrote within the window"""
+    primary = reads_primary(read_your_writes.user_key(current_user.id), read_your_writes.client_key(request))
+    async with async_read_session(primary=primary) as db:
+        yield db
@@ -0,0 +1,26 @@
+import os
+from typing import Optional
+
+# Address of the client behind a request, shared by admission control and read-your-writes so
+# both agree on who the client is. It is the peer address, or behind a load balancer the address
+# CLIENT_IP_HEADER (e.g. X-Forwarded-For) names, TRUSTED_PROXIES entries from the right. Only set
+# the header when clients cannot reach the app directly, since they could send any value.
+
+CLIENT_IP_HEADER = os.getenv("CLIENT_IP_HEADER", "").strip().lower().encode("latin-1")
+TRUSTED_PROXIES = max(1, int(os.getenv("TRUSTED_PROXIES", "1")))
+
+def client_address(scope) -> Optional[str]:
+    """Client address of an ASGI scope, None when the server did not report a peer"""
+    if CLIENT_IP_HEADER:
+        forwarded = None
+        for name, value in scope.get("headers", ()):
+            if name == CLIENT_IP_HEADER:
+                forwarded = value
+        if forwarded is not None:
+            # Each trusted proxy appends the address it saw, so count from the right; entries
+            # further left were sent by the client and could be anything
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+            if hops:
+                return hops[max(0, len(hops) - TRUSTED_PROXIES)]
+    client = scope.get("client")
+    return client[0] if client else None
@@ -0,0 +1,100 @@
+import os
+import random
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import BigInteger, String, cast, select, delete, func, literal, text, insert
+from . import models
+from .database import dialect_insert
+
+# Cheap row counts for the list endpoints.
+# Every create/delete bumps one counter row per (submitter, date) bucket in the same
+# transaction, so an exact total is a primary key lookup instead of a COUNT(*) scan. Creates are
+# counted by the application; deletes of KPA forms by a trigger (migration 11), so raw SQL deletes
+# are subtracted too.
+# Every submission of a form type bumps the same every-submitter rows, and the row lock is held
+# until commit, so those rows are striped: each statement picks one of COUNTER_SLOTS slot rows at
+# random, and a count sums the slots. Per-submitter rows keep slot 0.
+
+ALL = ""  # bucket value meaning "any submitter" / "any date"
+COUNTER_SLOTS = max(1, int(os.getenv("COUNTER_SLOTS", "16")))
+
+WHEEL_SPECIFICATION = "wheel_specification"
+BOGIE_CHECKSHEET = "bogie_checksheet"
+FORM_SUBMISSION = "form_submission"
+
+# form type -> (model, submitter column, date column) used to rebuild counters from scratch
+COUNTED_FORMS = {
+    WHEEL_SPECIFICATION: (models.WheelSpecification, "submitted_by", "submitted_date"),
+    BOGIE_CHECKSHEET: (models.BogieChecksheet, "inspection_by", "inspection_date"),
+    FORM_SUBMISSION: (models.FormSubmission, "user_id", None),
+}
+
+def random_slot() -> int:
+    return random.randrange(COUNTER_SLOTS)
+
+def _buckets(submitted_by: Optional[str], bucket_date: Optional[str], slot: int):
+    """Every (submitter, date, slot) counter row a row falls into"""
+    submitters = [ALL] + ([submitted_by] if submitted_by else [])
+    dates = [ALL] + ([bucket_date] if bucket_date else [])
+    return [(by, date, slot if by == ALL else 0) for by in submitters for date in dates]
+
+def increment_statement(dialect_name: str, form_type: str, submitted_by: Optional[str], bucket_date: Optional[str], delta: int = 1):
+    """Upsert adding `delta` to every counter bucket of one row"""
+    return increment_many_statement(dialect_name, form_type, [(submitted_by, bucket_date)], delta)
+
+def increment_many_statement(dialect_name: str, form_type: str, rows: Iterable[Tuple[Optional[str], Optional[str]]], delta: int = 1):
+    """Upsert adding `delta` per (submitter, date) row, with one counter row per distinct bucket"""
+    deltas = Counter()
+    slot = random_slot()
+    for submitted_by, bucket_date in rows:
+        for bucket in _buckets(submitted_by, bucket_date, slot):
+            deltas[bucket] += delta
+    stmt = dialect_insert(dialect_name, models.FormCounter).values([
+        {"form_type": form_type, "submitted_by": by, "bucket_date": date, "slot": slot, "row_count": count}
+        for (by, date, slot), count in sorted(deltas.items())
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=["form_type", "submitted_by", "bucket_date", "slot"],
+        set_={"row_count": models.FormCounter.row_count + stmt.excluded.row_count}
+    )
+
+def count_statement(form_type: str, submitted_by: Optional[str] = None, bucket_date: Optional[str] = None):
+    """Exact row count of one bucket, summed over its slots"""
+    # SUM(bigint) is numeric on Postgres; cast back so drivers return an int, not a Decimal
+    return select(cast(func.coalesce(func.sum(models.FormCounter.row_count), 0), BigInteger)).where(
+        models.FormCounter.form_type == form_type,
+        models.FormCounter.submitted_by == (submitted_by or ALL),
+        models.FormCounter.bucket_date == (bucket_date or ALL),
+    )
+
+def estimate_statement(dialect_name: str, table_name: str):
+    """Planner row estimate for a whole table, or None when the database keeps no such statistic"""
+    if dialect_name != "postgresql":
+        return None
+    # reltuples is -1 until the table has been vacuumed/analyzed at least once
+    return text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)").bindparams(
+        table_name=table_name
+    )
+
+def rebuild_statements():
+    """Statements recomputing every counter from the forms tables (into slot 0), for backfills and repairs"""
+    statements = [delete(models.FormCounter)]
+    for form_type, (model, by_name, date_name) in COUNTED_FORMS.items():
+        by_col = getattr(model, by_name)
+        date_col = getattr(model, date_name) if date_name else None
+        groupings = [(None, None), (by_col, None)]
+        if date_col is not None:
+            groupings += [(None, date_col), (by_col, date_col)]
+        for by, date in groupings:
+            by_expr = cast(by, String) if by is not None else literal(ALL)
+            date_expr = cast(date, String) if date is not None else literal(ALL)
+            query = select(literal(form_type), by_expr, date_expr, func.count()).select_from(model)
+            if by is not None:
+                query = query.where(by.isnot(None))
+            query = query.group_by(*[col for col in (by, date) if col is not None])
+            statements.append(
+                insert(models.FormCounter).from_select(
+                    ["form_type", "submitted_by", "bucket_date", "row_count"], query
+                )
+            )
+    return statements
@@ -1,9 +1,10 @@
-
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import Optional, List
-from . import models, schemas
+from pydantic import ValidationError
+from typing import Optional, List, Dict, Any
+from datetime import date
+from . import models, schemas, counters, stats, response_cache, principal_cache, document_filters
 from .auth import get_password_hash
+from .database import dialect_insert
 
 # User CRUD operations
 def get_user_by_phone(db: Session, phone_number: str):
@@ -22,27 +23,38 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def set_user_active(db: Session, user_id: int, is_active: bool):
+    """Activate or deactivate a user and drop their cached tokens"""
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if db_user:
+        db_user.is_active = is_active
+        db.commit()
+        principal_cache.invalidate_user(user_id)
+    return db_user
+
+# Row counters and opt-in totals
+def _bump_counters(db: Session, form_type: str, submitted_by: Optional[str], bucket_date: Optional[str], delta: int = 1):
+    """Adjust the form counters inside the caller's transaction"""
+    response_cache.mark_changed(db, form_type)
+    db.execute(counters.increment_statement(db.get_bind().dialect.name, form_type, submitted_by, bucket_date, delta))
+
+def _bump_stats(db: Session, form_type: str, rows: List[Dict[str, Any]]):
+    """Add created forms (their column values) to the inspection statistics inside the caller's transaction"""
+    stmt = stats.increment_statement(db.get_bind().dialect.name, form_type, rows)
+    if stmt is not None:
+        db.execute(stmt)
+
+def rebuild_counters(db: Session):
+    """Recompute every form counter from the forms tables"""
+    for stmt in counters.rebuild_statements():
+        db.execute(stmt)
+    db.commit()
+
 # Form submission CRUD operations
 def get_form_submission(db: Session, submission_id: int):
     """Get form submission by ID"""
     return db.query(models.FormSubmission).filter(models.FormSubmission.id == submission_id).first()
 
-def get_form_submissions(db: Session, skip: int = 0, limit: int = 10, user_id: Optional[int] = None):
-    """Get form submissions with pagination and optional user filtering"""
-    query = db.query(models.FormSubmission)
-    if user_id:
-        query = query.filter(models.FormSubmission.user_id == user_id)
-    
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
-
 def create_form_submission(db: Session, form: schemas.FormCreate, user_id: Optional[int] = None):
     """Create a new form submission"""
     db_form = models.FormSubmission(
@@ -53,6 +65,7 @@ def create_form_submission(db: Session, form: schemas.FormCreate, user_id: Optio
         user_id=user_id
     )
     db.add(db_form)
+    _bump_counters(db, counters.FORM_SUBMISSION, str(user_id) if user_id else None, None)
     db.commit()
     db.refresh(db_form)
     return db_form
@@ -73,102 +86,241 @@ def delete_form_submission(db: Session, submission_id: int):
     db_form = db.query(models.FormSubmission).filter(models.FormSubmission.id == submission_id).first()
     if db_form:
         db.delete(db_form)
+        _bump_counters(db, counters.FORM_SUBMISSION, str(db_form.user_id) if db_form.user_id else None, None, delta=-1)
         db.commit()
     return db_form
 
 # KPA-Specific CRUD Operations
 
-# Wheel Specification CRUD
-def create_wheel_specification(db: Session, wheel_spec: schemas.WheelSpecificationCreate, user_id: Optional[int] = None):
-    """Create a new wheel specification form"""
-    db_wheel_spec = models.WheelSpecification(
-        form_number=wheel_spec.formNumber,
-        submitted_by=wheel_spec.submittedBy,
-        submitted_date=wheel_spec.submittedDate,
-        fields=wheel_spec.fields.dict(),
-        user_id=user_id
+# Batch submissions
+MAX_BATCH_SIZE = 1000
+
+def validate_batch(items: List[Any], schema):
+    """
+    Validate a batch of raw forms in one pass.
+    Returns the valid, de-duplicated forms and one result per item ("created", "duplicate" or "invalid").
+    """
+    forms = []
+    results = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            form = schema.model_validate(item)
+        except ValidationError as e:
+            form_number = item.get("formNumber") if isinstance(item, dict) else None
+            results.append({
+                "index": index,
+                "formNumber": form_number,
+                "status": "invalid",
+                "errors": e.errors(include_url=False, include_context=False)
+            })
+            continue
+        if form.formNumber in seen:
+            results.append({"index": index, "formNumber": form.formNumber, "status": "duplicate"})
+            continue
+        seen.add(form.formNumber)
+        forms.append(form)
+        results.append({"index": index, "formNumber": form.formNumber, "status": "created"})
+    return forms, results
+
+def mark_batch_duplicates(results: List[Dict[str, Any]], created: set):
+    """Valid items whose form number already existed in the database are duplicates"""
+    for result in results:
+        if result["status"] == "created" and result["formNumber"] not in created:
+            result["status"] = "duplicate"
+    return results
+
+def insert_ignoring_duplicates(dialect_name: str, model, returning=None):
+    """INSERT that skips existing form numbers and returns what it created (the form numbers by default)"""
+    return (
+        dialect_insert(dialect_name, model)
+        .on_conflict_do_nothing(index_elements=["form_number"])
+        .returning(returning if returning is not None else model.form_number)
     )
-    db.add(db_wheel_spec)
-    db.commit()
-    db.refresh(db_wheel_spec)
-    return db_wheel_spec
 
-def get_wheel_specifications(
-    db: Session, 
+# API field -> column of the KPA list items, in response order. List queries and exports
+# project these columns instead of loading ORM entities.
+WHEEL_SPECIFICATION_FIELDS = {
+    "formNumber": models.WheelSpecification.form_number,
+    "submittedBy": models.WheelSpecification.submitted_by,
+    "submittedDate": models.WheelSpecification.submitted_date,
+    "status": models.WheelSpecification.status,
+    "fields": models.WheelSpecification.fields,
+}
+BOGIE_CHECKSHEET_FIELDS = {
+    "formNumber": models.BogieChecksheet.form_number,
+    "inspectionBy": models.BogieChecksheet.inspection_by,
+    "inspectionDate": models.BogieChecksheet.inspection_date,
+    "status": models.BogieChecksheet.status,
+    "bogieDetails": models.BogieChecksheet.bogie_details,
+    "bogieChecksheet": models.BogieChecksheet.bogie_checksheet,
+    "bmbcChecksheet": models.BogieChecksheet.bmbc_checksheet,
+}
+
+def list_projection(model, fields: Dict[str, Any]):
+    """Columns labelled with their API names, followed by the keyset columns next_cursor() reads"""
+    return [column.label(name) for name, column in fields.items()] + [model.created_at, model.id]
+
+def pick_fields(available: Dict[str, Any], names: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Sparse fieldset: the requested API fields in response order, or every field when names is empty.
+    Raises ValueError for a field the form type does not have.
+    """
+    if not names:
+        return available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {', '.join(unknown)}; choose from {', '.join(available)}")
+    return {name: column for name, column in available.items() if name in names}
+
+def list_items(rows, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """API dicts for projected rows, dropping the trailing keyset columns"""
+    names = list(fields)
+    return [dict(zip(names, row)) for row in rows]
+
+# Wheel Specification CRUD
+def wheel_specification_row(wheel_spec: schemas.WheelSpecificationCreate, user_id: Optional[int] = None):
+    """Column values for one wheel specification"""
+    return {
+        "form_number": wheel_spec.formNumber,
+        "submitted_by": wheel_spec.submittedBy,
+        "submitted_date": date.fromisoformat(wheel_spec.submittedDate),
+        "fields": wheel_spec.fields.dict(),
+        "user_id": user_id
+    }
+
+def wheel_specification_filters(
     form_number: Optional[str] = None,
-    submitted_by: Optional[str] = None, 
-    submitted_date: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 10
+    submitted_by: Optional[str] = None,
+    submitted_date: Optional[date] = None,
+    dialect_name: Optional[str] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None
 ):
-    """Get wheel specifications with optional filtering"""
-    query = db.query(models.WheelSpecification)
-    
+    """Build the WHERE criteria for the wheel specification list and export queries"""
+    criteria = document_filters.criteria(dialect_name, models.WheelSpecification, field_filters or {})
     if form_number:
-        query = query.filter(models.WheelSpecification.form_number == form_number)
+        criteria.append(models.WheelSpecification.form_number == form_number)
     if submitted_by:
-        query = query.filter(models.WheelSpecification.submitted_by == submitted_by)
+        criteria.append(models.WheelSpecification.submitted_by == submitted_by)
     if submitted_date:
-        query = query.filter(models.WheelSpecification.submitted_date == submitted_date)
-    
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+        criteria.append(models.WheelSpecification.submitted_date == submitted_date)
+    if from_date:
+        criteria.append(models.WheelSpecification.submitted_date >= from_date)
+    if to_date:
+        criteria.append(models.WheelSpecification.submitted_date <= to_date)
+    return criteria
+
+def create_wheel_specification(db: Session, wheel_spec: schemas.WheelSpecificationCreate, user_id: Optional[int] = None, commit: bool = True):
+    """
+    Create a new wheel specification form with a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns None if the form number already exists. Pass commit=False to commit later in the caller's transaction.
+    """
+    stmt = insert_ignoring_duplicates(db.get_bind().dialect.name, models.WheelSpecification, returning=models.WheelSpecification)
+    row = wheel_specification_row(wheel_spec, user_id)
+    db_wheel_spec = db.scalars(stmt, [row]).first()
+    if db_wheel_spec is None:
+        return None
+    _bump_counters(db, counters.WHEEL_SPECIFICATION, wheel_spec.submittedBy, wheel_spec.submittedDate)
+    _bump_stats(db, counters.WHEEL_SPECIFICATION, [row])
+    if commit:
+        db.commit()
+    return db_wheel_spec
+
+def create_wheel_specifications_batch(db: Session, items: List[Any], user_id: Optional[int] = None):
+    """Validate and insert a batch of wheel specifications in one transaction"""
+    forms, results = validate_batch(items, schemas.WheelSpecificationCreate)
+    created = set()
+    if forms:
+        dialect_name = db.get_bind().dialect.name
+        rows = [wheel_specification_row(form, user_id) for form in forms]
+        created = set(db.scalars(insert_ignoring_duplicates(dialect_name, models.WheelSpecification), rows).all())
+        if created:
+            response_cache.mark_changed(db, counters.WHEEL_SPECIFICATION)
+            db.execute(counters.increment_many_statement(
+                dialect_name,
+                counters.WHEEL_SPECIFICATION,
+                [(form.submittedBy, form.submittedDate) for form in forms if form.formNumber in created]
+            ))
+            _bump_stats(db, counters.WHEEL_SPECIFICATION, [row for row in rows if row["form_number"] in created])
+        db.commit()
+    return mark_batch_duplicates(results, created)
 
 def get_wheel_specification_by_form_number(db: Session, form_number: str):
     """Get wheel specification by form number"""
     return db.query(models.WheelSpecification).filter(models.WheelSpecification.form_number == form_number).first()
 
 # Bogie Checksheet CRUD
-def create_bogie_checksheet(db: Session, bogie_checksheet: schemas.BogieChecksheetCreate, user_id: Optional[int] = None):
-    """Create a new bogie checksheet form"""
-    db_bogie_checksheet = models.BogieChecksheet(
-        form_number=bogie_checksheet.formNumber,
-        inspection_by=bogie_checksheet.inspectionBy,
-        inspection_date=bogie_checksheet.inspectionDate,
-        bogie_details=bogie_checksheet.bogieDetails.dict(),
-        bogie_checksheet=bogie_checksheet.bogieChecksheet.dict(),
-        bmbc_checksheet=bogie_checksheet.bmbcChecksheet.dict(),
-        user_id=user_id
-    )
-    db.add(db_bogie_checksheet)
-    db.commit()
-    db.refresh(db_bogie_checksheet)
-    return db_bogie_checksheet
+def bogie_checksheet_row(bogie_checksheet: schemas.BogieChecksheetCreate, user_id: Optional[int] = None):
+    """Column values for one bogie checksheet"""
+    return {
+        "form_number": bogie_checksheet.formNumber,
+        "inspection_by": bogie_checksheet.inspectionBy,
+        "inspection_date": date.fromisoformat(bogie_checksheet.inspectionDate),
+        "bogie_details": bogie_checksheet.bogieDetails.dict(),
+        "bogie_checksheet": bogie_checksheet.bogieChecksheet.dict(),
+        "bmbc_checksheet": bogie_checksheet.bmbcChecksheet.dict(),
+        "user_id": user_id
+    }
 
-def get_bogie_checksheets(
-    db: Session,
+def bogie_checksheet_filters(
     form_number: Optional[str] = None,
     inspection_by: Optional[str] = None,
-    inspection_date: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 10
+    inspection_date: Optional[date] = None,
+    dialect_name: Optional[str] = None,
+    field_filters: Optional[Dict[str, dict]] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None
 ):
-    """Get bogie checksheets with optional filtering"""
-    query = db.query(models.BogieChecksheet)
-    
+    """Build the WHERE criteria for the bogie checksheet list and export queries"""
+    criteria = document_filters.criteria(dialect_name, models.BogieChecksheet, field_filters or {})
     if form_number:
-        query = query.filter(models.BogieChecksheet.form_number == form_number)
+        criteria.append(models.BogieChecksheet.form_number == form_number)
     if inspection_by:
-        query = query.filter(models.BogieChecksheet.inspection_by == inspection_by)
+        criteria.append(models.BogieChecksheet.inspection_by == inspection_by)
     if inspection_date:
-        query = query.filter(models.BogieChecksheet.inspection_date == inspection_date)
-    
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+        criteria.append(models.BogieChecksheet.inspection_date == inspection_date)
+    if from_date:
+        criteria.append(models.BogieChecksheet.inspection_date >= from_date)
+    if to_date:
+        criteria.append(models.BogieChecksheet.inspection_date <= to_date)
+    return criteria
+
+def create_bogie_checksheet(db: Session, bogie_checksheet: schemas.BogieChecksheetCreate, user_id: Optional[int] = None, commit: bool = True):
+    """
+    Create a new bogie checksheet form with a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns None if the form number already exists. Pass commit=False to commit later in the caller's transaction.
+    """
+    stmt = insert_ignoring_duplicates(db.get_bind().dialect.name, models.BogieChecksheet, returning=models.BogieChecksheet)
+    row = bogie_checksheet_row(bogie_checksheet, user_id)
+    db_bogie_checksheet = db.scalars(stmt, [row]).first()
+    if db_bogie_checksheet is None:
+        return None
+    _bump_counters(db, counters.BOGIE_CHECKSHEET, bogie_checksheet.inspectionBy, bogie_checksheet.inspectionDate)
+    _bump_stats(db, counters.BOGIE_CHECKSHEET, [row])
+    if commit:
+        db.commit()
+    return db_bogie_checksheet
+
+def create_bogie_checksheets_batch(db: Session, items: List[Any], user_id: Optional[int] = None):
+    """Validate and insert a batch of bogie checksheets in one transaction"""
+    forms, results = validate_batch(items, schemas.BogieChecksheetCreate)
+    created = set()
+    if forms:
+        dialect_name = db.get_bind().dialect.name
+        rows = [bogie_checksheet_row(form, user_id) for form in forms]
+        created = set(db.scalars(insert_ignoring_duplicates(dialect_name, models.BogieChecksheet), rows).all())
+        if created:
+            response_cache.mark_changed(db, counters.BOGIE_CHECKSHEET)
+            db.execute(counters.increment_many_statement(
+                dialect_name,
+                counters.BOGIE_CHECKSHEET,
+                [(form.inspectionBy, form.inspectionDate) for form in forms if form.formNumber in created]
+            ))
+            _bump_stats(db, counters.BOGIE_CHECKSHEET, [row for row in rows if row["form_number"] in created])
+        db.commit()
+    return mark_batch_duplicates(results, created)
 
 def get_bogie_checksheet_by_form_number(db: Session, form_number: str):
     """Get bogie checksheet by form number"""
@@ -1,22 +1,143 @@
-
+import itertools
 import os
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
+from . import db_pool, read_your_writes
 
 load_dotenv() # Load environment variables from .env file
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# asyncio drivers used for the async engine, keyed by the sync URL's backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str):
+    """Map a sync database URL onto the matching asyncio driver"""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername)
+
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+# Pool sizing, timeouts and PgBouncer mode come from the environment (see app/db_pool.py)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **db_pool.engine_options(SQLALCHEMY_DATABASE_URL, "sync"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# Dependency to get a DB session
+# Async engine for the non-blocking request handlers
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL, **db_pool.engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, "async", is_async=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Optional read replicas: comma-separated URLs in the same form as DATABASE_URL. Read-only routes
+# spread over them round-robin; without replicas every read stays on the primary.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+replica_engines = [
+    create_engine(url, **db_pool.engine_options(url, f"sync-replica-{i}"))
+    for i, url in enumerate(REPLICA_DATABASE_URLS)
+]
+async_replica_engines = [
+    create_async_engine(url, **db_pool.engine_options(url, f"async-replica-{i}", is_async=True))
+    for i, url in enumerate(get_async_database_url(url) for url in REPLICA_DATABASE_URLS)
+]
+_replica_turn = itertools.count()
+
+# Session.info flag set on sessions bound to a replica
+REPLICA_SESSION = "replica"
+
+def read_session(primary: bool = False) -> Session:
+    """Session on the next replica, or on the primary when asked or when no replicas are configured"""
+    use_replica = bool(replica_engines) and not primary
+    bind = replica_engines[next(_replica_turn) % len(replica_engines)] if use_replica else engine
+    db = SessionLocal(bind=bind)
+    db.info[REPLICA_SESSION] = use_replica
+    return db
+
+def async_read_session(primary: bool = False) -> AsyncSession:
+    """AsyncSession on the next replica, or on the primary when asked or when no replicas are configured"""
+    use_replica = bool(async_replica_engines) and not primary
+    bind = async_replica_engines[next(_replica_turn) % len(async_replica_engines)] if use_replica else async_engine
+    db = AsyncSessionLocal(bind=bind)
+    db.info[REPLICA_SESSION] = use_replica
+    return db
+
+def is_replica(db) -> bool:
+    """True for a session from read_session()/async_read_session() that reads a replica"""
+    return db.info.get(REPLICA_SESSION, False)
+
+def reads_primary(*keys) -> bool:
+    """Whether a read for these writer keys has to see the primary; always False without replicas"""
+    if not replica_engines:
+        return False
+    primary = read_your_writes.wrote_recently(keys)
+    read_your_writes.record_read(primary)
+    return primary
+
+# INSERT constructs with ON CONFLICT support, keyed by dialect name
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def dialect_insert(dialect_name: str, model):
+    """INSERT for `model` that supports on_conflict_do_nothing/on_conflict_do_update"""
+    upsert = UPSERT_DIALECTS.get(dialect_name)
+    if upsert is None:
+        raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect_name}")
+    return upsert(model)
+
+def pool_status():
+    """Live pool statistics for the primary's engines and every replica's"""
+    status = {
+        "sync": db_pool.pool_status("sync", engine.pool),
+        "async": db_pool.pool_status("async", async_engine.pool),
+    }
+    for i, (replica, async_replica) in enumerate(zip(replica_engines, async_replica_engines)):
+        status[f"sync-replica-{i}"] = db_pool.pool_status(f"sync-replica-{i}", replica.pool)
+        status[f"async-replica-{i}"] = db_pool.pool_status(f"async-replica-{i}", async_replica.pool)
+    if replica_engines:
+        status["read_your_writes"] = read_your_writes.stats()
+    return status
+
+# Dependency to get a DB session (primary; for writes and anything that must read them back)
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get a read-only DB session (a replica unless this client wrote recently)
+def get_read_db(request: Request):
+    db = read_session(primary=reads_primary(read_your_writes.client_key(request)))
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB session (primary; for writes and anything that must read them back)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get an async DB session for routes that write; the commit opens this client's read-your-writes window
+async def get_async_write_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        read_your_writes.track(db, read_your_writes.client_key(request))
+        yield db
+
+# Dependency to get a read-only async DB session (a replica unless this client wrote recently)
+async def get_async_read_db(request: Request):
+    async with async_read_session(primary=reads_primary(read_your_writes.client_key(request))) as db:
+        yield db
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from uuid import uuid4
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+# Connection pool settings for the sync and async engines, plus live pool health.
+# Every setting comes from the environment. DB_PGBOUNCER=true switches to NullPool and turns
+# off asyncpg's prepared statement caches so a transaction-mode PgBouncer can sit in front.
+# The instrumented pools time every checkout, so waits and checkout timeouts show up
+# before the pool is exhausted.
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 keeps connections forever
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = no timeout
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+_lock = threading.Lock()
+_stats = {}
+
+def _record_checkout(pool_name: str, seconds: float, timed_out: bool):
+    with _lock:
+        stats = _stats.setdefault(pool_name, {"checkouts": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+        if timed_out:
+            stats["timeouts"] += 1
+        else:
+            stats["checkouts"] += 1
+        stats["wait_seconds"] += seconds
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], seconds)
+
+class _InstrumentedPool:
+    """Pool mixin timing each checkout (queue wait, connect and pre-ping) under the pool's logging name"""
+
+    def connect(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            _record_checkout(self._orig_logging_name or "default", time.perf_counter() - started, timed_out)
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+class InstrumentedNullPool(_InstrumentedPool, NullPool):
+    pass
+
+def engine_options(database_url, name: str, is_async: bool = False) -> dict:
+    """create_engine() keyword arguments for the configured pool; `name` labels its metrics"""
+    backend = make_url(database_url).get_backend_name()
+    options = {"pool_logging_name": name}
+    if backend == "sqlite":
+        # SQLite keeps its dialect's default pool; there is no server to protect
+        return options
+
+    options.update(pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+    if DB_PGBOUNCER:
+        options["poolclass"] = InstrumentedNullPool
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+
+    connect_args = {}
+    if backend == "postgresql":
+        if is_async and DB_PGBOUNCER:
+            # PgBouncer may hand each transaction a different server connection, so no named
+            # statement may outlive its transaction
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+            )
+        if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+            # Startup parameters are dropped by PgBouncer; set statement_timeout on the role there instead
+            if is_async:
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+def pool_status(name: str, pool) -> dict:
+    """Live occupancy of one pool plus its checkout wait and timeout counters"""
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    with _lock:
+        stats = dict(_stats.get(name, {"checkouts": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}))
+    attempts = stats["checkouts"] + stats["timeouts"]
+    status.update(
+        checkouts=stats["checkouts"],
+        checkout_timeouts=stats["timeouts"],
+        avg_wait_ms=round(stats["wait_seconds"] / attempts * 1000, 3) if attempts else 0.0,
+        max_wait_ms=round(stats["max_wait_seconds"] * 1000, 3),
+    )
+    return status
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import func, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from . import schemas
+
+# Field-level filters on the KPA JSON documents.
+# `?fields.wheelGauge=1600` or `?bogieDetails.bogieNo=...` become one containment test per
+# column (`fields @> '{"wheelGauge": "1600"}'`), which Postgres answers from the GIN
+# jsonb_path_ops indexes. SQLite and other plain-JSON backends fall back to json_extract().
+# Keys are checked against the document's schema: a typo is a 400, not an empty page.
+
+# Query parameter prefix -> model attribute holding the JSON document
+WHEEL_SPECIFICATION_DOCUMENTS = {"fields": "fields"}
+BOGIE_CHECKSHEET_DOCUMENTS = {
+    "bogieDetails": "bogie_details",
+    "bogieChecksheet": "bogie_checksheet",
+    "bmbcChecksheet": "bmbc_checksheet",
+}
+
+# Model attribute -> schema of the documents stored in it (flat: every key holds a string)
+DOCUMENT_SCHEMAS = {
+    "fields": schemas.WheelSpecificationFields,
+    "bogie_details": schemas.BogieDetails,
+    "bogie_checksheet": schemas.BogieChecksheetFields,
+    "bmbc_checksheet": schemas.BmbcChecksheetFields,
+}
+
+_KEY = re.compile(r"^[A-Za-z0-9_]+$")
+
+def parse(query_params: Iterable[Tuple[str, str]], documents: Dict[str, str]) -> Dict[str, dict]:
+    """
+    Collect `<document>.<key>[.<key>...]=value` query parameters into one containment document per column.
+    Parameters without a dot are ignored; raises ValueError for an unknown document or key, or a malformed key.
+    """
+    filters: Dict[str, dict] = {}
+    for name, value in query_params:
+        if "." not in name:
+            continue
+        prefix, *path = name.split(".")
+        if prefix not in documents:
+            raise ValueError(f"Unknown filter '{name}', expected one of: {', '.join(f'{p}.<key>' for p in documents)}")
+        if not all(_KEY.match(key) for key in path):
+            raise ValueError(f"Invalid filter key '{name}'")
+        schema = DOCUMENT_SCHEMAS.get(documents[prefix])
+        if schema is not None:
+            if path[0] not in schema.model_fields:
+                raise ValueError(f"Unknown filter '{name}', {prefix}.<key> is one of: {', '.join(schema.model_fields)}")
+            if len(path) > 1:
+                raise ValueError(f"Invalid filter key '{name}': {prefix}.{path[0]} is not an object")
+        node = filters.setdefault(documents[prefix], {})
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                raise ValueError(f"Conflicting filters on '{name}'")
+        if isinstance(node.get(path[-1]), dict):
+            raise ValueError(f"Conflicting filters on '{name}'")
+        node[path[-1]] = value
+    return filters
+
+def _leaves(document: dict, path: Tuple[str, ...] = ()) -> List[Tuple[Tuple[str, ...], str]]:
+    leaves = []
+    for key, value in document.items():
+        if isinstance(value, dict):
+            leaves.extend(_leaves(value, path + (key,)))
+        else:
+            leaves.append((path + (key,), value))
+    return leaves
+
+def criteria(dialect_name: str, model, filters: Dict[str, dict]) -> list:
+    """WHERE criteria for parsed document filters on the given dialect"""
+    clauses = []
+    for attr, document in filters.items():
+        column = getattr(model, attr)
+        if dialect_name == "postgresql":
+            clauses.append(type_coerce(column, JSONB).contains(document))
+        else:
+            for path, value in _leaves(document):
+                clauses.append(func.json_extract(column, "$." + ".".join(path)) == value)
+    return clauses
@@ -0,0 +1,78 @@
+import csv
+import io
+import os
+from datetime import date
+from typing import AsyncIterator, Dict, List, Sequence, Tuple
+import orjson
+from fastapi.responses import StreamingResponse
+from . import schemas
+
+# Streaming NDJSON/CSV exports of the KPA forms.
+# Rows come off a server-side cursor EXPORT_BATCH_SIZE at a time (see async_crud.stream_forms)
+# and each batch is encoded into one response chunk, so memory stays flat and the first
+# bytes go out as soon as the first batch is read, however many rows match.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# JSON documents are flattened into one CSV column per schema field, e.g. fields.wheelGauge
+CSV_DOCUMENT_FIELDS = {
+    "fields": list(schemas.WheelSpecificationFields.model_fields),
+    "bogieDetails": list(schemas.BogieDetails.model_fields),
+    "bogieChecksheet": list(schemas.BogieChecksheetFields.model_fields),
+    "bmbcChecksheet": list(schemas.BmbcChecksheetFields.model_fields),
+}
+
+def _value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def encode_ndjson(rows: Sequence[Tuple], names: List[str]) -> bytes:
+    """One JSON object per row, newline terminated"""
+    return b"".join(
+        orjson.dumps(dict(zip(names, row)), option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+def csv_header(names: List[str]) -> List[str]:
+    header = []
+    for name in names:
+        if name in CSV_DOCUMENT_FIELDS:
+            header.extend(f"{name}.{key}" for key in CSV_DOCUMENT_FIELDS[name])
+        else:
+            header.append(name)
+    return header
+
+def encode_csv(rows: Sequence[Tuple], names: List[str], header: bool = False) -> str:
+    """CSV lines for a batch of rows, with documents flattened per CSV_DOCUMENT_FIELDS"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(csv_header(names))
+    for row in rows:
+        line = []
+        for name, value in zip(names, row):
+            if name in CSV_DOCUMENT_FIELDS:
+                document: Dict = value or {}
+                line.extend(document.get(key) for key in CSV_DOCUMENT_FIELDS[name])
+            else:
+                line.append(_value(value))
+        writer.writerow(line)
+    return buffer.getvalue()
+
+async def _chunks(batches: AsyncIterator[Sequence[Tuple]], names: List[str], export_format: str):
+    if export_format == "csv":
+        yield encode_csv([], names, header=True)
+        async for rows in batches:
+            yield encode_csv(rows, names)
+    else:
+        async for rows in batches:
+            yield encode_ndjson(rows, names)
+
+def streaming_response(batches: AsyncIterator[Sequence[Tuple]], fields: Dict, export_format: str, filename: str):
+    """StreamingResponse encoding each batch of rows (columns in `fields` order) as it arrives"""
+    return StreamingResponse(
+        _chunks(batches, list(fields), export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
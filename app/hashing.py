@@ -0,0 +1,87 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+# Password hashing off the request path.
+# bcrypt is deliberately slow, so hashes run on a small dedicated pool instead of the
+# event loop or Starlette's threadpool. Work beyond HASH_MAX_PENDING is rejected up
+# front (503) rather than queued behind a login burst.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")  # "thread" or "process"
+HASH_RETRY_AFTER_SECONDS = 1
+
+@lru_cache(maxsize=None)
+def crypt_context():
+    """
+    The passlib CryptContext, built on first use: importing passlib and loading its bcrypt backend
+    would otherwise add ~25 ms to every process start-up.
+    """
+    from passlib.context import CryptContext
+
+    # min_rounds makes needs_update() flag hashes made with an older, cheaper cost
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS
+    )
+
+class HashingPoolFull(Exception):
+    """Raised when the hashing pool already has HASH_MAX_PENDING jobs"""
+
+_executor: Optional[Executor] = None
+_pending = 0
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            # bcrypt releases the GIL while hashing, so threads scale across cores
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+def shutdown():
+    """Stop the hashing pool, waiting for running hashes"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+def pending() -> int:
+    """Hash jobs queued or running"""
+    return _pending
+
+def _hash(password: str) -> str:
+    return crypt_context().hash(password)
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return crypt_context().verify(password, hashed_password)
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HashingPoolFull()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await _submit(_hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash on the hashing pool"""
+    return await _submit(_verify, password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with outdated parameters (cheap, does not hash)"""
+    return crypt_context().needs_update(hashed_password)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, literal, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import dialect_insert
+
+# Idempotency-Key support for form submissions.
+# The first response for a key is stored in the same transaction as the form itself, so a
+# retry with the same key and body replays it without touching the forms tables.
+# Expired keys are never replayed; `python3 setup_database.py` deletes them (prune_expired).
+
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+MAX_KEY_LENGTH = 255
+KEY_REUSED = "Idempotency-Key was already used for a different request"
+
+def request_hash(route: str, payload: dict) -> str:
+    """Fingerprint of a request so a key cannot be reused for a different body"""
+    raw = json.dumps([route, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _cutoff():
+    return datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+
+def validate_key(key: Optional[str]):
+    """Reject keys that cannot be stored"""
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+async def replay(db: AsyncSession, key: Optional[str], fingerprint: str):
+    """Stored response for `key`, None if the key is new or expired. 422 if the key was used for another request."""
+    if key is None:
+        return None
+    result = await db.execute(
+        select(models.IdempotencyKey).where(
+            models.IdempotencyKey.key == key,
+            models.IdempotencyKey.created_at >= _cutoff()
+        )
+    )
+    stored = result.scalars().first()
+    if stored is None:
+        return None
+    if stored.request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail=KEY_REUSED)
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.response_body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+async def claim(db: AsyncSession, key: Optional[str], fingerprint: str, status_code: int, response_body: dict) -> bool:
+    """
+    Store the response for `key` in the caller's transaction, replacing an expired entry.
+    False, storing nothing, when a live entry holds the key for a different request: a concurrent
+    request with the same key committed between replay() and this insert.
+    """
+    if key is None:
+        return True
+    values = {
+        "key": key,
+        "request_hash": fingerprint,
+        "status_code": status_code,
+        "response_body": response_body,
+        "created_at": datetime.now(timezone.utc)
+    }
+    stmt = dialect_insert(db.get_bind().dialect.name, models.IdempotencyKey).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={name: stmt.excluded[name] for name in values if name != "key"},
+        where=models.IdempotencyKey.created_at < _cutoff()
+    ).returning(models.IdempotencyKey.key)
+    if (await db.execute(stmt)).first() is not None:
+        return True
+    stored_hash = await db.scalar(select(models.IdempotencyKey.request_hash).where(models.IdempotencyKey.key == key))
+    return stored_hash == fingerprint
+
+async def remember(db: AsyncSession, key: Optional[str], fingerprint: str, status_code: int, response_body: dict):
+    """claim() for a request handler: rolls the whole transaction back and answers 422 if the key is taken"""
+    if not await claim(db, key, fingerprint, status_code, response_body):
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=KEY_REUSED)
+
+def prune_expired(conn: Connection) -> int:
+    """Delete keys past IDEMPOTENCY_KEY_TTL_HOURS; replay() ignores them already"""
+    stored = models.IdempotencyKey
+    return conn.execute(delete(stored).where(stored.created_at < literal(_cutoff(), stored.created_at.type))).rowcount
@@ -0,0 +1,290 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from . import counters, crud, idempotency, models, read_your_writes, response_cache
+from . import stats as form_stats
+from .database import AsyncSessionLocal
+
+# Write-behind ingestion for KPA form submissions (opt-in).
+# An accepted submission is validated, put on a bounded in-process queue and answered with
+# 202 Accepted and a tracking id; a background flusher writes the queue in group-committed batches
+# (up to INGEST_BATCH_SIZE forms, or whatever arrived within INGEST_FLUSH_MS), so a burst costs one
+# commit per batch instead of one per form. GET /api/forms/submissions/{id} reports when a form is
+# durable. A 202 is NOT durable: forms still queued are lost if the process dies, so only clients
+# that check the status (or resubmit with the same Idempotency-Key) should opt in.
+#
+# INGEST_MODE: "off" (every submission is written before responding), "prefer" (clients opt in
+# with `Prefer: respond-async`) or "always". A full queue answers 429 with Retry-After; shutdown
+# stops accepting (503) and drains the queue for up to INGEST_DRAIN_TIMEOUT_SECONDS.
+
+INGEST_MODE = os.getenv("INGEST_MODE", "prefer")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_MS = float(os.getenv("INGEST_FLUSH_MS", "25"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_STATUS_SIZE = int(os.getenv("INGEST_STATUS_SIZE", "100000"))  # most tracking ids remembered
+INGEST_DRAIN_TIMEOUT_SECONDS = float(os.getenv("INGEST_DRAIN_TIMEOUT_SECONDS", "30"))
+INGEST_RETRY_AFTER_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+class IngestQueueFull(Exception):
+    """Raised when INGEST_QUEUE_SIZE submissions are already waiting to be written"""
+
+# form type -> (model, column values, counter bucket, label)
+INGESTED_FORMS = {
+    counters.WHEEL_SPECIFICATION: (
+        models.WheelSpecification, crud.wheel_specification_row,
+        lambda form: (form.submittedBy, form.submittedDate), "Wheel specification"
+    ),
+    counters.BOGIE_CHECKSHEET: (
+        models.BogieChecksheet, crud.bogie_checksheet_row,
+        lambda form: (form.inspectionBy, form.inspectionDate), "Bogie checksheet"
+    ),
+}
+
+@dataclass
+class Submission:
+    tracking_id: str
+    form_type: str
+    form: object
+    response_body: dict  # the 202 body, also what an Idempotency-Key retry replays
+    idempotency_key: Optional[str]
+    fingerprint: str
+    client_key: Optional[str]
+    accepted_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    error: Optional[str] = None  # why _insert() left it out of the batch
+
+_queue: Optional[asyncio.Queue] = None
+_batch_ready: Optional[asyncio.Event] = None
+_flusher: Optional[asyncio.Task] = None
+_accepting = True
+_pending_keys: Dict[str, Submission] = {}  # Idempotency-Key -> submission still queued
+_statuses: "OrderedDict[str, dict]" = OrderedDict()  # tracking id -> status, oldest first
+_stats = {"accepted": 0, "rejected": 0, "committed": 0, "duplicates": 0, "failed": 0,
+          "batches": 0, "retries": 0, "largest_batch": 0, "flush_ms_total": 0.0}
+
+def enabled_for(prefer: Optional[str]) -> bool:
+    """Whether a submission with this Prefer header is queued rather than written before responding"""
+    if INGEST_MODE == "always":
+        return True
+    return INGEST_MODE == "prefer" and prefer is not None and "respond-async" in prefer.lower()
+
+def status_url(tracking_id: str) -> str:
+    return f"/api/forms/submissions/{tracking_id}"
+
+def _accepted_response(submission: Submission, replayed: bool = False) -> JSONResponse:
+    headers = {"Location": status_url(submission.tracking_id), "Preference-Applied": "respond-async"}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return JSONResponse(status_code=202, content=submission.response_body, headers=headers)
+
+def _set_status(tracking_id: str, **values):
+    entry = _statuses.get(tracking_id)
+    if entry is not None:
+        entry.update(values)
+
+async def submit(request, form_type: str, form, data: dict, idempotency_key: Optional[str], fingerprint: str) -> JSONResponse:
+    """
+    Queue a validated form for the flusher and answer 202 with its tracking id.
+    `data` is the response summary of the form (form number, submitter, date).
+    """
+    global _queue, _batch_ready, _flusher
+    if idempotency_key is not None and idempotency_key in _pending_keys:
+        # Retry of a submission that is still queued: the stored response is not written yet
+        queued = _pending_keys[idempotency_key]
+        if queued.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail=idempotency.KEY_REUSED)
+        return _accepted_response(queued, replayed=True)
+    if not _accepting:
+        raise HTTPException(status_code=503, detail="Server is shutting down, please retry")
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        _batch_ready = asyncio.Event()
+    if _queue.full():
+        _stats["rejected"] += 1
+        raise IngestQueueFull()
+
+    tracking_id = uuid.uuid4().hex
+    label = INGESTED_FORMS[form_type][3]
+    submission = Submission(
+        tracking_id=tracking_id,
+        form_type=form_type,
+        form=form,
+        response_body={
+            "success": True,
+            "message": f"{label} accepted for processing.",
+            "data": {**data, "status": "queued", "trackingId": tracking_id, "statusUrl": status_url(tracking_id)},
+        },
+        idempotency_key=idempotency_key,
+        fingerprint=fingerprint,
+        client_key=read_your_writes.client_key(request),
+    )
+    _statuses[tracking_id] = {
+        "trackingId": tracking_id,
+        "formType": form_type,
+        "formNumber": form.formNumber,
+        "status": "queued",
+        "acceptedAt": submission.accepted_at.isoformat(),
+        "committedAt": None,
+        "error": None,
+    }
+    while len(_statuses) > INGEST_STATUS_SIZE:
+        _statuses.popitem(last=False)
+    if idempotency_key is not None:
+        _pending_keys[idempotency_key] = submission
+    _queue.put_nowait(submission)
+    _stats["accepted"] += 1
+    if _queue.qsize() >= INGEST_BATCH_SIZE:
+        _batch_ready.set()
+    if _flusher is None or _flusher.done():
+        # A fresh context: a copy of this request's would charge every later batch's SQL to its route
+        # (metrics, slow query log) and query budget for the life of the process
+        _flusher = asyncio.create_task(_flush_loop(), context=contextvars.Context())
+    return _accepted_response(submission)
+
+def status(tracking_id: str) -> Optional[dict]:
+    """Current status of a tracked submission: queued, committed, duplicate or failed"""
+    entry = _statuses.get(tracking_id)
+    return dict(entry) if entry is not None else None
+
+async def _flush_loop():
+    while True:
+        first = await _queue.get()
+        if _queue.qsize() + 1 < INGEST_BATCH_SIZE:
+            # Group commit: give the rest of a burst INGEST_FLUSH_MS to join this batch
+            try:
+                await asyncio.wait_for(_batch_ready.wait(), INGEST_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+        _batch_ready.clear()
+        batch = [first]
+        while len(batch) < INGEST_BATCH_SIZE and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        try:
+            await _write(batch)
+        except Exception:
+            logger.exception("Ingestion batch of %d forms failed", len(batch))
+            _settle(batch, None, "flusher error")
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+async def _write(batch: List[Submission]):
+    """Write a batch with retries; if it keeps failing, write its forms one by one so a bad form only fails itself"""
+    for attempt in range(INGEST_MAX_RETRIES + 1):
+        started = time.perf_counter()
+        try:
+            created = await _insert(batch)
+        except Exception as e:
+            error = e
+            _stats["retries"] += 1
+            logger.warning("Ingestion batch of %d forms failed (attempt %d): %s", len(batch), attempt + 1, e)
+            if attempt < INGEST_MAX_RETRIES:
+                await asyncio.sleep(0.1 * 2 ** attempt)
+            continue
+        _stats["batches"] += 1
+        _stats["largest_batch"] = max(_stats["largest_batch"], len(batch))
+        _stats["flush_ms_total"] += (time.perf_counter() - started) * 1000
+        _settle(batch, created)
+        return
+    if len(batch) == 1:
+        _settle(batch, None, str(error))
+        return
+    for submission in batch:
+        try:
+            _settle([submission], await _insert([submission]))
+        except Exception as e:
+            _settle([submission], None, str(e))
+
+async def _insert(batch: List[Submission]) -> Dict[str, set]:
+    """One transaction for the whole batch; returns the form numbers created per form type"""
+    created = {}
+    async with AsyncSessionLocal() as db:
+        dialect_name = db.get_bind().dialect.name
+        read_your_writes.track(db, *(submission.client_key for submission in batch))
+        # Store the Idempotency-Keys first: a key another request took since submit() fails its form only
+        accepted = []
+        for submission in batch:
+            submission.error = None
+            if await idempotency.claim(db, submission.idempotency_key, submission.fingerprint, 202, submission.response_body):
+                accepted.append(submission)
+            else:
+                submission.error = idempotency.KEY_REUSED
+        for form_type, (model, to_row, bucket, _) in INGESTED_FORMS.items():
+            forms = {}
+            for submission in accepted:
+                if submission.form_type == form_type:
+                    forms.setdefault(submission.form.formNumber, submission.form)
+            if not forms:
+                continue
+            rows = [to_row(form) for form in forms.values()]
+            created[form_type] = set((await db.scalars(crud.insert_ignoring_duplicates(dialect_name, model), rows)).all())
+            if created[form_type]:
+                response_cache.mark_changed(db, form_type)
+                await db.execute(counters.increment_many_statement(
+                    dialect_name, form_type,
+                    [bucket(form) for number, form in forms.items() if number in created[form_type]]
+                ))
+                await db.execute(form_stats.increment_statement(
+                    dialect_name, form_type, [row for row in rows if row["form_number"] in created[form_type]]
+                ))
+        await db.commit()
+    return created
+
+def _settle(batch: List[Submission], created: Optional[Dict[str, set]], error: Optional[str] = None):
+    """Record the outcome of each submission once its transaction is over"""
+    committed_at = datetime.now(timezone.utc).isoformat()
+    for submission in batch:
+        if submission.idempotency_key is not None:
+            _pending_keys.pop(submission.idempotency_key, None)
+        if created is None or submission.error is not None:
+            _stats["failed"] += 1
+            _set_status(submission.tracking_id, status="failed", error=submission.error or error)
+            continue
+        numbers = created.get(submission.form_type, set())
+        if submission.form.formNumber in numbers:
+            # Only the first submission of a form number in the batch created it
+            numbers.discard(submission.form.formNumber)
+            _stats["committed"] += 1
+            _set_status(submission.tracking_id, status="committed", committedAt=committed_at)
+        else:
+            _stats["duplicates"] += 1
+            _set_status(submission.tracking_id, status="duplicate",
+                        error=f"Form number {submission.form.formNumber} already exists")
+
+async def drain(timeout: float = INGEST_DRAIN_TIMEOUT_SECONDS):
+    """Stop accepting submissions and wait for the queue to be written (app shutdown)"""
+    global _accepting, _flusher
+    _accepting = False
+    if _flusher is None:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.error("Ingestion queue not drained after %.0fs; %d forms were not written", timeout, _queue.qsize())
+    _flusher.cancel()
+    _flusher = None
+
+def stats() -> dict:
+    batches = _stats["batches"]
+    return {
+        "mode": INGEST_MODE,
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "queue_size": INGEST_QUEUE_SIZE,
+        "batch_size": INGEST_BATCH_SIZE,
+        "flush_ms": INGEST_FLUSH_MS,
+        "accepting": _accepting,
+        **{name: value for name, value in _stats.items() if name != "flush_ms_total"},
+        "avg_batch": round((_stats["committed"] + _stats["duplicates"]) / batches, 1) if batches else None,
+        "avg_flush_ms": round(_stats["flush_ms_total"] / batches, 2) if batches else None,
+    }
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# Request and SQL metrics in the Prometheus text format, served by GET /metrics.
+# A pure ASGI middleware times each request under its route template (/v1/form-data/{form_data_id},
+# not the raw path) and tracks in-flight requests and status codes. SQLAlchemy cursor hooks
+# count statements and their time against the request running in the current context.
+# Recording is a few dict updates per request; see benchmarks/README.md for the measured overhead.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+UNMATCHED_ROUTE = "<unmatched>"
+
+class Histogram:
+    """Fixed-bucket histogram; counts are per bucket and made cumulative when rendered"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _RequestStats:
+    __slots__ = ("route", "statements", "seconds")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.statements = 0
+        self.seconds = 0.0
+
+_current: ContextVar[Optional[_RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+_lock = threading.Lock()
+_requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+_latency: Dict[Tuple[str, str], Histogram] = {}
+_in_flight: Dict[str, int] = defaultdict(int)
+_statements: Dict[str, Histogram] = {}
+_sql_seconds: Dict[str, float] = defaultdict(float)
+
+def current_route() -> Optional[str]:
+    """Route template of the request running in this context, if any"""
+    stats = _current.get()
+    return stats.route if stats is not None else None
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - started
+
+def _record(route: str, method: str, status: int, seconds: float, sql: _RequestStats):
+    with _lock:
+        _in_flight[route] -= 1
+        _requests[(route, method, str(status))] += 1
+        latency = _latency.get((route, method))
+        if latency is None:
+            latency = _latency[(route, method)] = Histogram(LATENCY_BUCKETS)
+        latency.observe(seconds)
+        statements = _statements.get(route)
+        if statements is None:
+            statements = _statements[route] = Histogram(STATEMENT_BUCKETS)
+        statements.observe(sql.statements)
+        _sql_seconds[route] += sql.seconds
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status codes, in-flight requests and SQL per request"""
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[Tuple[str, str], str] = {}
+
+    def _route_template(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._templates.get(key)
+        if template is None:
+            template = UNMATCHED_ROUTE
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    template = route.path
+                    break
+            if len(self._templates) >= 10000:
+                self._templates.clear()
+            self._templates[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route_template(scope)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        sql = _RequestStats(route)
+        token = _current.set(sql)
+        with _lock:
+            _in_flight[route] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            _record(route, scope["method"], status[0], time.perf_counter() - started, sql)
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+def _render_histogram(lines, name: str, histogram: Histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+    with _lock:
+        lines = [
+            "# HELP http_requests_total Requests by route template, method and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (route, method, status), count in sorted(_requests.items()):
+            lines.append(f"http_requests_total{_labels(route=route, method=method, status=status)} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route template and method.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (route, method), histogram in sorted(_latency.items()):
+            _render_histogram(lines, "http_request_duration_seconds", histogram, route=route, method=method)
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being served by route template.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for route, count in sorted(_in_flight.items()):
+            lines.append(f"http_requests_in_flight{_labels(route=route)} {count}")
+
+        lines += [
+            "# HELP http_request_sql_statements SQL statements executed per request by route template.",
+            "# TYPE http_request_sql_statements histogram",
+        ]
+        for route, histogram in sorted(_statements.items()):
+            _render_histogram(lines, "http_request_sql_statements", histogram, route=route)
+
+        lines += [
+            "# HELP http_request_sql_seconds_total Time spent executing SQL by route template.",
+            "# TYPE http_request_sql_seconds_total counter",
+        ]
+        for route, seconds in sorted(_sql_seconds.items()):
+            lines.append(f"http_request_sql_seconds_total{_labels(route=route)} {seconds}")
+    return "\n".join(lines) + "\n"
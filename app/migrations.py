@@ -0,0 +1,295 @@
+import logging
+import os
+from datetime import date
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import func, inspect, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from . import counters, models, search, stats
+
+# Versioned schema migrations.
+# The schema is changed only by `python3 setup_database.py`, which applies every migration newer than
+# the highest version in the schema_version table, each in its own transaction. App start-up never
+# touches the schema: it runs check(), one cheap query comparing that version with LATEST_VERSION.
+# On Postgres an advisory lock serialises concurrent runs (several containers starting at once).
+#
+# Migration 1 builds a fresh database from the current models, so every later migration must check
+# before it alters and be a no-op on a schema that is already up to date (see _convert_columns).
+
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "error")  # "error", "warn" or "off"
+MIGRATION_LOCK_ID = 0x6B7061  # pg_advisory_xact_lock key, shared by every migration runner
+
+logger = logging.getLogger(__name__)
+
+class SchemaOutdated(RuntimeError):
+    """The database has not been migrated to the version this code needs"""
+
+# (table, column, old information_schema data_type, new type) for columns whose type changed
+COLUMN_CONVERSIONS = [
+    ("wheel_specifications", "fields", "json", "JSONB"),
+    ("bogie_checksheets", "bogie_details", "json", "JSONB"),
+    ("bogie_checksheets", "bogie_checksheet", "json", "JSONB"),
+    ("bogie_checksheets", "bmbc_checksheet", "json", "JSONB"),
+    ("wheel_specifications", "submitted_date", "character varying", "DATE"),
+    ("bogie_checksheets", "inspection_date", "character varying", "DATE"),
+]
+
+def _create_tables(conn: Connection):
+    # create_all() skips tables that already exist, so this also fills in tables added before versioning
+    models.Base.metadata.create_all(bind=conn)
+
+# (table, column) of the form dates, which were any string of up to 20 characters before migration 2
+FORM_DATE_COLUMNS = [
+    ("wheel_specifications", "submitted_date"),
+    ("bogie_checksheets", "inspection_date"),
+]
+
+def _data_type(conn: Connection, table: str, column: str) -> Optional[str]:
+    return conn.exec_driver_sql(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+        (table, column)
+    ).scalar()
+
+def _parse_form_date(value) -> Optional[str]:
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        return None
+
+def _repair_form_dates(conn: Connection) -> int:
+    # A legacy form date that is not an ISO date would abort the ::date cast of migration 2 on Postgres,
+    # and on SQLite break every read of its row. ISO dates in another spelling (" 2025-01-21", "20250121")
+    # are normalised; anything else ("21/01/2025") is kept in <column>_unparsed for manual correction,
+    # and the form date becomes the day the row was created. Returns the number of rows changed.
+    changed = 0
+    for table, column in FORM_DATE_COLUMNS:
+        if conn.dialect.name == "postgresql" and _data_type(conn, table, column) != "character varying":
+            continue
+        unparsed = f"{column}_unparsed"
+        if unparsed not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {unparsed} VARCHAR(20)")
+        normalised, quarantined = [], []
+        rows = conn.exec_driver_sql(f"SELECT id, {column}, created_at FROM {table}", execution_options={"stream_results": True})
+        for row_id, value, created_at in rows:
+            parsed = _parse_form_date(value)
+            if parsed is None:
+                created = _parse_form_date(str(created_at)[:10]) if created_at else None
+                quarantined.append({"id": row_id, "value": created or date.today().isoformat(), "raw": value})
+            elif parsed != value:
+                normalised.append({"id": row_id, "value": parsed})
+        if normalised:
+            conn.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), normalised)
+            logger.info("Normalised %d %s.%s values to YYYY-MM-DD", len(normalised), table, column)
+        if quarantined:
+            conn.execute(text(f"UPDATE {table} SET {column} = :value, {unparsed} = :raw WHERE id = :id"), quarantined)
+            logger.warning(
+                "%d %s.%s values are not dates; kept them in %s and used the day each row was created",
+                len(quarantined), table, column, unparsed
+            )
+        changed += len(normalised) + len(quarantined)
+    return changed
+
+def _repair_stored_form_dates(conn: Connection):
+    # Counters and statistics were built from the old values; migration 2 runs before they exist
+    if _repair_form_dates(conn):
+        _rebuild_counters(conn)
+        stats.rebuild(conn)
+
+def _convert_columns(conn: Connection):
+    # Form documents used to be plain JSON and form dates strings; the indexes need JSONB and DATE
+    _repair_form_dates(conn)
+    if conn.dialect.name != "postgresql":
+        return
+    for table, column, old_type, new_type in COLUMN_CONVERSIONS:
+        if _data_type(conn, table, column) == old_type:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {new_type} USING {column}::{new_type.lower()}")
+
+def _create_indexes(conn: Connection):
+    # create_all() skips indexes on tables that already exist
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+def _rebuild_counters(conn: Connection):
+    # Backfill the row counters behind includeTotal=true
+    for stmt in counters.rebuild_statements():
+        conn.execute(stmt)
+
+# (table, form type) of the forms whose deletes leave a tombstone for incremental sync
+TOMBSTONED_TABLES = [
+    (models.WheelSpecification.__tablename__, counters.WHEEL_SPECIFICATION),
+    (models.BogieChecksheet.__tablename__, counters.BOGIE_CHECKSHEET),
+]
+
+def _track_deletes(conn: Connection):
+    # Triggers rather than application code, so deletes made outside the API leave a tombstone too
+    models.FormTombstone.__table__.create(bind=conn, checkfirst=True)
+    for model in (models.WheelSpecification, models.BogieChecksheet, models.FormTombstone):
+        for index in model.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            "CREATE OR REPLACE FUNCTION record_form_tombstone() RETURNS trigger AS $$ BEGIN "
+            "INSERT INTO form_tombstones (form_type, form_number) VALUES (TG_ARGV[0], OLD.form_number); "
+            "RETURN OLD; END $$ LANGUAGE plpgsql"
+        )
+        for table, form_type in TOMBSTONED_TABLES:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_tombstone ON {table}")
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION record_form_tombstone('{form_type}')"
+            )
+    elif conn.dialect.name == "sqlite":
+        for table, form_type in TOMBSTONED_TABLES:
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_tombstone AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO form_tombstones (form_type, form_number) VALUES ('{form_type}', OLD.form_number); END"
+            )
+
+def _build_stats(conn: Connection):
+    # Summary rows behind GET /api/forms/stats, backfilled from the forms already stored
+    models.FormStat.__table__.create(bind=conn, checkfirst=True)
+    stats.rebuild(conn)
+
+# (table, index) of the case-insensitive form number prefix search, see app/search.py
+PREFIX_SEARCH_INDEXES = [
+    (models.WheelSpecification.__tablename__, "ix_wheel_specifications_form_number_upper"),
+    (models.BogieChecksheet.__tablename__, "ix_bogie_checksheets_form_number_upper"),
+]
+
+def _create_search_indexes(conn: Connection):
+    for index in models.FormCounter.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    # upper(form_number) in byte order, so a prefix is a range scan. Raw DDL: the expression differs per
+    # dialect, and SQLite does not reflect expression indexes, which checkfirst relies on.
+    collate = ' COLLATE "C"' if conn.dialect.name == "postgresql" else ""
+    for table, index in PREFIX_SEARCH_INDEXES:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ((upper(form_number){collate}), id)")
+    if conn.dialect.name != "postgresql":
+        return
+    # Inspector names by trigram similarity, where the extension can be installed
+    try:
+        with conn.begin_nested():
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DBAPIError as e:
+        logger.warning("pg_trgm is not available (%s); inspector search uses the in-memory trigram index", e.orig)
+        return
+    conn.exec_driver_sql(
+        f"CREATE INDEX IF NOT EXISTS {search.TRGM_INDEX} ON form_counters "
+        f"USING gin (submitted_by gin_trgm_ops) WHERE bucket_date = ''"
+    )
+
+def _add_slot_column(conn: Connection, model, refill: Callable[[Connection], None]):
+    # Adds `slot` to a summary table's primary key; a no-op on tables created with it
+    table = model.__table__
+    if "slot" in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    if conn.dialect.name == "postgresql":
+        constraint = inspect(conn).get_pk_constraint(table.name)["name"]
+        key = ", ".join(column.name for column in table.primary_key.columns)
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN slot SMALLINT NOT NULL DEFAULT 0")
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} DROP CONSTRAINT {constraint}")
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD PRIMARY KEY ({key})")
+    else:
+        # SQLite cannot change a primary key; the rows are derived, so recreate the table and refill it
+        table.drop(bind=conn)
+        table.create(bind=conn)
+        refill(conn)
+
+def _stripe_counters(conn: Connection):
+    _add_slot_column(conn, models.FormCounter, _rebuild_counters)
+
+def _stripe_stats(conn: Connection):
+    _add_slot_column(conn, models.FormStat, stats.rebuild)
+
+def _uncount_deletes(conn: Connection):
+    # Deletes subtract from the form counters in the deleting transaction, API or raw SQL alike: every
+    # bucket of the row, in slot 0 (a count sums the slots). Mirrors counters._buckets().
+    for table, form_type in TOMBSTONED_TABLES:
+        _, submitter, form_date = counters.COUNTED_FORMS[form_type]
+        buckets = (
+            f"SELECT DISTINCT b, d FROM (SELECT '' AS b, '' AS d UNION ALL SELECT '', OLD.{form_date} "
+            f"UNION ALL SELECT OLD.{submitter}, '' UNION ALL SELECT OLD.{submitter}, OLD.{form_date}) AS buckets"
+        )
+        upsert = (
+            f"INSERT INTO form_counters (form_type, submitted_by, bucket_date, slot, row_count) "
+            f"SELECT '{form_type}', b, d, 0, -1 FROM ({buckets}) AS distinct_buckets "
+            f"WHERE b IS NOT NULL AND d IS NOT NULL "
+            f"ON CONFLICT (form_type, submitted_by, bucket_date, slot) "
+            f"DO UPDATE SET row_count = form_counters.row_count + excluded.row_count"
+        )
+        if conn.dialect.name == "postgresql":
+            # OLD.<date> is a DATE here; ::text is the same YYYY-MM-DD the application buckets by
+            upsert = upsert.replace(f"OLD.{form_date}", f"OLD.{form_date}::text")
+            conn.exec_driver_sql(
+                f"CREATE OR REPLACE FUNCTION uncount_{table}() RETURNS trigger AS $$ BEGIN "
+                f"{upsert}; RETURN OLD; END $$ LANGUAGE plpgsql"
+            )
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_uncount ON {table}")
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {table}_uncount AFTER DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION uncount_{table}()"
+            )
+        elif conn.dialect.name == "sqlite":
+            conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {table}_uncount AFTER DELETE ON {table} BEGIN {upsert}; END")
+
+# (version, description, upgrade); append only, never renumber or edit an applied migration
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Create tables", _create_tables),
+    (2, "Form documents to JSONB, form dates to DATE", _convert_columns),
+    (3, "Indexes on existing tables", _create_indexes),
+    (4, "Backfill form counters", _rebuild_counters),
+    (5, "Incremental sync: (updated_at, id) indexes and delete tombstones", _track_deletes),
+    (6, "Inspection statistics summary table", _build_stats),
+    (7, "Search indexes on form numbers and inspector names", _create_search_indexes),
+    (8, "Stripe form counter totals over slot rows", _stripe_counters),
+    (9, "Stripe form statistics measurement rows over slot rows", _stripe_stats),
+    # SQLite databases migrated past 2 before it repaired form dates; a no-op everywhere else
+    (10, "Repair form dates that are not ISO dates", _repair_stored_form_dates),
+    (11, "Subtract deleted forms from the form counters", _uncount_deletes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn: Connection) -> int:
+    """Highest applied migration; 0 for an empty database or one from before versioned migrations"""
+    if not inspect(conn).has_table(models.SchemaVersion.__tablename__):
+        return 0
+    return conn.scalar(select(func.max(models.SchemaVersion.version))) or 0
+
+def migrate(engine: Engine) -> List[Tuple[int, str]]:
+    """Apply every pending migration in order; returns the (version, description) pairs applied"""
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            # Read under the lock: another runner may have applied this version meanwhile
+            if current_version(conn) >= version:
+                continue
+            models.SchemaVersion.__table__.create(bind=conn, checkfirst=True)
+            logger.info("Applying migration %d: %s", version, description)
+            upgrade(conn)
+            conn.execute(insert(models.SchemaVersion).values(version=version, description=description))
+        applied.append((version, description))
+    return applied
+
+async def check(async_engine: AsyncEngine) -> Optional[int]:
+    """
+    Start-up check that the database is migrated, without changing it. Raises SchemaOutdated
+    (or logs a warning with SCHEMA_CHECK=warn) when migrations are pending. Returns the version found.
+    """
+    if SCHEMA_CHECK == "off":
+        return None
+    async with async_engine.connect() as conn:
+        version = await conn.run_sync(current_version)
+    if version < LATEST_VERSION:
+        message = (f"Database schema is at version {version}, this code needs {LATEST_VERSION}; "
+                   "run `python3 setup_database.py` to apply the migrations")
+        if SCHEMA_CHECK != "warn":
+            raise SchemaOutdated(message)
+        logger.warning(message)
+    elif version > LATEST_VERSION:
+        # Expected mid-deploy, while older instances still run next to a migrated database
+        logger.warning("Database schema is at version %d, newer than this code's %d", version, LATEST_VERSION)
+    return version
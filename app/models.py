@@ -1,9 +1,24 @@
-
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Text, Date, TIMESTAMP, Boolean, ForeignKey, JSON, Index
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
 
+# SQLite's CURRENT_TIMESTAMP has whole-second precision. Store bound values the same way
+# so (created_at, id) keyset comparisons line up with server-defaulted rows.
+Timestamp = TIMESTAMP(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
+# Form documents are JSONB on Postgres so field filters can use GIN containment indexes
+# (see app/document_filters.py); other backends keep plain JSON.
+JsonDocument = JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+def gin_index(name: str, column: str):
+    """GIN jsonb_path_ops index on a JSONB document column, created on Postgres only"""
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"}).ddl_if(dialect="postgresql")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -37,18 +52,28 @@ class FormSubmission(Base):
 
 class WheelSpecification(Base):
     __tablename__ = "wheel_specifications"
+    __table_args__ = (
+        # Keyset pagination order, see app/pagination.py
+        Index("ix_wheel_specifications_created_at_id", "created_at", "id"),
+        # Incremental sync order, see app/sync.py
+        Index("ix_wheel_specifications_updated_at_id", "updated_at", "id"),
+        gin_index("ix_wheel_specifications_fields", "fields"),
+        # "everything submitter X did between two dates"
+        Index("ix_wheel_specifications_submitted_by_date", "submitted_by", "submitted_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     form_number = Column(String(100), unique=True, nullable=False, index=True)
     submitted_by = Column(String(100), nullable=False)
-    submitted_date = Column(String(20), nullable=False)  # Store as string to match API
+    submitted_date = Column(Date, nullable=False)  # API keeps the YYYY-MM-DD string
+    submitted_date_unparsed = Column(String(20), nullable=True)  # legacy non-ISO value (see migrations._repair_form_dates)
     status = Column(String(50), default="Saved")
     
     # Store the complex fields as JSON to match the API structure
-    fields = Column(JSON, nullable=False)
+    fields = Column(JsonDocument, nullable=False)
     
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
-    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
     
     # Foreign key to user
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -56,21 +81,92 @@ class WheelSpecification(Base):
 
 class BogieChecksheet(Base):
     __tablename__ = "bogie_checksheets"
+    __table_args__ = (
+        # Keyset pagination order, see app/pagination.py
+        Index("ix_bogie_checksheets_created_at_id", "created_at", "id"),
+        # Incremental sync order, see app/sync.py
+        Index("ix_bogie_checksheets_updated_at_id", "updated_at", "id"),
+        gin_index("ix_bogie_checksheets_bogie_details", "bogie_details"),
+        gin_index("ix_bogie_checksheets_bogie_checksheet", "bogie_checksheet"),
+        gin_index("ix_bogie_checksheets_bmbc_checksheet", "bmbc_checksheet"),
+        # "everything inspector X did between two dates"
+        Index("ix_bogie_checksheets_inspection_by_date", "inspection_by", "inspection_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     form_number = Column(String(100), unique=True, nullable=False, index=True)
     inspection_by = Column(String(100), nullable=False)
-    inspection_date = Column(String(20), nullable=False)  # Store as string to match API
+    inspection_date = Column(Date, nullable=False)  # API keeps the YYYY-MM-DD string
+    inspection_date_unparsed = Column(String(20), nullable=True)  # legacy non-ISO value (see migrations._repair_form_dates)
     status = Column(String(50), default="Saved")
     
     # Store the complex nested data as JSON
-    bogie_details = Column(JSON, nullable=False)
-    bogie_checksheet = Column(JSON, nullable=False)
-    bmbc_checksheet = Column(JSON, nullable=False)
+    bogie_details = Column(JsonDocument, nullable=False)
+    bogie_checksheet = Column(JsonDocument, nullable=False)
+    bmbc_checksheet = Column(JsonDocument, nullable=False)
     
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
-    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
     
     # Foreign key to user
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user = relationship("User", back_populates="bogie_checksheets")
+
+# Row counters maintained in the same transaction as every insert/delete (see app/counters.py)
+class FormCounter(Base):
+    __tablename__ = "form_counters"
+    __table_args__ = (
+        # Per-submitter totals, which double as the inspector names search matches (see app/search.py)
+        Index("ix_form_counters_form_type_bucket_date", "form_type", "bucket_date", "submitted_by"),
+    )
+
+    form_type = Column(String(50), primary_key=True)
+    submitted_by = Column(String(100), primary_key=True, default="")  # "" = every submitter
+    bucket_date = Column(String(20), primary_key=True, default="")  # "" = every date
+    # Every-submitter rows are spread over counters.COUNTER_SLOTS slots, summed when read
+    slot = Column(SmallInteger, primary_key=True, autoincrement=False, default=0, server_default="0")
+    row_count = Column(BigInteger, nullable=False, default=0)
+
+# Inspection statistics per form date, maintained with every insert (see app/stats.py)
+class FormStat(Base):
+    __tablename__ = "form_stats"
+
+    form_type = Column(String(50), primary_key=True)
+    stat_date = Column(Date, primary_key=True)
+    inspector = Column(String(100), primary_key=True, default="")  # "" on measurement rows
+    status = Column(String(50), primary_key=True, default="")  # "" on measurement rows
+    metric = Column(String(100), primary_key=True, default="")  # "" = form count, else e.g. "condemningDia"
+    bucket = Column(String(50), primary_key=True, default="")  # histogram bucket or check result
+    # Measurement rows are spread over counters.COUNTER_SLOTS slots, summed when read
+    slot = Column(SmallInteger, primary_key=True, autoincrement=False, default=0, server_default="0")
+    row_count = Column(BigInteger, nullable=False, default=0)
+
+# Deleted KPA forms, written by a database trigger on every DELETE (see app/sync.py)
+class FormTombstone(Base):
+    __tablename__ = "form_tombstones"
+    __table_args__ = (
+        Index("ix_form_tombstones_form_type_deleted_at_id", "form_type", "deleted_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    form_type = Column(String(50), nullable=False)
+    form_number = Column(String(100), nullable=False)
+    deleted_at = Column(Timestamp, server_default=func.now(), nullable=False)
+
+# Stored responses for the Idempotency-Key header on form submissions (see app/idempotency.py)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # sha256 of route + request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(JSON, nullable=False)
+    created_at = Column(Timestamp, server_default=func.now(), nullable=False)
+
+# One row per applied schema migration (see app/migrations.py)
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255), nullable=False)
+    applied_at = Column(Timestamp, server_default=func.now(), nullable=False)
@@ -0,0 +1,45 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import literal, tuple_
+
+# Keyset (cursor) pagination for the KPA list endpoints.
+# Rows are ordered on (created_at, id) and a cursor is the opaque encoding of the
+# last row's key, so every page is an index range scan no matter how deep it is.
+
+def keyset_order(model):
+    """ORDER BY clause shared by every keyset-paginated query"""
+    return (model.created_at, model.id)
+
+def keyset_filters(model, after: Optional[Tuple[datetime, int]]):
+    """WHERE criteria selecting the rows that come after the decoded cursor"""
+    if after is None:
+        return []
+    created_at, row_id = after
+    # Bind through the column types so the cursor compares exactly like the stored values
+    return [
+        tuple_(model.created_at, model.id)
+        > tuple_(literal(created_at, model.created_at.type), literal(row_id, model.id.type))
+    ]
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a row key as an opaque URL-safe cursor"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def next_cursor(items, limit: int) -> Optional[str]:
+    """Cursor for the page after `items`, which were fetched with limit + 1 to detect a next page"""
+    if len(items) <= limit:
+        return None
+    last = items[limit - 1]
+    return encode_cursor(last.created_at, last.id)
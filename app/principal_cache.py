@@ -0,0 +1,119 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+# In-process cache of verified bearer tokens for get_current_user.
+# Entries are keyed by the token's sha256 digest and hold the decoded claims plus a light
+# user snapshot, so a hit skips both the JWT signature check and the users lookup.
+# An entry never outlives the token's exp claim or PRINCIPAL_CACHE_TTL_SECONDS.
+# Invalidation is per process: other workers pick up a deactivation within the TTL.
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """The user fields request handlers need, detached from any DB session"""
+    id: int
+    phone_number: str
+    is_active: bool
+
+@dataclass
+class _Entry:
+    claims: dict
+    user: UserSnapshot
+    expires_at: float
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, _Entry]" = OrderedDict()
+_digests_by_user: Dict[int, Set[str]] = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "hit_seconds": 0.0, "miss_seconds": 0.0}
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _drop(digest: str):
+    entry = _entries.pop(digest, None)
+    if entry is not None:
+        digests = _digests_by_user.get(entry.user.id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del _digests_by_user[entry.user.id]
+
+def get(token: str) -> Optional[UserSnapshot]:
+    """Cached user for a token that was verified before and has not expired"""
+    digest = token_digest(token)
+    with _lock:
+        entry = _entries.get(digest)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            _drop(digest)
+            return None
+        _entries.move_to_end(digest)
+        return entry.user
+
+def put(token: str, claims: dict, user: UserSnapshot):
+    """Cache a verified token until min(exp, now + TTL), evicting the least recently used entry"""
+    expires_at = time.time() + PRINCIPAL_CACHE_TTL_SECONDS
+    if claims.get("exp") is not None:
+        expires_at = min(expires_at, float(claims["exp"]))
+    if expires_at <= time.time() or PRINCIPAL_CACHE_SIZE <= 0:
+        return
+    digest = token_digest(token)
+    with _lock:
+        _drop(digest)
+        _entries[digest] = _Entry(claims=claims, user=user, expires_at=expires_at)
+        _digests_by_user.setdefault(user.id, set()).add(digest)
+        while len(_entries) > PRINCIPAL_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+            _stats["evictions"] += 1
+
+def invalidate_user(user_id: int):
+    """Forget every cached token of a user, e.g. after deactivating them"""
+    with _lock:
+        for digest in list(_digests_by_user.get(user_id, ())):
+            _drop(digest)
+            _stats["invalidations"] += 1
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _digests_by_user.clear()
+
+def record(hit: bool, seconds: float):
+    """Account one get_current_user call for the hit-rate and latency-saved metrics"""
+    with _lock:
+        if hit:
+            _stats["hits"] += 1
+            _stats["hit_seconds"] += seconds
+        else:
+            _stats["misses"] += 1
+            _stats["miss_seconds"] += seconds
+
+def stats() -> dict:
+    """Hit rate and estimated per-request latency saved by cache hits"""
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+        avg_hit = _stats["hit_seconds"] / hits if hits else 0.0
+        avg_miss = _stats["miss_seconds"] / misses if misses else 0.0
+        saved_per_hit = max(avg_miss - avg_hit, 0.0) if hits and misses else 0.0
+        return {
+            "size": len(_entries),
+            "max_size": PRINCIPAL_CACHE_SIZE,
+            "ttl_seconds": PRINCIPAL_CACHE_TTL_SECONDS,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": _stats["evictions"],
+            "invalidations": _stats["invalidations"],
+            "avg_hit_ms": round(avg_hit * 1000, 3),
+            "avg_miss_ms": round(avg_miss * 1000, 3),
+            "saved_ms_per_hit": round(saved_per_hit * 1000, 3),
+            "saved_ms_total": round(saved_per_hit * hits * 1000, 1),
+        }
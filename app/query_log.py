@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import metrics
+
+# Slow-query log and per-request query budgets.
+# Any statement slower than SLOW_QUERY_MS is logged with its redacted parameters, duration and the
+# route template that issued it, and kept in a ring buffer behind /internal/slow-queries.
+# With SLOW_QUERY_EXPLAIN=true on Postgres, the first slow occurrence of each statement fingerprint
+# also gets an EXPLAIN (ANALYZE, BUFFERS). That runs the SELECT a second time inside a savepoint,
+# so it is off by default. query_budget() counts the statements issued by a block of code, so N+1
+# regressions fail in CI (see benchmarks/query_budgets.py).
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables the slow-query log
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    """A block issued more SQL statements than its query_budget allows"""
+
+_lock = threading.Lock()
+_recent = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_seen = set()  # fingerprints already logged once, so EXPLAIN runs on the first only
+_stats = {"slow_queries": 0, "explains": 0, "explain_errors": 0}
+_budget: ContextVar[Optional[List[str]]] = ContextVar("query_budget", default=None)
+
+# Bind placeholders of every supported driver (?, $1, %(name)s), string and numeric literals, with any ::cast
+_PLACEHOLDERS = re.compile(r"(?:'(?:[^']|'')*'|\$\d+|%\(\w+\)s|\b\d+(?:\.\d+)?\b)(?:::\w+)?")
+_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+def fingerprint(statement: str) -> str:
+    """Stable id for a statement's shape: IN lists and multi-row VALUES of any length share one"""
+    normalized = _PLACEHOLDERS.sub("?", " ".join(statement.split()))
+    normalized = _ROWS.sub("(?)", _LISTS.sub("?", normalized))
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+def _redact_value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+def redact(parameters, executemany: bool = False):
+    """Parameters with strings and documents replaced by their type and length; numbers and dates are kept"""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return {name: _redact_value(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact_value(value) for value in parameters]
+    return _redact_value(parameters)
+
+def _explain(conn, statement: str, parameters) -> str:
+    """EXPLAIN (ANALYZE, BUFFERS) on a fresh cursor, inside a savepoint so an error cannot abort the transaction"""
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        cursor.close()
+
+def _should_explain(conn, statement: str, context, executemany: bool) -> bool:
+    return (
+        SLOW_QUERY_EXPLAIN
+        and conn.dialect.name == "postgresql"
+        and not executemany
+        # EXPLAIN ANALYZE executes the statement: never repeat a write, never disturb a server-side cursor
+        and statement.lstrip()[:6].upper() == "SELECT"
+        and not context.execution_options.get("stream_results")
+    )
+
+def _record_slow(conn, statement: str, parameters, context, executemany: bool, duration_ms: float):
+    statement_id = fingerprint(statement)
+    with _lock:
+        _stats["slow_queries"] += 1
+        first = statement_id not in _seen
+        if first:
+            _seen.add(statement_id)
+
+    plan = None
+    if first and _should_explain(conn, statement, context, executemany):
+        try:
+            plan = _explain(conn, statement, parameters)
+            with _lock:
+                _stats["explains"] += 1
+        except Exception as e:
+            logger.warning("EXPLAIN failed for slow query %s: %s", statement_id, e)
+            with _lock:
+                _stats["explain_errors"] += 1
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "route": metrics.current_route(),
+        "duration_ms": round(duration_ms, 2),
+        "fingerprint": statement_id,
+        "statement": " ".join(statement.split()),
+        "parameters": redact(parameters, executemany),
+        "explain": plan,
+    }
+    with _lock:
+        _recent.append(entry)
+    logger.warning(
+        "Slow query %.1f ms on %s [%s]: %s %s",
+        duration_ms, entry["route"] or "-", statement_id, entry["statement"], entry["parameters"],
+    )
+    if plan:
+        logger.warning("EXPLAIN (ANALYZE, BUFFERS) for [%s]:\n%s", statement_id, plan)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and SLOW_QUERY_MS:
+        context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    budget = _budget.get()
+    if budget is not None:
+        budget.append(statement)
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= SLOW_QUERY_MS:
+            _record_slow(conn, statement, parameters, context, executemany, duration_ms)
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block"):
+    """
+    Raise QueryBudgetExceeded if the code inside issues more than max_queries SQL statements.
+    Counts every engine in the current context, including requests served in-process through
+    httpx.ASGITransport:
+
+        with query_budget(2, "GET /api/forms/bogie-checksheet"):
+            await client.get("/api/forms/bogie-checksheet")
+
+    Yields the list of statements seen so far.
+    """
+    statements: List[str] = []
+    token = _budget.set(statements)
+    try:
+        yield statements
+    finally:
+        _budget.reset(token)
+    if len(statements) > max_queries:
+        listing = "\n".join(f"  {' '.join(statement.split())}" for statement in statements)
+        raise QueryBudgetExceeded(f"{label} issued {len(statements)} queries, budget is {max_queries}:\n{listing}")
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "threshold_ms": SLOW_QUERY_MS,
+            "explain": SLOW_QUERY_EXPLAIN,
+            **_stats,
+            "recent": list(reversed(_recent)),
+        }
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .client_address import client_address
+
+# Read-your-writes window for replica reads.
+# Replicas apply the primary's writes with some lag, so a client that has just written would
+# not find its own form on a replica. Write sessions are tagged with the writer's keys (the client
+# address, plus the user id on authenticated routes); their commit records the keys, and reads by
+# the same keys go to the primary for READ_YOUR_WRITES_SECONDS. Set it above the worst replica lag.
+# Like the principal cache this is per process, so behind several workers it holds only when the
+# write and the read reach the same worker (sticky sessions on the load balancer).
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_SIZE = int(os.getenv("READ_YOUR_WRITES_SIZE", "100000"))  # most writers tracked at once
+
+_lock = threading.Lock()
+_writes: "OrderedDict[str, float]" = OrderedDict()  # key -> monotonic time of its last commit
+_stats = {"primary_reads": 0, "replica_reads": 0, "writes": 0}
+
+_KEYS = "read_your_writes_keys"
+
+def client_key(request) -> Optional[str]:
+    """Key for the client that sent a request: its address, the same one admission control uses"""
+    address = client_address(request.scope)
+    return f"client:{address}" if address else None
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def track(db, *keys: Optional[str]):
+    """Record `keys` as writers once the session's current transaction commits"""
+    db.info.setdefault(_KEYS, set()).update(key for key in keys if key)
+
+@event.listens_for(Session, "after_commit")
+def _record_writes(session):
+    keys = session.info.pop(_KEYS, None)
+    if not keys:
+        return
+    now = time.monotonic()
+    with _lock:
+        for key in keys:
+            _writes.pop(key, None)
+            _writes[key] = now
+        while len(_writes) > READ_YOUR_WRITES_SIZE:
+            _writes.popitem(last=False)
+        _stats["writes"] += 1
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop(_KEYS, None)
+
+def wrote_recently(keys: Iterable[Optional[str]]) -> bool:
+    """True if any of `keys` committed a write within the window; reads for them must see the primary"""
+    cutoff = time.monotonic() - READ_YOUR_WRITES_SECONDS
+    with _lock:
+        # Oldest first: drop expired entries so the map only holds writers inside the window
+        while _writes and next(iter(_writes.values())) <= cutoff:
+            _writes.popitem(last=False)
+        return any(key in _writes for key in keys if key)
+
+def record_read(primary: bool):
+    with _lock:
+        _stats["primary_reads" if primary else "replica_reads"] += 1
+
+def stats() -> dict:
+    with _lock:
+        return {"window_seconds": READ_YOUR_WRITES_SECONDS, "tracked_writers": len(_writes), **_stats}
@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+# Response cache for the KPA list endpoints.
+# Serialized bodies are cached per (route, normalised query string) under a version per form
+# type. Commits that wrote forms of that type bump its version (write-through invalidation),
+# so older entries are never read again and age out of the LRU. Every cached body carries
+# an ETag, and a poll whose If-None-Match is still current gets a 304 without touching the database.
+# A shared backend (Redis) is called from the threadpool, never on the event loop: its round-trips
+# would stall every other request on this worker.
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")  # e.g. redis://localhost:6379/0 to share between workers
+# The in-process cache only sees this worker's writes: with `--workers N` another worker's write shows
+# once the entry expires, so entries live briefly unless the cache is shared
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300" if RESPONSE_CACHE_URL else "5"))
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+class CacheBackend:
+    """Storage for cached responses and per-namespace versions"""
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: CachedResponse):
+        raise NotImplementedError
+
+    def version(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def bump(self, namespace: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with a TTL; versions are only seen by this worker's writes"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._versions = {}
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace: str):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisBackend(CacheBackend):
+    """
+    Shared backend for any redis-py compatible client (Redis, or a local stand-in such as KeyDB),
+    so every worker sees every version bump. Size bounding is left to the server's maxmemory LRU policy.
+    """
+
+    def __init__(self, client, ttl_seconds: float, prefix: str = "kpa:response-cache:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return CachedResponse(body=body, etag=etag.decode())
+
+    def set(self, key: str, value: CachedResponse):
+        self.client.set(self.prefix + key, value.etag.encode() + b"\n" + value.body, ex=max(int(self.ttl_seconds), 1))
+
+    def version(self, namespace: str) -> int:
+        return int(self.client.get(self.prefix + "version:" + namespace) or 0)
+
+    def bump(self, namespace: str):
+        self.client.incr(self.prefix + "version:" + namespace)
+
+    def clear(self, batch_size: int = 1000):
+        # UNLINK frees the memory in the background, one round-trip per batch of keys
+        versions = (self.prefix + "version:").encode()
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + "*", count=batch_size):
+            if not key.startswith(versions):
+                batch.append(key)
+            if len(batch) >= batch_size:
+                self.client.unlink(*batch)
+                batch = []
+        if batch:
+            self.client.unlink(*batch)
+
+def _create_backend() -> CacheBackend:
+    if RESPONSE_CACHE_URL:
+        import redis  # only needed for a shared cache
+
+        return RedisBackend(redis.Redis.from_url(RESPONSE_CACHE_URL), RESPONSE_CACHE_TTL_SECONDS)
+    return MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+backend: CacheBackend = _create_backend()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+def set_backend(new_backend: CacheBackend):
+    """Swap the cache backend, e.g. for a shared store in multi-worker deployments"""
+    global backend
+    backend = new_backend
+
+# Write-through invalidation: crud marks the session, the commit bumps the versions
+_CHANGED_KEY = "response_cache_changed"
+
+def mark_changed(db, namespace: str):
+    """Invalidate `namespace` once the session's current transaction commits"""
+    db.info.setdefault(_CHANGED_KEY, set()).add(namespace)
+
+# Version bumps of a shared backend still on their way to it; cache_key() waits for them, so a read
+# on this worker never sees the version from before its own write
+_pending_bumps = set()
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed(session):
+    for namespace in session.info.pop(_CHANGED_KEY, ()):
+        _bump(namespace)
+        _stats["invalidations"] += 1
+
+def _bump(namespace: str):
+    if isinstance(backend, MemoryBackend):
+        backend.bump(namespace)
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        backend.bump(namespace)  # a threadpool handler or a script, not the event loop
+        return
+    bump = loop.run_in_executor(None, backend.bump, namespace)
+    _pending_bumps.add(bump)
+    bump.add_done_callback(_bump_done)
+
+def _bump_done(bump: asyncio.Future):
+    _pending_bumps.discard(bump)
+    if not bump.cancelled() and bump.exception() is not None:
+        logger.error("Response cache invalidation failed; entries stay stale for up to %ss",
+                     RESPONSE_CACHE_TTL_SECONDS, exc_info=bump.exception())
+
+async def _call(fn, *args):
+    """Run a backend call, in the threadpool unless it is the in-process LRU"""
+    if isinstance(backend, MemoryBackend):
+        return fn(*args)
+    return await run_in_threadpool(fn, *args)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+# namespace -> (version, monotonic time this worker first saw it), for changed_within()
+_versions_seen: Dict[str, Tuple[int, float]] = {}
+
+async def cache_key(namespace: str, route: str, query_params: Iterable[Tuple[str, str]]) -> str:
+    """Key for one response: namespace version, route and the query parameters in sorted order"""
+    query = urlencode(sorted((name, value) for name, value in query_params if value != ""))
+    if _pending_bumps:
+        await asyncio.wait(list(_pending_bumps))
+    version = await _call(backend.version, namespace)
+    seen = _versions_seen.get(namespace)
+    if seen is None or seen[0] != version:
+        _versions_seen[namespace] = (version, time.monotonic())
+    return f"{namespace}:{version}:{route}?{query}"
+
+def changed_within(namespace: str, seconds: float) -> bool:
+    """
+    True if this worker saw `namespace` change version in the last `seconds` (or has not seen it yet).
+    A body read from a lagging replica in that window may predate the write, so it must not be cached.
+    """
+    seen = _versions_seen.get(namespace)
+    return seen is None or time.monotonic() - seen[1] < seconds
+
+async def get(key: str) -> Optional[CachedResponse]:
+    cached = await _call(backend.get, key)
+    _stats["hits" if cached is not None else "misses"] += 1
+    return cached
+
+async def put(key: str, body: bytes, store: bool = True) -> CachedResponse:
+    """Cache a serialized body under its ETag; store=False only computes the ETag"""
+    cached = CachedResponse(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+    if store:
+        await _call(backend.set, key, cached)
+    return cached
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def respond(cached: CachedResponse, if_none_match: Optional[str], media_type: str = "application/json") -> Response:
+    """200 with the cached body, or 304 when the client already holds this ETag"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if _matches(if_none_match, cached.etag):
+        _stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type=media_type, headers=headers)
+
+def stats() -> dict:
+    """Hit rate, 304s served and invalidations of the response cache"""
+    hits, misses = _stats["hits"], _stats["misses"]
+    return {
+        "backend": type(backend).__name__,
+        "size": len(backend) if isinstance(backend, MemoryBackend) else None,
+        "max_size": RESPONSE_CACHE_SIZE,
+        "ttl_seconds": RESPONSE_CACHE_TTL_SECONDS,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "not_modified": _stats["not_modified"],
+        "invalidations": _stats["invalidations"],
+    }
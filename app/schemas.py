@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List, Dict, Any
 import datetime
 
@@ -59,12 +59,19 @@ class Form(FormBase):
 # Schema for pagination
 class FormList(BaseModel):
     items: List[Form]
-    total: int
+    total: Optional[int] = None  # only computed with includeTotal
     skip: int
     limit: int
 
 # KPA-Specific Schemas matching Postman collection
 
+def iso_date(value: str) -> str:
+    """Check a form date is a calendar date and normalise it to YYYY-MM-DD (stored as DATE)"""
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError("must be a date in YYYY-MM-DD format")
+
 # Wheel Specification Schemas
 class WheelSpecificationFields(BaseModel):
     treadDiameterNew: Optional[str] = None
@@ -89,6 +96,8 @@ class WheelSpecificationCreate(BaseModel):
     submittedDate: str
     fields: WheelSpecificationFields
 
+    _check_submitted_date = field_validator("submittedDate")(iso_date)
+
 class WheelSpecificationResponse(BaseModel):
     formNumber: str
     submittedBy: str
@@ -128,6 +137,8 @@ class BogieChecksheetCreate(BaseModel):
     bogieChecksheet: BogieChecksheetFields
     bmbcChecksheet: BmbcChecksheetFields
 
+    _check_inspection_date = field_validator("inspectionDate")(iso_date)
+
 class BogieChecksheetResponse(BaseModel):
     formNumber: str
     inspectionBy: str
@@ -143,7 +154,13 @@ class KPASuccessResponse(BaseModel):
     message: str
     data: Dict[str, Any]
 
+class KPABatchRequest(BaseModel):
+    # Raw forms, validated one by one so a bad item does not reject the whole batch
+    forms: List[Any]
+
 class KPAListResponse(BaseModel):
     success: bool = True
     message: str
-    data: List[Dict[str, Any]]
\ No newline at end of file
+    data: List[Dict[str, Any]]
+    nextCursor: Optional[str] = None
+    total: Optional[int] = None  # only computed with includeTotal
\ No newline at end of file
@@ -0,0 +1,224 @@
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from sqlalchemy import String, and_, cast, func, literal, literal_column, or_, select, text, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import counters, models
+
+# Search over form numbers and inspector names (the `q` parameter of the KPA list endpoints).
+# q matches forms whose form number starts with it, ignoring case, and forms by inspectors whose name
+# is similar to it, so a typo still finds them. Results come in tiers: form number matches first,
+# in form number order, then each matching inspector's forms, most similar name first, newest form
+# first. A form number prefix is a range scan on upper(form_number) in byte order (migration 7).
+# Names are matched against the distinct inspectors in form_counters, never against the forms: on
+# Postgres with pg_trgm through a trigram GIN index, otherwise (SQLite, or Postgres without the
+# extension) through an in-memory trigram index of the names that each process reloads every
+# SEARCH_INDEX_REFRESH_SECONDS. A page is one UNION ALL of an index-ordered query per tier.
+
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.3"))  # pg_trgm's default threshold
+SEARCH_MAX_INSPECTORS = int(os.getenv("SEARCH_MAX_INSPECTORS", "5"))
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
+MAX_QUERY_LENGTH = 100
+TRGM_INDEX = "ix_form_counters_inspector_trgm"
+
+FORM_NUMBER_TIER = "formNumber"
+
+# Words are runs of letters and digits, as in pg_trgm
+_WORD = re.compile(r"[^\W_]+")
+
+def trigrams(value: str) -> FrozenSet[str]:
+    """pg_trgm's trigrams of a string: per lower-cased word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in _WORD.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+class TrigramIndex:
+    """In-memory trigram index over a set of names, scored like pg_trgm's similarity()"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._grams: Dict[str, FrozenSet[str]] = {}
+        self._postings: Dict[str, set] = defaultdict(set)
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._grams)
+
+    def add(self, name: str):
+        if name in self._grams:
+            return
+        self._grams[name] = trigrams(name)
+        for gram in self._grams[name]:
+            self._postings[gram].add(name)
+
+    def search(self, value: str, limit: int, min_similarity: float) -> List[Tuple[str, float]]:
+        """Up to `limit` (name, similarity) pairs at or above min_similarity, most similar first"""
+        grams = trigrams(value)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for name, count in shared.items():
+            score = round(count / (len(grams) + len(self._grams[name]) - count), 4)
+            if score >= min_similarity:
+                scored.append((name, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+# form type -> (monotonic time loaded, index of its inspector names)
+_indexes: Dict[str, Tuple[float, TrigramIndex]] = {}
+_load_lock = asyncio.Lock()
+_pg_trgm: Optional[bool] = None
+
+def _inspector_names(form_type: str):
+    counter = models.FormCounter
+    return select(counter.submitted_by).where(
+        counter.form_type == form_type,
+        # A literal so Postgres can match the partial trigram index
+        counter.bucket_date == literal_column("''"),
+        counter.submitted_by != counters.ALL,
+        counter.row_count > 0
+    )
+
+async def _inspector_index(db: AsyncSession, form_type: str) -> TrigramIndex:
+    loaded = _indexes.get(form_type)
+    if loaded and time.monotonic() - loaded[0] < SEARCH_INDEX_REFRESH_SECONDS:
+        return loaded[1]
+    async with _load_lock:
+        loaded = _indexes.get(form_type)
+        if loaded and time.monotonic() - loaded[0] < SEARCH_INDEX_REFRESH_SECONDS:
+            return loaded[1]
+        index = TrigramIndex((await db.scalars(_inspector_names(form_type))).all())
+        _indexes[form_type] = (time.monotonic(), index)
+        return index
+
+async def _has_pg_trgm(db: AsyncSession) -> bool:
+    global _pg_trgm
+    if _pg_trgm is None:
+        _pg_trgm = bool(await db.scalar(text("SELECT to_regclass(:name) IS NOT NULL").bindparams(name=TRGM_INDEX)))
+    return _pg_trgm
+
+async def matching_inspectors(db: AsyncSession, form_type: str, q: str) -> List[Tuple[str, float]]:
+    """(name, similarity) of the inspectors whose name is most similar to q, most similar first"""
+    if db.get_bind().dialect.name == "postgresql" and await _has_pg_trgm(db):
+        name = models.FormCounter.submitted_by
+        score = func.similarity(name, q)
+        rows = (await db.execute(
+            _inspector_names(form_type).add_columns(score)
+            .where(name.op("%")(q), score >= SEARCH_MIN_SIMILARITY)
+            .order_by(score.desc(), name)
+            .limit(SEARCH_MAX_INSPECTORS)
+        )).all()
+        return [(row[0], round(float(row[1]), 4)) for row in rows]
+    index = await _inspector_index(db, form_type)
+    return index.search(q, SEARCH_MAX_INSPECTORS, SEARCH_MIN_SIMILARITY)
+
+def form_number_key(model, dialect_name: str):
+    """upper(form_number) in byte order, exactly as the prefix search index holds it"""
+    key = func.upper(model.form_number)
+    return key.collate("C") if dialect_name == "postgresql" else key
+
+def _prefix_criteria(key, q: str) -> list:
+    # SQLite's upper() and Postgres' in the C locale only fold ASCII letters
+    prefix = "".join(c.upper() if c.isascii() else c for c in q)
+    criteria = [key >= prefix]
+    if ord(prefix[-1]) < 0x10FFFF:
+        criteria.append(key < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return criteria
+
+def encode_cursor(tier: Any, key: str, row_id: int) -> str:
+    """Opaque cursor after a search result: its tier and its position in that tier"""
+    raw = json.dumps([tier, key, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, str, int]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        tier, key, row_id = json.loads(raw)
+        if tier != FORM_NUMBER_TIER:
+            score, name = tier
+            tier = [float(score), str(name)]
+        return tier, str(key), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _tier_order(tier) -> tuple:
+    return (0,) if tier == FORM_NUMBER_TIER else (1, -tier[0], tier[1])
+
+async def page(
+    db: AsyncSession,
+    form_type: str,
+    q: str,
+    criteria: list,
+    projection: list,
+    limit: int,
+    after: Optional[Tuple[Any, str, int]] = None,
+    include_total: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of the forms matching q and `criteria`, in rank order, after the decoded cursor.
+    `projection` are the list columns (crud.list_projection()); returns items, total and next_cursor.
+    """
+    model, inspector_name, date_name = counters.COUNTED_FORMS[form_type]
+    inspector, form_date = getattr(model, inspector_name), getattr(model, date_name)
+    key = form_number_key(model, db.get_bind().dialect.name)
+    is_prefix = _prefix_criteria(key, q)
+    inspectors = await matching_inspectors(db, form_type, q)
+
+    # search_key is the tier position a cursor keeps; no COLLATE on it, so the UNION's collations agree
+    tiers = [(FORM_NUMBER_TIER, is_prefix, func.upper(model.form_number), (key, model.id))]
+    for name, score in inspectors:
+        # A form matching both ways stays in the form number tier
+        tiers.append(([score, name], [inspector == name, ~and_(*is_prefix)], cast(form_date, String),
+                      (form_date.desc(), model.id.desc())))
+
+    selects = []
+    for tier_no, (tier, match, sort_key, order) in enumerate(tiers):
+        keyset = []
+        if after is not None:
+            if _tier_order(tier) < _tier_order(after[0]):
+                continue
+            if _tier_order(tier) == _tier_order(after[0]):
+                if tier == FORM_NUMBER_TIER:
+                    keyset = [tuple_(key, model.id) > tuple_(literal(after[1]), literal(after[2], model.id.type))]
+                else:
+                    keyset = [tuple_(form_date, model.id) < tuple_(
+                        literal(date.fromisoformat(after[1]), form_date.type), literal(after[2], model.id.type)
+                    )]
+        selects.append(
+            select(*projection, sort_key.label("search_key"), literal(tier_no).label("search_tier"),
+                   func.row_number().over(order_by=order).label("search_ordinal"))
+            .where(*criteria, *match, *keyset)
+            .order_by(*order)
+            .limit(limit + 1)
+            .subquery()
+        )
+
+    items = []
+    if selects:
+        matches = union_all(*[select(subquery) for subquery in selects]).subquery()
+        items = (await db.execute(
+            select(matches).order_by(matches.c.search_tier, matches.c.search_ordinal).limit(limit + 1)
+        )).all()
+
+    total = None
+    if include_total:
+        names = [name for name, _ in inspectors]
+        total = await db.scalar(
+            select(func.count()).select_from(model)
+            .where(*criteria, or_(and_(*is_prefix), inspector.in_(names)) if names else and_(*is_prefix))
+        )
+    next_cursor = None
+    if len(items) > limit:
+        last = items[limit - 1]
+        next_cursor = encode_cursor(tiers[last.search_tier][0], last.search_key, last.id)
+    return {"items": items[:limit], "total": total, "next_cursor": next_cursor}
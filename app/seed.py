@@ -0,0 +1,259 @@
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import orjson
+from sqlalchemy import select
+from . import models
+from .auth import get_password_hash
+
+# Synthetic, production-sized data for local benchmarking (setup_database.py --seed).
+# Rows are generated a batch at a time, one column at a time, from per-table random.Random
+# instances seeded with (seed, table), so the same seed and row counts always produce the same rows.
+# Postgres loads each batch with COPY FROM STDIN out of an in-memory CSV buffer; other databases
+# use one executemany per batch. Secondary indexes are dropped during the load and rebuilt once
+# at the end, which is much faster than updating them row by row.
+
+SEED_BATCH_SIZE = 50_000  # fixed: changing it would change the generated rows
+SEED_PASSWORD = "seed-password"  # every seeded user logs in with this; hashed once, not per user
+
+# Measurements as (low, high, decimals, label); values mostly fall inside the range and
+# SeedConfig.defect_rate of them fall just outside it
+WHEEL_MEASUREMENTS = {
+    "treadDiameterNew": (900, 1000, 0, "(900-1000)"),
+    "lastShopIssueSize": (800, 900, 0, "(800-900)"),
+    "condemningDia": (800, 900, 0, "(800-900)"),
+    "wheelGauge": (1599, 1602, 0, "(+2,-1)"),
+    "variationSameAxle": (0, 0.5, 1, ""),
+    "variationSameBogie": (0, 5, 0, ""),
+    "variationSameCoach": (0, 13, 0, ""),
+    "wheelProfile": (22, 32, 1, "Flange Thickness"),
+    "intermediateWWP": (20, 28, 0, ""),
+    "bearingSeatDiameter": (130.043, 130.068, 3, ""),
+    "rollerBearingOuterDia": (279.965, 280, 3, ""),
+    "rollerBearingBoreDia": (129.975, 130, 3, ""),
+    "rollerBearingWidth": (92.75, 93, 2, ""),
+    "axleBoxHousingBoreDia": (280.03, 280.052, 3, ""),
+    "wheelDiscWidth": (127, 131, 0, ""),
+}
+BOGIE_CONDITIONS = ("Good", ["Worn", "Cracked", "Corroded", "Bent"])
+BMBC_CONDITIONS = ("GOOD", ["WORN OUT", "DAMAGED", "LEAKING"])
+DIVISIONS = ["NR", "CR", "WR", "ER", "SR", "SCR", "SER", "NFR", "NWR", "ECR"]
+MAKERS = ["RDSO", "ICF", "RCF", "MCF", "BEML"]
+DEFICITS = ["None", "Brake block", "Side bearer", "Spring", "Damper"]
+FIRST_NAMES = ["Asha", "Ravi", "Meera", "Arjun", "Kiran", "Priya", "Vikram", "Neha", "Suresh", "Anita"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Iyer", "Singh", "Das", "Nair", "Gupta", "Khan", "Joshi"]
+CITIES = ["Bengaluru", "Mumbai", "Delhi", "Chennai", "Kolkata", "Hyderabad", "Pune", "Jaipur"]
+
+@dataclass
+class SeedConfig:
+    seed: int = 42
+    wheel_specifications: int = 500_000
+    bogie_checksheets: int = 500_000
+    form_submissions: int = 100_000
+    users: int = 10_000
+    inspectors: int = 200
+    inspector_skew: float = 1.1  # Zipf exponent for forms per inspector; 0 = every inspector equally busy
+    start_date: date = date(2024, 1, 1)
+    days: int = 365
+    defect_rate: float = 0.1  # share of checks not in good condition / measurements out of range
+
+class _Generator:
+    """Column generators for one table, drawing from that table's own random stream"""
+
+    def __init__(self, config: SeedConfig, table: str):
+        self.config = config
+        self.rng = random.Random(f"{config.seed}:{table}")
+        self.inspectors = [f"inspector_{i:04d}" for i in range(config.inspectors)]
+        self.inspector_weights = _cumulative([1 / (rank + 1) ** config.inspector_skew for rank in range(config.inspectors)])
+        self.dates = [(config.start_date + timedelta(days=d)).isoformat() for d in range(config.days)]
+
+    def choices(self, population: Sequence, k: int, cum_weights=None) -> List:
+        return self.rng.choices(population, cum_weights=cum_weights, k=k)
+
+    def submitters(self, k: int) -> List[str]:
+        return self.choices(self.inspectors, k, self.inspector_weights)
+
+    def timestamps(self, dates: List[str], suffix: str) -> List[str]:
+        """Time of day within each form's date, as text both COPY and SQLite accept"""
+        seconds = [self.rng.randrange(6 * 3600, 20 * 3600) for _ in dates]
+        return [f"{d} {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}{suffix}" for d, s in zip(dates, seconds)]
+
+    def conditions(self, k: int, good: str, defects: List[str]) -> List[str]:
+        rate = self.config.defect_rate
+        population = [good] + defects
+        return self.choices(population, k, _cumulative([1 - rate] + [rate / len(defects)] * len(defects)))
+
+    def measurements(self, k: int, low: float, high: float, decimals: int, label: str) -> List[str]:
+        """Readings spread over [low, high], with defect_rate of them up to 10% outside it"""
+        step = max(10 ** -decimals, (high - low) / 200)
+        inside = _readings(low, high, step, decimals, label)
+        margin = (high - low) * 0.1 or step
+        outside = _readings(low - margin, low - step, step, decimals, label) + _readings(high + step, high + margin, step, decimals, label)
+        rate = self.config.defect_rate if outside else 0.0
+        weights = [(1 - rate) / len(inside)] * len(inside) + [rate / max(len(outside), 1)] * len(outside)
+        return self.choices(inside + outside, k, _cumulative(weights))
+
+def _readings(low: float, high: float, step: float, decimals: int, label: str) -> List[str]:
+    """Every reading from low to high in `step` increments, formatted like the Postman examples"""
+    count = int(round((high - low) / step)) + 1 if high >= low else 0
+    return sorted({f"{low + i * step:.{decimals}f} {label}".rstrip() for i in range(count)})
+
+def _cumulative(weights: List[float]) -> List[float]:
+    total, cumulative = 0.0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+def _json(documents: Iterator[dict]) -> List[str]:
+    return [orjson.dumps(document).decode() for document in documents]
+
+def wheel_specification_rows(config: SeedConfig, start: int, count: int, timestamp_suffix: str = "") -> List[Tuple]:
+    gen = _Generator(config, f"wheel_specifications:{start}")
+    dates = gen.choices(gen.dates, count)
+    columns = {name: gen.measurements(count, *spec) for name, spec in WHEEL_MEASUREMENTS.items()}
+    names = list(columns)
+    documents = _json(dict(zip(names, values)) for values in zip(*columns.values()))
+    created = gen.timestamps(dates, timestamp_suffix)
+    statuses = gen.choices(["Saved", "Submitted", "Approved"], count, [0.2, 0.8, 1.0])
+    return [
+        (f"WHEEL-S{config.seed}-{start + i:08d}", submitter, form_date, status, document, timestamp, timestamp)
+        for i, (submitter, form_date, status, document, timestamp)
+        in enumerate(zip(gen.submitters(count), dates, statuses, documents, created))
+    ]
+
+def bogie_checksheet_rows(config: SeedConfig, start: int, count: int, timestamp_suffix: str = "") -> List[Tuple]:
+    gen = _Generator(config, f"bogie_checksheets:{start}")
+    dates = gen.choices(gen.dates, count)
+    bogie_numbers = [f"BG{gen.rng.randrange(10000):04d}" for _ in range(count)]
+    years = [gen.rng.randrange(1995, 2025) for _ in range(count)]
+    details = _json(
+        {"bogieNo": number, "makerYearBuilt": f"{maker}/{year}", "incomingDivAndDate": f"{division} / {form_date}",
+         "deficitComponents": deficit, "dateOfIOH": form_date}
+        for number, maker, year, division, deficit, form_date in zip(
+            bogie_numbers, gen.choices(MAKERS, count), years, gen.choices(DIVISIONS, count),
+            gen.conditions(count, DEFICITS[0], DEFICITS[1:]), dates,
+        )
+    )
+    checks = {name: gen.conditions(count, *BOGIE_CONDITIONS) for name in
+              ("bogieFrameCondition", "bolster", "bolsterSuspensionBracket", "lowerSpringSeat", "axleGuide")}
+    checksheets = _json(dict(zip(checks, values)) for values in zip(*checks.values()))
+    bmbc = {name: gen.conditions(count, *BMBC_CONDITIONS) for name in
+            ("cylinderBody", "pistonTrunnion", "adjustingTube", "plungerSpring")}
+    bmbc_checksheets = _json(dict(zip(bmbc, values)) for values in zip(*bmbc.values()))
+    created = gen.timestamps(dates, timestamp_suffix)
+    statuses = gen.choices(["Saved", "Submitted", "Approved"], count, [0.2, 0.8, 1.0])
+    return [
+        (f"BOGIE-S{config.seed}-{start + i:08d}", inspector, form_date, status, detail, checksheet, bmbc_sheet, timestamp, timestamp)
+        for i, (inspector, form_date, status, detail, checksheet, bmbc_sheet, timestamp)
+        in enumerate(zip(gen.submitters(count), dates, statuses, details, checksheets, bmbc_checksheets, created))
+    ]
+
+def user_rows(config: SeedConfig, start: int, count: int, timestamp_suffix: str = "", hashed_password: str = "") -> List[Tuple]:
+    gen = _Generator(config, f"users:{start}")
+    created = gen.timestamps(gen.choices(gen.dates, count), timestamp_suffix)
+    return [
+        (f"+{config.seed}-{start + i:09d}", hashed_password, True, timestamp)
+        for i, timestamp in enumerate(created)
+    ]
+
+def form_submission_rows(config: SeedConfig, start: int, count: int, timestamp_suffix: str = "", user_ids: Sequence[int] = ()) -> List[Tuple]:
+    gen = _Generator(config, f"form_submissions:{start}")
+    first = gen.choices(FIRST_NAMES, count)
+    last = gen.choices(LAST_NAMES, count)
+    owners = gen.choices(user_ids, count) if user_ids else [None] * count
+    created = gen.timestamps(gen.choices(gen.dates, count), timestamp_suffix)
+    return [
+        (f"{f} {l}", f"8{gen.rng.randrange(10 ** 9):09d}", f"{f.lower()}.{l.lower()}{start + i}@example.com",
+         f"{gen.rng.randrange(1, 500)} {gen.rng.choice(CITIES)} Road", owner, timestamp, timestamp)
+        for i, (f, l, owner, timestamp) in enumerate(zip(first, last, owners, created))
+    ]
+
+# (model, inserted columns, row generator) in load order; users first so submissions can reference them
+TABLES = [
+    (models.User, ["phone_number", "hashed_password", "is_active", "created_at"], user_rows),
+    (models.FormSubmission, ["name", "phone_number", "email", "address", "user_id", "created_at", "updated_at"], form_submission_rows),
+    (models.WheelSpecification, ["form_number", "submitted_by", "submitted_date", "status", "fields", "created_at", "updated_at"], wheel_specification_rows),
+    (models.BogieChecksheet, ["form_number", "inspection_by", "inspection_date", "status", "bogie_details",
+                              "bogie_checksheet", "bmbc_checksheet", "created_at", "updated_at"], bogie_checksheet_rows),
+]
+
+def _copy(cursor, table: str, columns: List[str], rows: List[Tuple]):
+    """
+    COPY one batch from an in-memory buffer in Postgres text format.
+    Generated values never contain tabs, newlines or backslashes, so no escaping is needed.
+    """
+    buffer = io.StringIO("".join("\t".join("\\N" if value is None else str(value) for value in row) + "\n" for row in rows))
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def _executemany(cursor, table: str, columns: List[str], rows: List[Tuple], placeholder: str):
+    values = ", ".join([placeholder] * len(columns))
+    cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values})", rows)
+
+def seed(engine, config: SeedConfig, log: Callable[[str], None] = print) -> Dict[str, float]:
+    """Generate and bulk-load every seeded table; returns seconds per table"""
+    use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+    placeholder = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    # Text timestamps: COPY into timestamptz needs the zone, SQLite stores them as given
+    suffix = "+00" if engine.dialect.name == "postgresql" else ""
+    counts = {
+        "users": config.users,
+        "form_submissions": config.form_submissions,
+        "wheel_specifications": config.wheel_specifications,
+        "bogie_checksheets": config.bogie_checksheets,
+    }
+    hashed_password = get_password_hash(SEED_PASSWORD)
+    timings = {}
+
+    for model, columns, generate in TABLES:
+        table = model.__table__
+        total = counts[table.name]
+        if not total:
+            continue
+        started = time.perf_counter()
+        extra = {}
+        if model is models.User:
+            extra["hashed_password"] = hashed_password
+        elif model is models.FormSubmission:
+            with engine.connect() as conn:
+                extra["user_ids"] = conn.scalars(
+                    select(models.User.id).where(models.User.phone_number.like(f"+{config.seed}-%")).order_by(models.User.id)
+                ).all()
+
+        secondary = [index for index in table.indexes if not index.unique]
+        for index in secondary:
+            index.drop(bind=engine, checkfirst=True)
+
+        raw = engine.raw_connection()
+        # Generate the next batch while the database loads the current one
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            starts = range(0, total, SEED_BATCH_SIZE)
+            pending = executor.submit(generate, config, 0, min(SEED_BATCH_SIZE, total), suffix, **extra)
+            try:
+                cursor = raw.cursor()
+                for start in starts:
+                    rows = pending.result()
+                    following = start + SEED_BATCH_SIZE
+                    if following < total:
+                        pending = executor.submit(generate, config, following, min(SEED_BATCH_SIZE, total - following), suffix, **extra)
+                    if use_copy:
+                        _copy(cursor, table.name, columns, rows)
+                    else:
+                        _executemany(cursor, table.name, columns, rows, placeholder)
+                    raw.commit()
+                cursor.close()
+            finally:
+                raw.close()
+
+        log(f"   {table.name}: {total:,} rows loaded in {time.perf_counter() - started:.1f}s, rebuilding indexes...")
+        for index in secondary:
+            index.create(bind=engine, checkfirst=True)
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ANALYZE {table.name}")
+        timings[table.name] = round(time.perf_counter() - started, 2)
+    return timings
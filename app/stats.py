@@ -0,0 +1,189 @@
+import re
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+from sqlalchemy import BigInteger, cast, delete, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import counters, models
+from .database import dialect_insert
+
+# Inspection statistics for supervisors (GET /api/forms/stats).
+# Every form created adds to summary rows in the form_stats table in the same transaction as the
+# insert. The rows hold counts per (form date, inspector, status) and, per form date, histograms of
+# wheel measurements and tallies of bogie check results. A stats query only reads summary rows for
+# the requested dates: its cost depends on the number of days, inspectors and buckets, never on how
+# many forms there are. Deletes are never subtracted (unlike the form counters, whose delete
+# trigger only has to touch four buckets), so the numbers drift upward after each delete until
+# rebuild() recomputes everything from the forms tables: run it after deletes and after bulk loads
+# (`python3 setup_database.py --rebuild-stats`).
+# Every form of a day updates that day's measurement rows, so like the form counters they are
+# striped over counters.COUNTER_SLOTS slot rows, one picked at random per statement.
+
+ALL = ""  # inspector/status of the measurement rows, metric/bucket of the count rows
+
+# Wheel measurement -> (lower limit, upper limit, histogram bucket width)
+WHEEL_MEASUREMENT_LIMITS = {
+    "treadDiameterNew": (900, 1000, 10),
+    "lastShopIssueSize": (800, 900, 10),
+    "condemningDia": (800, 900, 10),
+    "wheelGauge": (1599, 1602, 1),
+    "wheelDiscWidth": (127, 131, 1),
+}
+
+# (column, API document name, checks) of the bogie checks whose results are tallied
+BOGIE_CONDITION_CHECKS = [
+    ("bogie_checksheet", "bogieChecksheet", ["bogieFrameCondition", "bolster", "bolsterSuspensionBracket", "lowerSpringSeat", "axleGuide"]),
+    ("bmbc_checksheet", "bmbcChecksheet", ["cylinderBody", "pistonTrunnion", "adjustingTube", "plungerSpring"]),
+]
+
+MAX_BUCKET_LENGTH = 50
+_READING = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+
+def reading(value: Optional[str]) -> Optional[float]:
+    """Leading number of a measurement such as "825 (800-900)", None when there is none"""
+    match = _READING.match(value) if isinstance(value, str) else None
+    return float(match.group(1)) if match else None
+
+def _wheel_metrics(row: Mapping[str, Any]) -> Iterator[Tuple[str, str]]:
+    fields = row["fields"] or {}
+    for name, (low, high, width) in WHEEL_MEASUREMENT_LIMITS.items():
+        value = reading(fields.get(name))
+        if value is None:
+            continue
+        yield name, f"{value // width * width:g}"
+        yield f"{name}:limit", "below" if value < low else "above" if value > high else "within"
+
+def _bogie_metrics(row: Mapping[str, Any]) -> Iterator[Tuple[str, str]]:
+    for column, document, checks in BOGIE_CONDITION_CHECKS:
+        results = row[column] or {}
+        for check in checks:
+            if results.get(check):
+                yield f"{document}.{check}", str(results[check])[:MAX_BUCKET_LENGTH]
+
+# form type -> (model, inspector column, date column, other columns read, metrics of one row)
+STAT_FORMS = {
+    counters.WHEEL_SPECIFICATION: (
+        models.WheelSpecification, "submitted_by", "submitted_date", ["fields"], _wheel_metrics
+    ),
+    counters.BOGIE_CHECKSHEET: (
+        models.BogieChecksheet, "inspection_by", "inspection_date", ["bogie_checksheet", "bmbc_checksheet"], _bogie_metrics
+    ),
+}
+
+def _add(deltas: Counter, form_type: str, row: Mapping[str, Any], delta: int, slot: int = 0):
+    model, inspector_name, date_name, _, metrics = STAT_FORMS[form_type]
+    form_date = row[date_name]
+    if isinstance(form_date, str):
+        form_date = date.fromisoformat(form_date)
+    status = row.get("status") or model.status.default.arg
+    deltas[(form_type, form_date, row[inspector_name], status, ALL, ALL, 0)] += delta
+    for metric, bucket in metrics(row):
+        deltas[(form_type, form_date, ALL, ALL, metric, bucket, slot)] += delta
+
+def _values(deltas: Counter):
+    return [
+        {"form_type": form_type, "stat_date": stat_date, "inspector": inspector, "status": status,
+         "metric": metric, "bucket": bucket, "slot": slot, "row_count": count}
+        for (form_type, stat_date, inspector, status, metric, bucket, slot), count in sorted(deltas.items())
+        if count
+    ]
+
+def increment_statement(dialect_name: str, form_type: str, rows: Iterable[Mapping[str, Any]], delta: int = 1):
+    """
+    Upsert adding `delta` for each form to its summary rows. `rows` are column values
+    (crud.wheel_specification_row() and friends); None when there is nothing to add.
+    """
+    deltas = Counter()
+    slot = counters.random_slot()
+    for row in rows:
+        _add(deltas, form_type, row, delta, slot)
+    values = _values(deltas)
+    if not values:
+        return None
+    stmt = dialect_insert(dialect_name, models.FormStat).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["form_type", "stat_date", "inspector", "status", "metric", "bucket", "slot"],
+        set_={"row_count": models.FormStat.row_count + stmt.excluded.row_count}
+    )
+
+def rebuild(conn: Connection, batch_size: int = 10_000):
+    """Recompute every summary row from the forms tables into slot 0 (backfills, and repairs after raw SQL changes)"""
+    conn.execute(delete(models.FormStat))
+    for form_type, (model, inspector_name, date_name, columns, _) in STAT_FORMS.items():
+        deltas = Counter()
+        names = [inspector_name, date_name, "status", *columns]
+        result = conn.execute(select(*[getattr(model, name) for name in names]), execution_options={"yield_per": batch_size})
+        for row in result:
+            _add(deltas, form_type, row._mapping, 1)
+        values = _values(deltas)
+        for start in range(0, len(values), batch_size):
+            conn.execute(insert(models.FormStat), values[start:start + batch_size])
+
+async def summary(
+    db: AsyncSession,
+    form_type: str,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    inspector: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Form counts by inspector, day and status, and the measurement or check result distributions,
+    for forms dated between from_date and to_date. `inspector` narrows the counts only.
+    """
+    stat = models.FormStat
+    # SUM(bigint) is numeric on Postgres; cast back so drivers return an int, not a Decimal
+    total = cast(func.sum(stat.row_count), BigInteger)
+    criteria = [stat.form_type == form_type]
+    if from_date:
+        criteria.append(stat.stat_date >= from_date)
+    if to_date:
+        criteria.append(stat.stat_date <= to_date)
+    count_criteria = criteria + [stat.metric == ALL, stat.bucket == ALL]
+    if inspector:
+        count_criteria.append(stat.inspector == inspector)
+
+    def by(column):
+        return select(column, total).where(*count_criteria).group_by(column).order_by(column)
+
+    by_inspector = dict((await db.execute(by(stat.inspector))).all())
+    by_day = {day.isoformat(): count for day, count in (await db.execute(by(stat.stat_date))).all()}
+    by_status = dict((await db.execute(by(stat.status))).all())
+    distributions = (await db.execute(
+        select(stat.metric, stat.bucket, total)
+        .where(*criteria, stat.metric != ALL)
+        .group_by(stat.metric, stat.bucket)
+    )).all()
+
+    result = {
+        "total": sum(by_status.values()),
+        "byInspector": by_inspector,
+        "byDay": by_day,
+        "byStatus": by_status,
+    }
+    if form_type == counters.WHEEL_SPECIFICATION:
+        result["measurements"] = _measurements(distributions)
+    else:
+        conditions: Dict[str, Dict[str, int]] = {}
+        for metric, bucket, count in distributions:
+            conditions.setdefault(metric, {})[bucket] = count
+        result["conditions"] = {metric: dict(sorted(tally.items())) for metric, tally in sorted(conditions.items())}
+    return result
+
+def _measurements(distributions) -> Dict[str, Any]:
+    measurements = {
+        name: {"limits": {"min": low, "max": high}, "belowLimit": 0, "withinLimits": 0, "aboveLimit": 0, "histogram": {}}
+        for name, (low, high, _) in WHEEL_MEASUREMENT_LIMITS.items()
+    }
+    limit_keys = {"below": "belowLimit", "within": "withinLimits", "above": "aboveLimit"}
+    for metric, bucket, count in distributions:
+        name, _, kind = metric.partition(":")
+        if name not in measurements:
+            continue
+        if kind == "limit":
+            measurements[name][limit_keys[bucket]] = count
+        else:
+            measurements[name]["histogram"][bucket] = count
+    for measurement in measurements.values():
+        measurement["histogram"] = dict(sorted(measurement["histogram"].items(), key=lambda item: float(item[0])))
+    return measurements
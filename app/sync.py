@@ -0,0 +1,170 @@
+import base64
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete, exists, literal, select, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .crud import list_items
+
+# Incremental sync for offline clients.
+# A client keeps the watermark from its last sync and asks only for what changed after it: rows
+# whose updated_at moved past it, read in (updated_at, id) order off an index, and the form numbers
+# deleted since, from tombstones written by a delete trigger (migration 5). A sync only reaches up
+# to SYNC_SETTLE_SECONDS ago: updated_at is stamped when a transaction starts, so a row can commit
+# a little after later stamps were served, and the settle time must exceed the longest write
+# transaction. updated_at is bumped by the ORM; an UPDATE in raw SQL must set it to be synced.
+# Tombstones are kept SYNC_TOMBSTONE_DAYS; an older watermark gets 410 and the client starts over.
+
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+SYNC_COMPRESS_MIN_BYTES = int(os.getenv("SYNC_COMPRESS_MIN_BYTES", "1024"))
+MAX_SYNC_LIMIT = 5000
+
+# A feed position: (timestamp, id) of the last item served, or (timestamp, None) once every item
+# stamped at or before the timestamp has been served
+Position = Tuple[datetime, Optional[int]]
+
+class WatermarkExpired(ValueError):
+    """The watermark is older than the tombstone retention, so deletes may have been missed"""
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive UTC timestamps
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def encode_watermark(rows: Position, deletes: Position) -> str:
+    """Opaque URL-safe watermark holding the position in both feeds"""
+    raw = json.dumps([[_utc(ts).isoformat(), row_id] for ts, row_id in (rows, deletes)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_watermark(watermark: str) -> Tuple[Position, Position]:
+    """Decode a watermark from encode_watermark, raising ValueError if it is malformed or expired"""
+    try:
+        raw = base64.urlsafe_b64decode(watermark + "=" * (-len(watermark) % 4))
+        (rows_ts, row_id), (deletes_ts, tombstone_id) = json.loads(raw)
+        rows = (_utc(datetime.fromisoformat(rows_ts)), None if row_id is None else int(row_id))
+        deletes = (_utc(datetime.fromisoformat(deletes_ts)), None if tombstone_id is None else int(tombstone_id))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid watermark: {watermark}") from e
+    # Only the delete feed expires: a first download pages through rows of any age
+    if deletes[0] < datetime.now(timezone.utc) - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise WatermarkExpired(f"Watermark is older than the {SYNC_TOMBSTONE_DAYS}-day sync history")
+    return rows, deletes
+
+def _after(ts_column, id_column, position: Optional[Position]):
+    """WHERE criteria for the items after `position`"""
+    if position is None:
+        return []
+    ts, item_id = position
+    if item_id is None:
+        return [ts_column > literal(ts, ts_column.type)]
+    return [tuple_(ts_column, id_column) > tuple_(literal(ts, ts_column.type), literal(item_id, id_column.type))]
+
+def _next_position(items, limit: int, position: Optional[Position], horizon: datetime) -> Position:
+    if len(items) > limit:
+        last = items[limit - 1]
+        return _utc(last[-2]), last[-1]
+    if position is not None and position[0] > horizon:
+        # The horizon moved back (e.g. a read from a lagging replica); never hand out an older watermark
+        return position
+    return horizon, None
+
+async def changes(
+    db: AsyncSession,
+    model,
+    form_type: str,
+    fields: Dict[str, Any],
+    since: Optional[Tuple[Position, Position]],
+    limit: int,
+    lag_seconds: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Rows of `model` changed after the watermark position and form numbers deleted since, up to `limit` of each.
+    `fields` are the API fields of a row; lag_seconds widens the settle time for reads from a replica.
+    """
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS + lag_seconds)
+    rows_after, deletes_after = since or (None, None)
+
+    rows = (await db.execute(
+        select(*[column.label(name) for name, column in fields.items()], model.updated_at, model.id)
+        .where(model.updated_at <= literal(horizon, model.updated_at.type),
+               *_after(model.updated_at, model.id, rows_after))
+        .order_by(model.updated_at, model.id)
+        .limit(limit + 1)
+    )).all()
+
+    tombstone = models.FormTombstone
+    deletes = [] if since is None else (await db.execute(
+        select(tombstone.form_number, tombstone.deleted_at, tombstone.id)
+        .where(tombstone.form_type == form_type,
+               tombstone.deleted_at <= literal(horizon, tombstone.deleted_at.type),
+               *_after(tombstone.deleted_at, tombstone.id, deletes_after),
+               # A form number deleted and then submitted again arrives as a changed row instead
+               ~exists().where(model.form_number == tombstone.form_number))
+        .order_by(tombstone.deleted_at, tombstone.id)
+        .limit(limit + 1)
+    )).all()
+
+    items = list_items(rows[:limit], fields)
+    for item in items:
+        item["updatedAt"] = _utc(item["updatedAt"])
+    return {
+        "items": items,
+        "deleted": [{"formNumber": row.form_number, "deletedAt": _utc(row.deleted_at)} for row in deletes[:limit]],
+        "watermark": encode_watermark(
+            _next_position(rows, limit, rows_after, horizon),
+            _next_position(deletes, limit, deletes_after, horizon)
+        ),
+        "has_more": len(rows) > limit or len(deletes) > limit
+    }
+
+def prune_tombstones(conn: Connection) -> int:
+    """Delete tombstones past the retention; watermarks that old are rejected anyway"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    tombstone = models.FormTombstone
+    return conn.execute(delete(tombstone).where(tombstone.deleted_at < literal(cutoff, tombstone.deleted_at.type))).rowcount
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    encodings = []
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.append(name.strip().lower())
+    return encodings
+
+def _brotli():
+    try:
+        import brotli  # optional, gzip is used without it
+    except ImportError:
+        return None
+    return brotli
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Body encoded with the best encoding the client accepts (br, then gzip), and that encoding.
+    Bodies under SYNC_COMPRESS_MIN_BYTES are returned as they are.
+    """
+    if len(body) < SYNC_COMPRESS_MIN_BYTES:
+        return body, None
+    encodings = _accepted_encodings(accept_encoding)
+    brotli = _brotli() if "br" in encodings else None
+    if brotli is not None:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in encodings:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+async def respond(body: bytes, accept_encoding: Optional[str]) -> Response:
+    """JSON response for a sync page, compressed off the event loop when it is large enough"""
+    encoding = None
+    if len(body) >= SYNC_COMPRESS_MIN_BYTES:
+        body, encoding = await run_in_threadpool(compress, body, accept_encoding)
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-store"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
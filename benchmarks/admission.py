@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Admission control benchmark: a greedy client against a well-behaved one, with admission control off and on.
+
+For --duration seconds, --greedy workers from one client address fetch uncached pages of
+GET /api/forms/wheel-specifications back to back, like a sync script with a high concurrency
+setting (it waits out Retry-After on 429 and 503, as HTTP client retry helpers do). Meanwhile a
+second client address fetches one page every --interval seconds. For each mode it reports the
+well-behaved client's latency and errors, and how many of the greedy requests were served, rate
+limited (429) or shed (503). The app's default list bucket is looser and its per-client cap
+off, so the run sets RATE_LIMIT_LIST and ADMISSION_MAX_PER_CLIENT (--rate-limit,
+--max-per-client) unless they are set.
+
+Usage:
+    python -m benchmarks.admission
+    python -m benchmarks.admission --greedy 100 --duration 20 --limit 100
+    python -m benchmarks.admission --rate-limit 100/400 --max-per-client 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from typing import List
+
+import httpx
+
+from benchmarks.common import configure_database, summarize
+
+ROUTE = "/api/forms/wheel-specifications"
+
+def client_for(app, address: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False, client=(address, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+async def run(app, greedy: int, duration: float, interval: float, limit: int) -> dict:
+    deadline = time.perf_counter() + duration
+    statuses = Counter()
+    latencies: List[float] = []
+    errors = 0
+
+    async def greedy_worker(client, worker: int):
+        i = 0
+        while time.perf_counter() < deadline:
+            response = await client.get(ROUTE, params={"limit": str(limit), "nocache": f"{worker}-{i}-{time.time_ns()}"})
+            statuses[response.status_code] += 1
+            i += 1
+            if "retry-after" in response.headers:
+                await asyncio.sleep(min(float(response.headers["retry-after"]), max(0.0, deadline - time.perf_counter())))
+
+    async def polite_client(client):
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(ROUTE, params={"limit": "20", "nocache": f"polite-{i}-{time.time_ns()}"})
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+            i += 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    async with client_for(app, "10.0.0.66") as greedy_client, client_for(app, "10.0.0.7") as polite:
+        started = time.perf_counter()
+        await asyncio.gather(polite_client(polite), *(greedy_worker(greedy_client, w) for w in range(greedy)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "well_behaved": summarize(latencies, elapsed, errors),
+        "greedy": {
+            "served_rps": round(statuses[200] / elapsed, 1),
+            "rate_limited": statuses[429],
+            "shed": statuses[503],
+            "other": sum(count for status, count in statuses.items() if status not in (200, 429, 503)),
+        },
+    }
+
+async def benchmark(greedy: int, duration: float, interval: float, limit: int, rate_limit: str, max_per_client: int) -> dict:
+    os.environ.setdefault("RATE_LIMIT_LIST", rate_limit)
+    os.environ.setdefault("ADMISSION_MAX_PER_CLIENT", str(max_per_client))
+    from app import admission
+    from main import app
+
+    results = {}
+    for mode, enabled in (("off", False), ("on", True)):
+        admission.ADMISSION_ENABLED = enabled
+        results[mode] = await run(app, greedy, duration, interval, limit)
+    results["on"]["admission"] = admission.stats(top=0)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how admission control protects a well-behaved client from a greedy one")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--greedy", type=int, default=50, help="Concurrent requests of the greedy client")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per mode")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between the well-behaved client's requests")
+    parser.add_argument("--limit", type=int, default=100, help="Page size of the greedy client's requests")
+    parser.add_argument("--rate-limit", default="50/200", help="RATE_LIMIT_LIST with admission on, unless set")
+    parser.add_argument("--max-per-client", type=int, default=7, help="ADMISSION_MAX_PER_CLIENT with admission on, unless set")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.greedy, args.duration, args.interval, args.limit, args.rate_limit, args.max_per_client))
+
+    print(f"\nAdmission control on {database_url.split('@')[-1]} ({args.greedy} greedy workers, {args.duration:g} s per mode)")
+    print(f"{'admission':<12}{'polite req':>12}{'polite err':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'greedy ok/s':>13}{'429':>8}{'503':>8}")
+    for mode in ("off", "on"):
+        polite, greedy = results[mode]["well_behaved"], results[mode]["greedy"]
+        print(f"{mode:<12}{polite['requests']:>12}{polite['errors']:>12}{polite['p50_ms']:>10}{polite['p99_ms']:>10}"
+              f"{greedy['served_rps']:>13}{greedy['rate_limited']:>8}{greedy['shed']:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Shift-sync benchmark: N wheel specifications as single POSTs vs :batch POSTs.
+
+Usage:
+    python -m benchmarks.batch_vs_single --forms 5000 --batch-size 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from benchmarks.common import configure_database, print_table, run_load
+from benchmarks.async_vs_sync import wheel_payload
+
+async def benchmark(forms: int, batch_size: int, concurrency: int):
+    from main import app
+
+    results = {}
+
+    prefix = f"BENCH-single-{uuid.uuid4().hex[:8]}"
+    async def single(client, i):
+        return await client.post("/api/forms/wheel-specifications", json=wheel_payload(prefix, i))
+
+    started = time.perf_counter()
+    results["single"] = await run_load(app, single, total_requests=forms, concurrency=concurrency)
+    results["single"]["forms_per_s"] = round(forms / (time.perf_counter() - started), 1)
+
+    prefix = f"BENCH-batch-{uuid.uuid4().hex[:8]}"
+    async def batch(client, i):
+        start = i * batch_size
+        payload = [wheel_payload(prefix, n) for n in range(start, min(start + batch_size, forms))]
+        return await client.post("/api/forms/wheel-specifications:batch", json={"forms": payload})
+
+    batches = (forms + batch_size - 1) // batch_size
+    started = time.perf_counter()
+    results["batch"] = await run_load(app, batch, total_requests=batches, concurrency=min(concurrency, batches))
+    results["batch"]["forms_per_s"] = round(forms / (time.perf_counter() - started), 1)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-form and batch submission throughput")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--forms", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.forms, args.batch_size, args.concurrency))
+
+    print_table(f"{args.forms} wheel specifications on {database_url.split('@')[-1]}", results)
+    for name, stats in results.items():
+        print(f"{name:<12}{stats['forms_per_s']:>10} forms/s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
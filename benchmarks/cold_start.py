@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark: how long a fresh process takes before it can serve traffic.
+
+Each run starts a new Python process, so nothing is cached in memory between runs:
+
+- `import`: how long `import main` takes in a fresh interpreter (module-level work included)
+- `ready`: from spawning `uvicorn main:app` until it answers GET / (imports, lifespan start-up, bind)
+- `first request`: latency of the first database-backed request once the server is ready,
+  against `warm request` for the second one
+
+The database is migrated up front by configure_database(). --app-dir points the runs at another
+checkout of the app, to compare against an older revision on the same database.
+
+Usage:
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --app-dir /tmp/kpa-previous
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import configure_database
+
+ROUTE = "/api/forms/wheel-specifications"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import main; print((time.perf_counter() - started) * 1000)"
+
+def import_time(app_dir: str, env: dict) -> float:
+    """Milliseconds `import main` takes in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=app_dir, env=env, check=True,
+                            capture_output=True, text=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def serve_times(app_dir: str, env: dict, timeout: float = 30.0) -> dict:
+    """Spawn uvicorn and time readiness, the first database-backed request and a warm one"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=timeout) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {server.returncode} before serving")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"uvicorn not ready after {timeout}s")
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.002)
+            ready = time.perf_counter()
+
+            timings = {"ready_ms": (ready - started) * 1000}
+            for name, params in (("first_request_ms", {"limit": "20"}), ("warm_request_ms", {"limit": "21"})):
+                request_started = time.perf_counter()
+                client.get(ROUTE, params=params).raise_for_status()
+                timings[name] = (time.perf_counter() - request_started) * 1000
+            timings["time_to_first_request_ms"] = timings["ready_ms"] + timings["first_request_ms"]
+            return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+def benchmark(app_dir: str, runs: int) -> dict:
+    env = dict(os.environ, SLOW_QUERY_MS="0")
+    samples = {"import_ms": []}
+    for _ in range(runs):
+        samples["import_ms"].append(import_time(app_dir, env))
+        for name, value in serve_times(app_dir, env).items():
+            samples.setdefault(name, []).append(value)
+    return {name: round(statistics.median(values), 1) for name, values in samples.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Process start-up time and time to the first served request")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh processes per measurement; the median is reported")
+    parser.add_argument("--app-dir", default=".", help="Checkout whose main.py is started")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    app_dir = os.path.abspath(args.app_dir)
+    results = benchmark(app_dir, args.runs)
+
+    print(f"\nCold start of {app_dir} on {database_url.split('@')[-1]} (median of {args.runs} runs)")
+    for name, value in results.items():
+        print(f"{name:<28}{value:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
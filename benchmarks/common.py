@@ -0,0 +1,86 @@
+"""
+Shared helpers for the KPA API benchmarks.
+Benchmarks drive the ASGI app in-process through httpx so they need no running server.
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+DEFAULT_DATABASE_URL = "sqlite:///./benchmark.db"
+
+def configure_database(database_url: str = None):
+    """
+    Point the app at the benchmark database and apply pending schema migrations.
+    Must run before any app module is imported.
+    """
+    os.environ["DATABASE_URL"] = database_url or os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL)
+    # Benchmarks send everything from one client address as fast as they can; rate limits and load
+    # shedding would measure the limiter, not the route (benchmarks/admission.py turns them on)
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+    from app import migrations
+    from app.database import engine
+
+    migrations.migrate(engine)
+    return os.environ["DATABASE_URL"]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Throughput and latency percentiles (milliseconds) for one benchmark run"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+async def run_load(
+    app,
+    make_request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    total_requests: int,
+    concurrency: int,
+) -> Dict[str, float]:
+    """Fire total_requests at the app with at most `concurrency` in flight"""
+    # Unhandled app errors come back as 500s and count as errors, as they would from a real server
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                response = await make_request(client, i)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors)
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    """Print benchmark results side by side"""
+    print(f"\n{title}")
+    print(f"{'backend':<18}{'req':>8}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in rows.items():
+        print(
+            f"{name:<18}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>10}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Inspection statistics benchmark: GET /api/forms/stats from the form_stats summary table against
+computing the same summary on request from the forms table.
+
+- `summary table`: GET /api/forms/stats on a response cache miss (median of --runs requests)
+- `scan forms`: the forms dated in the range read and aggregated with the same stats code, which is
+  what the endpoint would cost without the summary table (one run)
+
+Both are measured over the whole history and over the last 30 days of it. Run it against a seeded
+database (`python3 setup_database.py --seed`) for realistic sizes.
+
+Usage:
+    python -m benchmarks.form_stats
+    python -m benchmarks.form_stats --runs 20 --output stats.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import func, select
+
+from benchmarks.common import configure_database
+
+FORM_TYPES = ["wheel_specification", "bogie_checksheet"]
+
+def date_ranges(form_type: str) -> dict:
+    """Query params of each measured date range"""
+    from app import stats
+    from app.database import SessionLocal
+
+    model, _, date_name, _, _ = stats.STAT_FORMS[form_type]
+    with SessionLocal() as db:
+        last = db.execute(select(func.max(getattr(model, date_name)))).scalar()
+    ranges = {"all dates": {}}
+    if last:
+        ranges["last 30 days"] = {"fromDate": (last - timedelta(days=29)).isoformat(), "toDate": last.isoformat()}
+    return ranges
+
+def scan(form_type: str, params: dict) -> int:
+    """Aggregate the forms in the range straight from the forms table; returns the summary rows built"""
+    from app import stats
+    from app.database import SessionLocal
+
+    model, inspector_name, date_name, columns, _ = stats.STAT_FORMS[form_type]
+    date_column = getattr(model, date_name)
+    query = select(*[getattr(model, name) for name in [inspector_name, date_name, "status", *columns]])
+    if "fromDate" in params:
+        query = query.where(date_column >= params["fromDate"], date_column <= params["toDate"])
+    deltas = Counter()
+    with SessionLocal() as db:
+        for row in db.execute(query, execution_options={"yield_per": 10_000}):
+            stats._add(deltas, form_type, row._mapping, 1)
+    return len(deltas)
+
+async def benchmark(runs: int) -> dict:
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for form_type in FORM_TYPES:
+            for label, params in date_ranges(form_type).items():
+                latencies = []
+                for i in range(runs):
+                    started = time.perf_counter()
+                    response = await client.get("/api/forms/stats", params={
+                        "formType": form_type, **params, "nocache": f"{time.time_ns()}-{i}"
+                    })
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                total = response.json()["data"]["total"]
+
+                started = time.perf_counter()
+                await asyncio.to_thread(scan, form_type, params)
+                scan_ms = (time.perf_counter() - started) * 1000
+
+                results[f"{form_type} / {label}"] = {
+                    "forms": total,
+                    "summary_table_ms": round(statistics.median(latencies), 1),
+                    "scan_forms_ms": round(scan_ms, 1),
+                }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the stats summary table with scanning the forms table")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--runs", type=int, default=10, help="Stats requests per form type and date range")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.runs))
+
+    print(f"\nInspection statistics on {database_url.split('@')[-1]}")
+    print(f"{'form type / range':<40}{'forms':>10}{'summary ms':>14}{'scan ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<40}{stats['forms']:>10}{stats['summary_table_ms']:>14}{stats['scan_forms_ms']:>12}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
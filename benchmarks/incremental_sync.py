@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Incremental sync benchmark: bytes on the wire and time to refresh an offline client's wheel specifications.
+
+- `full list`: what the client did before, paging GET /api/forms/wheel-specifications with the cursor
+  until the end (list responses are not compressed)
+- `initial sync`: the first GET .../changes download, paged with the watermark
+- `incremental`: the next sync after --changes new forms were submitted, from the stored watermark
+- `idle`: a sync with nothing new
+
+Run it against a seeded database (`python3 setup_database.py --seed`) for realistic sizes.
+The forms it submits stay in the database.
+
+Usage:
+    python -m benchmarks.incremental_sync --changes 50
+    python -m benchmarks.incremental_sync --encoding gzip --page-size 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import configure_database
+from benchmarks.query_budgets import wheel_payload
+
+LIST_ROUTE = "/api/forms/wheel-specifications"
+CHANGES_ROUTE = "/api/forms/wheel-specifications/changes"
+
+async def paged(client, route: str, params: dict, next_params) -> dict:
+    """Follow a paged route to the end; returns requests, wire bytes, rows, seconds and the last body"""
+    totals = {"requests": 0, "wire_kb": 0.0, "rows": 0}
+    started = time.perf_counter()
+    while True:
+        response = await client.get(route, params=params)
+        response.raise_for_status()
+        body = response.json()
+        totals["requests"] += 1
+        totals["wire_kb"] += response.num_bytes_downloaded / 1024
+        totals["rows"] += len(body["data"])
+        params = next_params(params, body)
+        if params is None:
+            break
+    totals["seconds"] = round(time.perf_counter() - started, 2)
+    totals["wire_kb"] = round(totals["wire_kb"], 1)
+    return {**totals, "last": body}
+
+def next_list_page(params, body):
+    return {**params, "cursor": body["nextCursor"]} if body["nextCursor"] else None
+
+def next_sync_page(params, body):
+    return {**params, "since": body["watermark"]} if body["hasMore"] else None
+
+async def benchmark(page_size: int, changes: int, encoding: str, settle_seconds: float) -> dict:
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None,
+                                 headers={"Accept-Encoding": encoding}) as client:
+        results["full list"] = await paged(client, LIST_ROUTE, {"limit": str(page_size)}, next_list_page)
+        results["initial sync"] = await paged(client, CHANGES_ROUTE, {"limit": str(page_size)}, next_sync_page)
+        watermark = results["initial sync"]["last"]["watermark"]
+
+        prefix = f"SYNC-{uuid.uuid4().hex[:8]}"
+        forms = [wheel_payload(f"{prefix}-{i}") for i in range(changes)]
+        for start in range(0, changes, 500):
+            (await client.post(f"{LIST_ROUTE}:batch", json={"forms": forms[start:start + 500]})).raise_for_status()
+        time.sleep(settle_seconds + 0.1)
+        results["incremental"] = await paged(
+            client, CHANGES_ROUTE, {"limit": str(page_size), "since": watermark}, next_sync_page
+        )
+        results["idle"] = await paged(
+            client, CHANGES_ROUTE, {"limit": str(page_size), "since": results["incremental"]["last"]["watermark"]},
+            next_sync_page
+        )
+    for stats in results.values():
+        del stats["last"]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full list downloads with incremental sync")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=50, help="Forms submitted between the two syncs")
+    parser.add_argument("--encoding", default="br, gzip", help="Accept-Encoding sent by the client")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    settle_seconds = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+    results = asyncio.run(benchmark(args.page_size, args.changes, args.encoding, settle_seconds))
+
+    print(f"\nWheel specification refresh on {database_url.split('@')[-1]} (Accept-Encoding: {args.encoding})")
+    print(f"{'scenario':<16}{'requests':>10}{'rows':>10}{'wire KB':>12}{'seconds':>10}")
+    for name, stats in results.items():
+        print(f"{name:<16}{stats['requests']:>10}{stats['rows']:>10}{stats['wire_kb']:>12}{stats['seconds']:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
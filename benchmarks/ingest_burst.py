@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Submission burst benchmark: forms written before responding (201) vs write-behind ingestion (202).
+
+Fires the same burst of wheel specifications at POST /api/forms/wheel-specifications twice:
+`sync` writes and commits each form inside its request, `async` sends `Prefer: respond-async`
+so forms are queued and group-committed by the ingestion flusher. For each it reports
+request latency and throughput, `durable_s` (burst start until every form is committed),
+the number of COMMITs and, on Postgres, the WAL flushes to disk (pg_stat_wal.wal_sync).
+Rejected submissions (429, the queue was full) count as errors.
+
+Usage:
+    python -m benchmarks.ingest_burst --forms 5000 --concurrency 100
+    INGEST_QUEUE_SIZE=500 python -m benchmarks.ingest_burst   # watch the backpressure
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from benchmarks.common import configure_database, print_table, run_load
+from benchmarks.query_budgets import wheel_payload
+
+def wal_syncs(engine):
+    """WAL flushes so far (Postgres 14+), None elsewhere"""
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT wal_sync FROM pg_stat_wal").scalar()
+
+async def benchmark(forms: int, concurrency: int):
+    from sqlalchemy import event
+    from app import ingest
+    from app.database import async_engine, engine
+    from main import app
+
+    commits = [0]
+    event.listen(async_engine.sync_engine, "commit", lambda conn: commits.__setitem__(0, commits[0] + 1))
+
+    results = {}
+    for mode, headers in (("sync", {}), ("async", {"Prefer": "respond-async"})):
+        prefix = f"INGEST-{mode}-{uuid.uuid4().hex[:8]}"
+        async def submit(client, i):
+            return await client.post("/api/forms/wheel-specifications", json=wheel_payload(f"{prefix}-{i}"), headers=headers)
+
+        commits[0] = 0
+        syncs_before = wal_syncs(engine)
+        started = time.perf_counter()
+        results[mode] = await run_load(app, submit, total_requests=forms, concurrency=concurrency)
+        if ingest._queue is not None:
+            await ingest._queue.join()
+        results[mode]["durable_s"] = round(time.perf_counter() - started, 2)
+        results[mode]["commits"] = commits[0]
+        syncs_after = wal_syncs(engine)
+        results[mode]["wal_syncs"] = syncs_after - syncs_before if syncs_before is not None else None
+
+    results["async"]["ingest"] = ingest.stats()
+    await ingest.drain()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare synchronous and write-behind form submission under a burst")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--forms", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.forms, args.concurrency))
+
+    print_table(f"Burst of {args.forms} wheel specifications on {database_url.split('@')[-1]}", results)
+    print(f"\n{'mode':<10}{'durable s':>12}{'commits':>10}{'WAL syncs':>12}")
+    for name, stats in results.items():
+        print(f"{name:<10}{stats['durable_s']:>12}{stats['commits']:>10}{str(stats['wal_syncs']):>12}")
+    print(f"\nIngestion: {results['async']['ingest']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Shift-change login burst: login latency and its impact on form GETs.
+
+`inline` is the old path (sync handlers, bcrypt on Starlette's threadpool next to sync
+form GETs). `pool` is main.app, where bcrypt runs on the bounded app/hashing.py pool
+and excess logins are shed with 503.
+
+Usage:
+    BCRYPT_ROUNDS=12 python -m benchmarks.login_burst --logins 200 --login-concurrency 100
+"""
+
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import configure_database, print_table, run_load
+
+PHONE = "9000000001"
+PASSWORD = "bench@123"
+
+def build_inline_app():
+    """Sync wheel GETs plus the old sync login handler hashing inline"""
+    from fastapi import Depends, HTTPException
+    from sqlalchemy.orm import Session
+    from app import schemas
+    from app.auth import authenticate_user, create_access_token
+    from app.database import get_db
+    from benchmarks.async_vs_sync import build_sync_app
+
+    inline_app = build_sync_app()
+
+    @inline_app.post("/v1/auth/login")
+    def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+        user = authenticate_user(db, user_credentials.phone_number, user_credentials.password)
+        if not user:
+            raise HTTPException(status_code=401)
+        return {"access_token": create_access_token(data={"sub": user.phone_number}), "token_type": "bearer"}
+
+    return inline_app
+
+def ensure_user():
+    from app import crud, schemas
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if crud.get_user_by_phone(db, PHONE) is None:
+            crud.create_user(db, schemas.UserCreate(phone_number=PHONE, password=PASSWORD))
+    finally:
+        db.close()
+
+async def login(client, i):
+    return await client.post("/v1/auth/login", json={"phone_number": PHONE, "password": PASSWORD})
+
+async def list_forms(client, i):
+    return await client.get("/api/forms/wheel-specifications", params={"limit": 10})
+
+async def benchmark(logins: int, login_concurrency: int, gets: int, get_concurrency: int):
+    from main import app
+
+    ensure_user()
+    results = {}
+    for name, bench_app in (("inline", build_inline_app()), ("pool", app)):
+        results[f"{name}-get-idle"] = await run_load(bench_app, list_forms, gets, get_concurrency)
+        burst, during = await asyncio.gather(
+            run_load(bench_app, login, logins, login_concurrency),
+            run_load(bench_app, list_forms, gets, get_concurrency),
+        )
+        results[f"{name}-login"] = burst
+        results[f"{name}-get-burst"] = during
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Login burst benchmark")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=100)
+    parser.add_argument("--gets", type=int, default=500)
+    parser.add_argument("--get-concurrency", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.logins, args.login_concurrency, args.gets, args.get_concurrency))
+
+    print_table(f"Login burst on {database_url.split('@')[-1]} (errors on pool-login are 503 sheds)", results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
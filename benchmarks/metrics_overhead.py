@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark: CPU that app/metrics.py adds to a request, as a share of the request.
+
+End-to-end on/off comparisons swing by several percent between runs, more than the effect being
+measured, so the two costs are timed in isolation and set against the real request cost:
+
+- `middleware`: MetricsMiddleware around a no-op ASGI app, recording on vs METRICS_ENABLED=false
+- `sql hooks`: the cursor event hooks per statement, inside a request context vs outside one
+- `request`: median CPU of a list GET through main.app, as a response cache hit (`cached`) and
+  as a miss that runs its SQL (`uncached`, a throwaway query parameter defeats the cache)
+
+Usage:
+    python -m benchmarks.metrics_overhead --requests 300 --rounds 20
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import statistics
+import time
+
+import httpx
+
+from benchmarks.common import configure_database
+
+ROUTE = "/api/forms/wheel-specifications"
+
+_misses = itertools.count()
+
+SCENARIOS = {
+    "cached": lambda: {"limit": "20"},
+    "uncached": lambda: {"limit": "20", "nocache": str(next(_misses))},
+}
+
+async def request_cost(client, params, requests: int) -> float:
+    """Mean CPU microseconds per request over one round"""
+    gc.collect()
+    started = time.process_time()
+    for _ in range(requests):
+        response = await client.get(ROUTE, params=params())
+        response.raise_for_status()
+    return (time.process_time() - started) / requests * 1e6
+
+async def middleware_cost(app, iterations: int) -> float:
+    """Extra CPU microseconds per request of MetricsMiddleware with recording on"""
+    from app import metrics
+
+    async def noop(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    middleware = metrics.MetricsMiddleware(noop)
+    scope = {"type": "http", "method": "GET", "path": ROUTE, "app": app, "query_string": b"", "headers": []}
+    samples = {False: [], True: []}
+    for _ in range(5):
+        for enabled in (False, True):
+            metrics.METRICS_ENABLED = enabled
+            started = time.process_time()
+            for _ in range(iterations):
+                await middleware(scope, None, send)
+            samples[enabled].append((time.process_time() - started) / iterations * 1e6)
+    metrics.METRICS_ENABLED = True
+    return statistics.median(samples[True]) - statistics.median(samples[False])
+
+def sql_hook_cost(iterations: int) -> float:
+    """Extra CPU microseconds per SQL statement of the cursor hooks inside a request"""
+    from sqlalchemy import text
+    from app import metrics
+    from app.database import engine
+
+    samples = {False: [], True: []}
+    with engine.connect() as conn:
+        for _ in range(5):
+            for in_request in (False, True):
+                token = metrics._current.set(metrics._RequestStats(ROUTE) if in_request else None)
+                try:
+                    started = time.process_time()
+                    for _ in range(iterations):
+                        conn.execute(text("SELECT 1"))
+                    samples[in_request].append((time.process_time() - started) / iterations * 1e6)
+                finally:
+                    metrics._current.reset(token)
+    return statistics.median(samples[True]) - statistics.median(samples[False])
+
+async def benchmark(requests: int, rounds: int):
+    from app import crud, metrics
+    from app.database import SessionLocal
+    from main import app
+
+    db = SessionLocal()
+    try:
+        # A full page to serialize; rows left over from other benchmarks count too
+        forms = [{"formNumber": f"BENCH-metrics-{i:04d}", "submittedBy": "inspector_0",
+                  "submittedDate": "2025-01-21", "fields": {"wheelGauge": "1600 (+2,-1)"}} for i in range(20)]
+        crud.create_wheel_specifications_batch(db, forms)
+    finally:
+        db.close()
+
+    middleware_us = await middleware_cost(app, 20000)
+    hook_us = sql_hook_cost(5000)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, params in SCENARIOS.items():
+            await request_cost(client, params, min(100, requests))
+            before = metrics._statements.get(ROUTE)
+            before = (before.sum, before.count) if before else (0, 0)
+            request_us = statistics.median([await request_cost(client, params, requests) for _ in range(rounds)])
+            after = metrics._statements[ROUTE]
+            statements = (after.sum - before[0]) / (after.count - before[1])
+            overhead_us = middleware_us + hook_us * statements
+            results[name] = {
+                "request_us": round(request_us, 1),
+                "statements": round(statements, 2),
+                "middleware_us": round(middleware_us, 2),
+                "sql_hooks_us": round(hook_us * statements, 2),
+                "overhead_pct": round(overhead_us / (request_us - overhead_us) * 100, 2),
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU overhead of the Prometheus metrics middleware")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per round")
+    parser.add_argument("--rounds", type=int, default=20, help="Rounds per scenario; the median is reported")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.requests, args.rounds))
+
+    print(f"\nMetrics CPU overhead per request on {database_url.split('@')[-1]}")
+    print(f"{'scenario':<12}{'request us':>12}{'statements':>12}{'middleware us':>15}{'sql hooks us':>14}{'overhead':>10}")
+    for name, stats in results.items():
+        print(f"{name:<12}{stats['request_us']:>12}{stats['statements']:>12}{stats['middleware_us']:>15}"
+              f"{stats['sql_hooks_us']:>14}{stats['overhead_pct']:>9}%")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Search benchmark: latency of `q=` searches on GET /api/forms/wheel-specifications.
+
+- `prefix, narrow`: a form number prefix matching a handful of forms
+- `prefix, wide`: a prefix matching most forms, first page and the page after --depth pages
+- `inspector typo`: an inspector name with a letter dropped, matched by trigram similarity
+- `no match`: a query matching nothing
+- `LIKE scan`: for comparison, the unindexed substring query a search box usually starts out as
+
+Every request is a response cache miss; each scenario reports the median of --runs requests. Run it
+against a seeded database (`python3 setup_database.py --seed`) for realistic sizes.
+
+Usage:
+    python -m benchmarks.search
+    python -m benchmarks.search --runs 20 --depth 50
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from sqlalchemy import func, or_, select
+
+from benchmarks.common import configure_database
+
+ROUTE = "/api/forms/wheel-specifications"
+
+def sample_terms() -> dict:
+    """Search terms built from the stored forms: a form number and an inspector name"""
+    from app import models
+    from app.database import SessionLocal
+
+    spec = models.WheelSpecification
+    with SessionLocal() as db:
+        form_number, inspector = db.execute(
+            select(spec.form_number, spec.submitted_by).order_by(spec.id).limit(1)
+        ).one()
+    typo = inspector[:3] + inspector[4:] if len(inspector) > 4 else inspector
+    return {
+        "prefix, narrow": form_number[:-1].lower(),
+        "prefix, wide": form_number[:len(form_number) // 3],
+        "inspector typo": typo,
+        "no match": "zzqxj-no-such-form",
+    }
+
+def like_scan(q: str, limit: int) -> int:
+    """Substring match on form number or inspector name without an index"""
+    from app import models
+    from app.database import SessionLocal
+
+    spec = models.WheelSpecification
+    pattern = f"%{q}%"
+    with SessionLocal() as db:
+        return len(db.execute(
+            select(spec.id).where(or_(func.upper(spec.form_number).like(pattern.upper()), spec.submitted_by.ilike(pattern)))
+            .order_by(spec.created_at, spec.id).limit(limit)
+        ).all())
+
+async def timed(client, params: dict, runs: int) -> dict:
+    latencies, rows = [], 0
+    for i in range(runs):
+        started = time.perf_counter()
+        response = await client.get(ROUTE, params={**params, "nocache": f"{time.time_ns()}-{i}"})
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        body = response.json()
+        rows = len(body["data"])
+    return {"rows": rows, "median_ms": round(statistics.median(latencies), 2), "next": body["nextCursor"]}
+
+async def benchmark(runs: int, depth: int, limit: int) -> dict:
+    from main import app
+
+    terms = sample_terms()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Load the inspector name index outside the timings, as a running server has it already
+        await client.get(ROUTE, params={"q": terms["inspector typo"], "limit": "1"})
+        for name, q in terms.items():
+            result = await timed(client, {"q": q, "limit": str(limit)}, runs)
+            results[name] = {"q": q, "rows": result["rows"], "median_ms": result["median_ms"]}
+
+        q = terms["prefix, wide"]
+        params = {"q": q, "limit": str(limit)}
+        for _ in range(depth):
+            cursor = (await timed(client, params, 1))["next"]
+            if cursor is None:
+                break
+            params["cursor"] = cursor
+        result = await timed(client, params, runs)
+        results[f"prefix, wide, page {depth + 1}"] = {"q": q, "rows": result["rows"], "median_ms": result["median_ms"]}
+
+        q = terms["inspector typo"]
+        started = time.perf_counter()
+        rows = await asyncio.to_thread(like_scan, q, limit)
+        results["LIKE scan"] = {"q": q, "rows": rows, "median_ms": round((time.perf_counter() - started) * 1000, 2)}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure q= search latency on the wheel specification list")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--runs", type=int, default=10, help="Requests per scenario")
+    parser.add_argument("--depth", type=int, default=20, help="Pages followed before the deep page")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = asyncio.run(benchmark(args.runs, args.depth, args.limit))
+
+    print(f"\nSearch on {database_url.split('@')[-1]} (page size {args.limit})")
+    print(f"{'scenario':<28}{'q':<24}{'rows':>6}{'median ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['q']:<24}{stats['rows']:>6}{stats['median_ms']:>12}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
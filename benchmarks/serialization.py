@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Serialization microbenchmark: CPU per row for one wheel specification list page.
+
+`orm` is the old list path: full ORM entities copied into dicts, a KPAListResponse
+validated by Pydantic, jsonable_encoder and json.dumps (what FastAPI does for a
+response_model). `projection` is the current path: labelled columns as rows, plain
+dicts and one orjson.dumps (crud.list_projection, crud.list_items, main.list_response_body).
+
+Usage:
+    python -m benchmarks.serialization --pages 100 1000 --repeat 30
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+from benchmarks.common import configure_database
+
+PREFIX = "BENCH-ser"
+
+def ensure_rows(db, count: int):
+    """Seed wheel specifications with every measurement filled in, up to `count` rows"""
+    from sqlalchemy import func, select
+    from app import crud, models, schemas
+
+    existing = db.scalar(select(func.count()).select_from(models.WheelSpecification))
+    run = uuid.uuid4().hex[:8]
+    measurements = {name: f"{900 + i} (+2,-1)" for i, name in enumerate(schemas.WheelSpecificationFields.model_fields)}
+    for start in range(existing, count, crud.MAX_BATCH_SIZE):
+        forms = [
+            {"formNumber": f"{PREFIX}-{run}-{i:07d}", "submittedBy": f"inspector_{i % 25}",
+             "submittedDate": "2025-01-21", "fields": measurements}
+            for i in range(start, min(start + crud.MAX_BATCH_SIZE, count))
+        ]
+        crud.create_wheel_specifications_batch(db, forms)
+
+def orm_page(db, limit: int) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from app import models, pagination, schemas
+
+    items = (
+        db.query(models.WheelSpecification)
+        .order_by(*pagination.keyset_order(models.WheelSpecification))
+        .limit(limit + 1)
+        .all()
+    )
+    data = [
+        {
+            "formNumber": item.form_number,
+            "submittedBy": item.submitted_by,
+            "submittedDate": item.submitted_date.isoformat(),
+            "status": item.status,
+            "fields": item.fields
+        }
+        for item in items[:limit]
+    ]
+    response = schemas.KPAListResponse(
+        success=True, message="ok", data=data, nextCursor=pagination.next_cursor(items, limit)
+    )
+    return json.dumps(jsonable_encoder(response), separators=(",", ":")).encode()
+
+def projection_page(db, limit: int) -> bytes:
+    from sqlalchemy import select
+    from app import crud, models, pagination
+    from main import list_response_body
+
+    items = db.execute(
+        select(*crud.list_projection(models.WheelSpecification, crud.WHEEL_SPECIFICATION_FIELDS))
+        .order_by(*pagination.keyset_order(models.WheelSpecification))
+        .limit(limit + 1)
+    ).all()
+    data = crud.list_items(items[:limit], crud.WHEEL_SPECIFICATION_FIELDS)
+    return list_response_body("ok", data, {"next_cursor": pagination.next_cursor(items, limit), "total": None})
+
+def measure(page, db, limit: int, repeat: int):
+    """Median CPU microseconds per row over `repeat` pages, after one warm-up page"""
+    page(db, limit)
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        page(db, limit)
+        samples.append((time.process_time() - started) / limit * 1e6)
+        db.expunge_all()
+    return round(statistics.median(samples), 2)
+
+def benchmark(pages, repeat: int):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ensure_rows(db, max(pages) + 1)
+        results = {}
+        for limit in pages:
+            orm = measure(orm_page, db, limit, repeat)
+            projection = measure(projection_page, db, limit, repeat)
+            results[limit] = {"orm_us_per_row": orm, "projection_us_per_row": projection,
+                              "speedup": round(orm / projection, 2) if projection else None}
+        return results
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU per row of the list serialization paths")
+    parser.add_argument("--database-url", help="Database to benchmark (default: $BENCH_DATABASE_URL or local SQLite)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000], help="Page sizes to measure")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = configure_database(args.database_url)
+    results = benchmark(args.pages, args.repeat)
+
+    print(f"\nList page CPU per row on {database_url.split('@')[-1]} (median of {args.repeat})")
+    print(f"{'rows':>6}{'orm us/row':>14}{'projection us/row':>20}{'speedup':>10}")
+    for limit, stats in results.items():
+        print(f"{limit:>6}{stats['orm_us_per_row']:>14}{stats['projection_us_per_row']:>20}{stats['speedup']:>9}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,66 @@
-
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Header, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import timedelta
+import logging
+import orjson
+from datetime import date, timedelta
+
+from app import (
+    crud, async_crud, models, schemas, pagination, idempotency, hashing, principal_cache, document_filters, export,
+    counters, response_cache, metrics, query_log, migrations, read_your_writes, ingest, sync, stats, search, admission
+)
+from app.database import (
+    async_engine, get_async_db, get_async_read_db, get_async_write_db,
+    async_read_session, is_replica, reads_primary, pool_status
+)
+from app.principal_cache import UserSnapshot
+from app.auth import (
+    async_authenticate_user, rehash_password, create_access_token, get_current_user, get_user_read_db, get_user_write_db,
+    require_internal_access, ACCESS_TOKEN_EXPIRE_MINUTES
+)
 
-from app import crud, models, schemas
-from app.database import SessionLocal, engine, get_db
-from app.auth import authenticate_user, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+logger = logging.getLogger(__name__)
 
-# This command creates the table in your database based on the model
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes are applied by `python3 setup_database.py`; start-up only checks the version
+    await migrations.check(async_engine)
+    yield
+    # Write out submissions still queued for the ingestion flusher before the process exits
+    await ingest.drain()
+    hashing.shutdown()
 
 app = FastAPI(
     title="KPA Form Data API", 
     version="1.0.0",
-    description="API for KPA form data management with authentication"
+    description="API for KPA form data management with authentication",
+    lifespan=lifespan
 )
 
+@app.exception_handler(hashing.HashingPoolFull)
+async def hashing_pool_full_handler(request: Request, exc: hashing.HashingPoolFull):
+    # Shed login/register bursts early instead of queueing them behind bcrypt
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, please retry shortly"},
+        headers={"Retry-After": str(hashing.HASH_RETRY_AFTER_SECONDS)},
+    )
+
+@app.exception_handler(ingest.IngestQueueFull)
+async def ingest_queue_full_handler(request: Request, exc: ingest.IngestQueueFull):
+    # Backpressure: the flusher is behind, so callers slow down rather than the queue growing without bound
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many submissions waiting to be written, please retry shortly"},
+        headers={"Retry-After": str(ingest.INGEST_RETRY_AFTER_SECONDS)},
+    )
+
+# Rate limits and load shedding; inside CORS so browsers can read the 429/503, inside metrics so they are counted
+app.add_middleware(admission.AdmissionMiddleware)
+
 # Add CORS middleware for Flutter frontend integration
 app.add_middleware(
     CORSMiddleware,
@@ -27,23 +70,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the latency it records covers every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
 # ================================
 # AUTHENTICATION API (API #1)
 # ================================
 
 @app.post("/v1/auth/login", response_model=schemas.Token, tags=["Authentication"])
-def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(
+    user_credentials: schemas.UserLogin,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Authenticate user with phone number and password.
     Returns JWT access token for accessing protected endpoints.
     """
-    user = authenticate_user(db, user_credentials.phone_number, user_credentials.password)
+    user = await async_authenticate_user(db, user_credentials.phone_number, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect phone number or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if hashing.needs_rehash(user.hashed_password):
+        # Upgrade hashes made with an older cost factor after the response is sent
+        background_tasks.add_task(rehash_password, user.id, user.hashed_password, user_credentials.password)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.phone_number}, expires_delta=access_token_expires
@@ -51,252 +104,642 @@ def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/v1/auth/register", response_model=schemas.User, status_code=201, tags=["Authentication"])
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user with phone number and password.
     """
-    db_user = crud.get_user_by_phone(db, phone_number=user.phone_number)
+    db_user = await async_crud.get_user_by_phone(db, phone_number=user.phone_number)
     if db_user:
         raise HTTPException(status_code=400, detail="Phone number already registered")
-    return crud.create_user(db=db, user=user)
+    return await async_crud.create_user(db=db, user=user)
 
 # ================================
 # KPA FORM DATA APIs (API #2) - MATCHING POSTMAN COLLECTION
 # ================================
 
+def decode_cursor_param(cursor: Optional[str], q: Optional[str] = None):
+    """Decode the `cursor` query parameter of the KPA list endpoints, 400 if it was tampered with"""
+    if cursor is None:
+        return None
+    try:
+        return search.decode_cursor(cursor) if q else pagination.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+SEARCH_DESCRIPTION = ("Search: forms whose form number starts with this (any case) first, "
+                      "then forms by inspectors with a similar name, most similar first")
+
+def search_param(q: Optional[str], skip: int) -> Optional[str]:
+    """Normalize the `q` search parameter of the KPA list endpoints; search pages only follow the cursor"""
+    q = q.strip() if q else None
+    if q and skip:
+        raise HTTPException(status_code=400, detail="skip cannot be combined with q; follow nextCursor instead")
+    return q or None
+
+def field_filters_param(request: Request, documents):
+    """Parse `<document>.<key>=value` query parameters of the KPA list endpoints, 400 if malformed"""
+    try:
+        return document_filters.parse(request.query_params.multi_items(), documents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def cached_list(request: Request, namespace: str, fetch, db: AsyncSession):
+    """
+    Serve a KPA list endpoint through the response cache.
+    fetch() returns the serialized body on a miss; a current If-None-Match gets a 304 with no database work.
+    Right after a write, bodies read from a replica are served but not cached, as the replica may lag behind.
+    """
+    key = await response_cache.cache_key(namespace, request.url.path, request.query_params.multi_items())
+    cached = await response_cache.get(key)
+    if cached is None:
+        store = not (is_replica(db) and response_cache.changed_within(namespace, read_your_writes.READ_YOUR_WRITES_SECONDS))
+        cached = await response_cache.put(key, await fetch(), store=store)
+    return response_cache.respond(cached, request.headers.get("if-none-match"))
+
+def list_response_body(message: str, data: List[dict], result: dict) -> bytes:
+    """
+    KPAListResponse as JSON, encoded by orjson straight from the projected rows.
+    Skips Pydantic revalidation and jsonable_encoder; JSON documents pass through as loaded.
+    """
+    return orjson.dumps({
+        "success": True,
+        "message": message,
+        "data": data,
+        "nextCursor": result["next_cursor"],
+        "total": result["total"]
+    })
+
+SELECT_DESCRIPTION = "Comma-separated fields to return, e.g. formNumber,status,submittedDate (default: every field)"
+
+def select_param(select: Optional[str], available: dict):
+    """Parse the `select` sparse fieldset of the KPA list endpoints, 400 for unknown fields"""
+    names = [name.strip() for name in select.split(",") if name.strip()] if select else None
+    try:
+        return crud.pick_fields(available, names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+INCLUDE_TOTAL_DESCRIPTION = "Return the total row count: true (exact, from counters) or estimate (planner statistics when unfiltered)"
+
+def total_mode(include_total: Optional[str]):
+    """Map the includeTotal query parameter onto crud's include_total"""
+    return {"true": "exact", "estimate": "estimate"}.get(include_total)
+
 @app.post("/api/forms/wheel-specifications", response_model=schemas.KPASuccessResponse, status_code=201, tags=["KPA Forms"])
-def submit_wheel_specification(
+async def submit_wheel_specification(
+    request: Request,
     wheel_spec: schemas.WheelSpecificationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_write_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Retries with the same key replay the original response"),
+    prefer: Optional[str] = Header(None, alias="Prefer", description="respond-async: queue the form and answer 202 (see INGEST_MODE)")
 ):
     """
     Submit wheel specification form - matches exact Postman collection structure.
     POST /api/forms/wheel-specifications
     """
+    idempotency.validate_key(idempotency_key)
+    fingerprint = idempotency.request_hash("/api/forms/wheel-specifications", wheel_spec.model_dump())
+    stored_response = await idempotency.replay(db, idempotency_key, fingerprint)
+    if stored_response is not None:
+        return stored_response
+    if ingest.enabled_for(prefer):
+        # Write-behind: 202 now, the flusher commits it with the rest of its batch
+        return await ingest.submit(
+            request, counters.WHEEL_SPECIFICATION, wheel_spec,
+            {"formNumber": wheel_spec.formNumber, "submittedBy": wheel_spec.submittedBy, "submittedDate": wheel_spec.submittedDate},
+            idempotency_key, fingerprint
+        )
     try:
-        # Check if form number already exists
-        existing_form = crud.get_wheel_specification_by_form_number(db, wheel_spec.formNumber)
-        if existing_form:
+        # Single INSERT ... ON CONFLICT round trip, None if the form number already exists
+        db_wheel_spec = await async_crud.create_wheel_specification(db=db, wheel_spec=wheel_spec, commit=False)
+        if db_wheel_spec is None:
+            await db.rollback()
+            # A concurrent retry with the same key may have just committed the original
+            stored_response = await idempotency.replay(db, idempotency_key, fingerprint)
+            if stored_response is not None:
+                return stored_response
             raise HTTPException(status_code=400, detail=f"Form number {wheel_spec.formNumber} already exists")
         
-        # Create the wheel specification
-        db_wheel_spec = crud.create_wheel_specification(db=db, wheel_spec=wheel_spec)
-        
         # Return response matching Postman collection format
-        return schemas.KPASuccessResponse(
+        response = schemas.KPASuccessResponse(
             success=True,
             message="Wheel specification submitted successfully.",
             data={
                 "formNumber": db_wheel_spec.form_number,
                 "submittedBy": db_wheel_spec.submitted_by,
-                "submittedDate": db_wheel_spec.submitted_date,
+                "submittedDate": db_wheel_spec.submitted_date.isoformat(),
                 "status": db_wheel_spec.status
             }
         )
+        await idempotency.remember(db, idempotency_key, fingerprint, 201, response.model_dump())
+        await db.commit()
+        return response
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error creating wheel specification: {str(e)}")  # For debugging
+        logger.exception("Error creating wheel specification %s", wheel_spec.formNumber)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/api/forms/bogie-checksheet", response_model=schemas.KPASuccessResponse, status_code=201, tags=["KPA Forms"])
-def submit_bogie_checksheet(
+async def submit_bogie_checksheet(
+    request: Request,
     bogie_checksheet: schemas.BogieChecksheetCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_write_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Retries with the same key replay the original response"),
+    prefer: Optional[str] = Header(None, alias="Prefer", description="respond-async: queue the form and answer 202 (see INGEST_MODE)")
 ):
     """
     Submit bogie checksheet form - matches exact Postman collection structure.
     POST /api/forms/bogie-checksheet
     """
+    idempotency.validate_key(idempotency_key)
+    fingerprint = idempotency.request_hash("/api/forms/bogie-checksheet", bogie_checksheet.model_dump())
+    stored_response = await idempotency.replay(db, idempotency_key, fingerprint)
+    if stored_response is not None:
+        return stored_response
+    if ingest.enabled_for(prefer):
+        # Write-behind: 202 now, the flusher commits it with the rest of its batch
+        return await ingest.submit(
+            request, counters.BOGIE_CHECKSHEET, bogie_checksheet,
+            {"formNumber": bogie_checksheet.formNumber, "inspectionBy": bogie_checksheet.inspectionBy, "inspectionDate": bogie_checksheet.inspectionDate},
+            idempotency_key, fingerprint
+        )
     try:
-        # Check if form number already exists
-        existing_form = crud.get_bogie_checksheet_by_form_number(db, bogie_checksheet.formNumber)
-        if existing_form:
+        # Single INSERT ... ON CONFLICT round trip, None if the form number already exists
+        db_bogie_checksheet = await async_crud.create_bogie_checksheet(db=db, bogie_checksheet=bogie_checksheet, commit=False)
+        if db_bogie_checksheet is None:
+            await db.rollback()
+            # A concurrent retry with the same key may have just committed the original
+            stored_response = await idempotency.replay(db, idempotency_key, fingerprint)
+            if stored_response is not None:
+                return stored_response
             raise HTTPException(status_code=400, detail=f"Form number {bogie_checksheet.formNumber} already exists")
         
-        # Create the bogie checksheet
-        db_bogie_checksheet = crud.create_bogie_checksheet(db=db, bogie_checksheet=bogie_checksheet)
-        
         # Return response matching Postman collection format
-        return schemas.KPASuccessResponse(
+        response = schemas.KPASuccessResponse(
             success=True,
             message="Bogie checksheet submitted successfully.",
             data={
                 "formNumber": db_bogie_checksheet.form_number,
                 "inspectionBy": db_bogie_checksheet.inspection_by,
-                "inspectionDate": db_bogie_checksheet.inspection_date,
+                "inspectionDate": db_bogie_checksheet.inspection_date.isoformat(),
                 "status": db_bogie_checksheet.status
             }
         )
+        await idempotency.remember(db, idempotency_key, fingerprint, 201, response.model_dump())
+        await db.commit()
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error submitting bogie checksheet: {str(e)}")
 
+def batch_response(results, form_label: str):
+    """Summarize per-item batch results in the standard KPA response format"""
+    counts = {
+        outcome: sum(1 for result in results if result["status"] == outcome)
+        for outcome in ("created", "duplicate", "invalid")
+    }
+    return schemas.KPASuccessResponse(
+        success=True,
+        message=f"{counts['created']} of {len(results)} {form_label} submitted successfully.",
+        data={**counts, "results": results}
+    )
+
+@app.get("/api/forms/submissions/{tracking_id}", response_model=schemas.KPASuccessResponse, tags=["KPA Forms"])
+def get_submission_status(tracking_id: str):
+    """
+    Status of a submission accepted with 202: queued, committed (durable), duplicate or failed.
+    Tracking ids are kept by the process that accepted them, for the last INGEST_STATUS_SIZE submissions.
+    GET /api/forms/submissions/{tracking_id}
+    """
+    submission = ingest.status(tracking_id)
+    if submission is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return schemas.KPASuccessResponse(
+        success=True,
+        message=f"Submission is {submission['status']}.",
+        data=submission
+    )
+
+@app.post("/api/forms/wheel-specifications:batch", response_model=schemas.KPASuccessResponse, tags=["KPA Forms"])
+async def submit_wheel_specifications_batch(
+    batch: schemas.KPABatchRequest,
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    """
+    Submit a whole shift of wheel specification forms in one request and one transaction.
+    Each item is reported as created, duplicate (form number already exists) or invalid.
+    POST /api/forms/wheel-specifications:batch
+    """
+    if len(batch.forms) > crud.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {crud.MAX_BATCH_SIZE} forms")
+    try:
+        results = await async_crud.create_wheel_specifications_batch(db=db, items=batch.forms)
+        return batch_response(results, "wheel specifications")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting wheel specification batch: {str(e)}")
+
+@app.post("/api/forms/bogie-checksheet:batch", response_model=schemas.KPASuccessResponse, tags=["KPA Forms"])
+async def submit_bogie_checksheets_batch(
+    batch: schemas.KPABatchRequest,
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    """
+    Submit a whole shift of bogie checksheet forms in one request and one transaction.
+    Each item is reported as created, duplicate (form number already exists) or invalid.
+    POST /api/forms/bogie-checksheet:batch
+    """
+    if len(batch.forms) > crud.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {crud.MAX_BATCH_SIZE} forms")
+    try:
+        results = await async_crud.create_bogie_checksheets_batch(db=db, items=batch.forms)
+        return batch_response(results, "bogie checksheets")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting bogie checksheet batch: {str(e)}")
+
 @app.get("/api/forms/wheel-specifications", response_model=schemas.KPAListResponse, tags=["KPA Forms"])
-def get_wheel_specifications(
+async def get_wheel_specifications(
+    request: Request,
     formNumber: Optional[str] = Query(None, description="Filter by form number"),
     submittedBy: Optional[str] = Query(None, description="Filter by submitted by"),
-    submittedDate: Optional[str] = Query(None, description="Filter by submitted date (YYYY-MM-DD)"),
-    skip: int = Query(0, description="Number of records to skip"),
-    limit: int = Query(10, description="Maximum number of records to return"),
-    db: Session = Depends(get_db)
+    submittedDate: Optional[date] = Query(None, description="Filter by submitted date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Only forms submitted on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Only forms submitted on or before this date (YYYY-MM-DD)"),
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: int = Query(10, ge=1, le=admission.MAX_LIST_LIMIT, description="Maximum number of records to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's nextCursor (takes precedence over skip)"),
+    includeTotal: Optional[str] = Query(None, pattern="^(true|false|estimate)$", description=INCLUDE_TOTAL_DESCRIPTION),
+    select: Optional[str] = Query(None, description=SELECT_DESCRIPTION),
+    q: Optional[str] = Query(None, max_length=search.MAX_QUERY_LENGTH, description=SEARCH_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get wheel specification forms with filtering - matches Postman collection GET endpoint.
-    GET /api/forms/wheel-specifications?formNumber=...&submittedBy=...&submittedDate=...
+    GET /api/forms/wheel-specifications?formNumber=...&submittedBy=...&submittedDate=...&fromDate=...&toDate=...
+    Measurements filter as fields.<name>=<value>, e.g. ?fields.wheelGauge=1600 (exact match).
+    ?select=formNumber,status,submittedDate returns (and reads) only those fields.
+    ?q=WHEEL-2025- or ?q=inspecter_12 searches form numbers by prefix and inspector names by similarity.
     """
-    try:
-        result = crud.get_wheel_specifications(
-            db=db,
-            form_number=formNumber,
-            submitted_by=submittedBy,
-            submitted_date=submittedDate,
-            skip=skip,
-            limit=limit
-        )
+    q = search_param(q, skip)
+    after = decode_cursor_param(cursor, q)
+    field_filters = field_filters_param(request, document_filters.WHEEL_SPECIFICATION_DOCUMENTS)
+    select_fields = select_param(select, crud.WHEEL_SPECIFICATION_FIELDS)
+
+    async def fetch():
+        try:
+            result = await async_crud.get_wheel_specifications(
+                db=db,
+                form_number=formNumber,
+                submitted_by=submittedBy,
+                submitted_date=submittedDate,
+                from_date=fromDate,
+                to_date=toDate,
+                skip=skip,
+                limit=limit,
+                after=after,
+                include_total=total_mode(includeTotal),
+                field_filters=field_filters,
+                select_fields=select_fields,
+                q=q
+            )
         
-        # Format response to match Postman collection
-        data = []
-        for item in result["items"]:
-            data.append({
-                "formNumber": item.form_number,
-                "submittedBy": item.submitted_by,
-                "submittedDate": item.submitted_date,
-                "status": item.status,
-                "fields": item.fields
-            })
+            # Format response to match Postman collection
+            data = crud.list_items(result["items"], select_fields)
         
-        message = "Filtered wheel specification forms fetched successfully." if any([formNumber, submittedBy, submittedDate]) else "All wheel specification forms fetched successfully."
+            message = "Filtered wheel specification forms fetched successfully." if any([formNumber, submittedBy, submittedDate, fromDate, toDate, field_filters, q]) else "All wheel specification forms fetched successfully."
         
-        return schemas.KPAListResponse(
-            success=True,
-            message=message,
-            data=data
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching wheel specifications: {str(e)}")
+            return list_response_body(message, data, result)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching wheel specifications: {str(e)}")
+
+    return await cached_list(request, counters.WHEEL_SPECIFICATION, fetch, db)
 
 @app.get("/api/forms/bogie-checksheet", response_model=schemas.KPAListResponse, tags=["KPA Forms"])
-def get_bogie_checksheets(
+async def get_bogie_checksheets(
+    request: Request,
     formNumber: Optional[str] = Query(None, description="Filter by form number"),
     inspectionBy: Optional[str] = Query(None, description="Filter by inspection by"),
-    inspectionDate: Optional[str] = Query(None, description="Filter by inspection date (YYYY-MM-DD)"),
-    skip: int = Query(0, description="Number of records to skip"),
-    limit: int = Query(10, description="Maximum number of records to return"),
-    db: Session = Depends(get_db)
+    inspectionDate: Optional[date] = Query(None, description="Filter by inspection date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Only forms inspected on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Only forms inspected on or before this date (YYYY-MM-DD)"),
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    limit: int = Query(10, ge=1, le=admission.MAX_LIST_LIMIT, description="Maximum number of records to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's nextCursor (takes precedence over skip)"),
+    includeTotal: Optional[str] = Query(None, pattern="^(true|false|estimate)$", description=INCLUDE_TOTAL_DESCRIPTION),
+    select: Optional[str] = Query(None, description=SELECT_DESCRIPTION),
+    q: Optional[str] = Query(None, max_length=search.MAX_QUERY_LENGTH, description=SEARCH_DESCRIPTION),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get bogie checksheet forms with filtering.
-    GET /api/forms/bogie-checksheet?formNumber=...&inspectionBy=...&inspectionDate=...
+    GET /api/forms/bogie-checksheet?formNumber=...&inspectionBy=...&inspectionDate=...&fromDate=...&toDate=...
+    Sections filter as bogieDetails.<name>, bogieChecksheet.<name> or bmbcChecksheet.<name>=<value> (exact match).
+    ?select=formNumber,status,inspectionDate returns (and reads) only those fields.
+    ?q=BOGIE-2025- or ?q=inspecter_12 searches form numbers by prefix and inspector names by similarity.
     """
-    try:
-        result = crud.get_bogie_checksheets(
-            db=db,
-            form_number=formNumber,
-            inspection_by=inspectionBy,
-            inspection_date=inspectionDate,
-            skip=skip,
-            limit=limit
-        )
+    q = search_param(q, skip)
+    after = decode_cursor_param(cursor, q)
+    field_filters = field_filters_param(request, document_filters.BOGIE_CHECKSHEET_DOCUMENTS)
+    select_fields = select_param(select, crud.BOGIE_CHECKSHEET_FIELDS)
+
+    async def fetch():
+        try:
+            result = await async_crud.get_bogie_checksheets(
+                db=db,
+                form_number=formNumber,
+                inspection_by=inspectionBy,
+                inspection_date=inspectionDate,
+                from_date=fromDate,
+                to_date=toDate,
+                skip=skip,
+                limit=limit,
+                after=after,
+                include_total=total_mode(includeTotal),
+                field_filters=field_filters,
+                select_fields=select_fields,
+                q=q
+            )
         
-        # Format response to match expected structure
-        data = []
-        for item in result["items"]:
-            data.append({
-                "formNumber": item.form_number,
-                "inspectionBy": item.inspection_by,
-                "inspectionDate": item.inspection_date,
-                "status": item.status,
-                "bogieDetails": item.bogie_details,
-                "bogieChecksheet": item.bogie_checksheet,
-                "bmbcChecksheet": item.bmbc_checksheet
-            })
+            # Format response to match expected structure
+            data = crud.list_items(result["items"], select_fields)
         
-        message = "Filtered bogie checksheet forms fetched successfully." if any([formNumber, inspectionBy, inspectionDate]) else "All bogie checksheet forms fetched successfully."
+            message = "Filtered bogie checksheet forms fetched successfully." if any([formNumber, inspectionBy, inspectionDate, fromDate, toDate, field_filters, q]) else "All bogie checksheet forms fetched successfully."
         
-        return schemas.KPAListResponse(
-            success=True,
-            message=message,
-            data=data
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching bogie checksheets: {str(e)}")
+            return list_response_body(message, data, result)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching bogie checksheets: {str(e)}")
+
+    return await cached_list(request, counters.BOGIE_CHECKSHEET, fetch, db)
+
+EXPORT_FORMAT_DESCRIPTION = "ndjson (one JSON object per line) or csv (documents flattened to one column per field)"
+
+@app.get("/api/forms/wheel-specifications/export", tags=["KPA Forms"])
+async def export_wheel_specifications(
+    request: Request,
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description=EXPORT_FORMAT_DESCRIPTION),
+    formNumber: Optional[str] = Query(None, description="Filter by form number"),
+    submittedBy: Optional[str] = Query(None, description="Filter by submitted by"),
+    submittedDate: Optional[date] = Query(None, description="Filter by submitted date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Only forms submitted on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Only forms submitted on or before this date (YYYY-MM-DD)"),
+    select: Optional[str] = Query(None, description=SELECT_DESCRIPTION)
+):
+    """
+    Stream every wheel specification matching the list endpoint's filters.
+    GET /api/forms/wheel-specifications/export?format=ndjson|csv&submittedBy=...&fromDate=...
+    """
+    field_filters = field_filters_param(request, document_filters.WHEEL_SPECIFICATION_DOCUMENTS)
+    select_fields = select_param(select, crud.WHEEL_SPECIFICATION_FIELDS)
+
+    primary = reads_primary(read_your_writes.client_key(request))
+
+    async def batches():
+        # Own session: the server-side cursor has to stay open until the last chunk is sent
+        async with async_read_session(primary=primary) as db:
+            async for rows in async_crud.stream_wheel_specifications(
+                db, list(select_fields.values()),
+                form_number=formNumber, submitted_by=submittedBy, submitted_date=submittedDate,
+                from_date=fromDate, to_date=toDate, field_filters=field_filters,
+                batch_size=export.EXPORT_BATCH_SIZE
+            ):
+                yield rows
+
+    return export.streaming_response(batches(), select_fields, export_format, "wheel-specifications")
+
+@app.get("/api/forms/bogie-checksheet/export", tags=["KPA Forms"])
+async def export_bogie_checksheets(
+    request: Request,
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description=EXPORT_FORMAT_DESCRIPTION),
+    formNumber: Optional[str] = Query(None, description="Filter by form number"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by inspection by"),
+    inspectionDate: Optional[date] = Query(None, description="Filter by inspection date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Only forms inspected on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Only forms inspected on or before this date (YYYY-MM-DD)"),
+    select: Optional[str] = Query(None, description=SELECT_DESCRIPTION)
+):
+    """
+    Stream every bogie checksheet matching the list endpoint's filters.
+    GET /api/forms/bogie-checksheet/export?format=ndjson|csv&inspectionBy=...&fromDate=...
+    """
+    field_filters = field_filters_param(request, document_filters.BOGIE_CHECKSHEET_DOCUMENTS)
+    select_fields = select_param(select, crud.BOGIE_CHECKSHEET_FIELDS)
+
+    primary = reads_primary(read_your_writes.client_key(request))
+
+    async def batches():
+        # Own session: the server-side cursor has to stay open until the last chunk is sent
+        async with async_read_session(primary=primary) as db:
+            async for rows in async_crud.stream_bogie_checksheets(
+                db, list(select_fields.values()),
+                form_number=formNumber, inspection_by=inspectionBy, inspection_date=inspectionDate,
+                from_date=fromDate, to_date=toDate, field_filters=field_filters,
+                batch_size=export.EXPORT_BATCH_SIZE
+            ):
+                yield rows
+
+    return export.streaming_response(batches(), select_fields, export_format, "bogie-checksheet")
+
+@app.get("/api/forms/stats", response_model=schemas.KPASuccessResponse, tags=["KPA Forms"])
+async def get_form_stats(
+    request: Request,
+    formType: str = Query(counters.WHEEL_SPECIFICATION, pattern="^(wheel_specification|bogie_checksheet)$"),
+    fromDate: Optional[date] = Query(None, description="Only forms dated on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Only forms dated on or before this date (YYYY-MM-DD)"),
+    inspector: Optional[str] = Query(None, description="Count only this inspector's forms (distributions cover everyone)"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Inspection statistics from the form_stats summary table: forms per inspector, per day and per status,
+    plus wheel measurement distributions against their limits or bogie check results.
+    GET /api/forms/stats?formType=wheel_specification&fromDate=...&toDate=...
+    """
+    async def fetch():
+        summary = await stats.summary(db, formType, from_date=fromDate, to_date=toDate, inspector=inspector)
+        return orjson.dumps({
+            "success": True,
+            "message": "Form statistics fetched successfully.",
+            "data": {"formType": formType, **summary}
+        })
+
+    # Every new form of the type bumps its cache version, so cached statistics are never stale
+    return await cached_list(request, formType, fetch, db)
+
+SINCE_DESCRIPTION = "Watermark from the previous sync; omit it for a full download"
+
+async def changes_response(
+    request: Request, db: AsyncSession, model, form_type: str, fields: dict, label: str, since: Optional[str], limit: int
+):
+    """One page of an incremental sync feed, gzip/brotli compressed when large; 400 for a bad watermark, 410 for an expired one"""
+    try:
+        position = sync.decode_watermark(since) if since else None
+    except sync.WatermarkExpired as e:
+        raise HTTPException(status_code=410, detail=f"{e}; download the full list again (omit since)")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+    # A replica may be up to READ_YOUR_WRITES_SECONDS behind, so its feed stops that much earlier
+    lag_seconds = read_your_writes.READ_YOUR_WRITES_SECONDS if is_replica(db) else 0.0
+    result = await sync.changes(db, model, form_type, {**fields, "updatedAt": model.updated_at}, position, limit, lag_seconds)
+    body = orjson.dumps({
+        "success": True,
+        "message": f"{len(result['items'])} changed and {len(result['deleted'])} deleted {label} fetched successfully.",
+        "data": result["items"],
+        "deleted": result["deleted"],
+        "watermark": result["watermark"],
+        "hasMore": result["has_more"]
+    })
+    return await sync.respond(body, request.headers.get("accept-encoding"))
+
+@app.get("/api/forms/wheel-specifications/changes", tags=["KPA Forms"])
+async def wheel_specification_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION),
+    limit: int = Query(1000, ge=1, le=sync.MAX_SYNC_LIMIT),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Wheel specifications created or changed after the watermark, plus the form numbers deleted since.
+    Store the returned watermark and send it as `since` next time; while hasMore is true, call again at once.
+    GET /api/forms/wheel-specifications/changes?since=...
+    """
+    return await changes_response(
+        request, db, models.WheelSpecification, counters.WHEEL_SPECIFICATION, crud.WHEEL_SPECIFICATION_FIELDS,
+        "wheel specifications", since, limit
+    )
+
+@app.get("/api/forms/bogie-checksheet/changes", tags=["KPA Forms"])
+async def bogie_checksheet_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description=SINCE_DESCRIPTION),
+    limit: int = Query(1000, ge=1, le=sync.MAX_SYNC_LIMIT),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Bogie checksheets created or changed after the watermark, plus the form numbers deleted since.
+    Store the returned watermark and send it as `since` next time; while hasMore is true, call again at once.
+    GET /api/forms/bogie-checksheet/changes?since=...
+    """
+    return await changes_response(
+        request, db, models.BogieChecksheet, counters.BOGIE_CHECKSHEET, crud.BOGIE_CHECKSHEET_FIELDS,
+        "bogie checksheets", since, limit
+    )
 
 # ================================
 # FORM DATA MANIPULATION API (Additional CRUD endpoints)
 # ================================
 
 @app.post("/v1/form-data", response_model=schemas.Form, status_code=201, tags=["Form Data"])
-def create_form(
+async def create_form(
     form: schemas.FormCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_user_write_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Creates a new form submission entry in the database.
     Requires authentication.
     """
-    return crud.create_form_submission(db=db, form=form, user_id=current_user.id)
+    return await async_crud.create_form_submission(db=db, form=form, user_id=current_user.id)
 
 @app.get("/v1/form-data", response_model=schemas.FormList, tags=["Form Data"])
-def get_all_forms(
-    skip: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_all_forms(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=admission.MAX_LIST_LIMIT),
+    includeTotal: Optional[str] = Query(None, pattern="^(true|false|estimate)$", description=INCLUDE_TOTAL_DESCRIPTION),
+    db: AsyncSession = Depends(get_user_read_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Retrieves all form submissions with pagination.
     Requires authentication.
     """
-    result = crud.get_form_submissions(db, skip=skip, limit=limit)
+    result = await async_crud.get_form_submissions(db, skip=skip, limit=limit, include_total=total_mode(includeTotal))
     return schemas.FormList(**result)
 
 @app.get("/v1/form-data/{form_data_id}", response_model=schemas.Form, tags=["Form Data"])
-def read_form(
+async def read_form(
     form_data_id: int, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_user_read_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Retrieves a specific form submission by its ID.
     Requires authentication.
     """
-    db_form = crud.get_form_submission(db, submission_id=form_data_id)
+    db_form = await async_crud.get_form_submission(db, submission_id=form_data_id)
     if db_form is None:
         raise HTTPException(status_code=404, detail="Form data not found")
     return db_form
 
 @app.put("/v1/form-data/{form_data_id}", response_model=schemas.Form, tags=["Form Data"])
-def update_form(
+async def update_form(
     form_data_id: int,
     form_update: schemas.FormUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_user_write_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Updates an existing form submission.
     Requires authentication.
     """
-    db_form = crud.update_form_submission(db, submission_id=form_data_id, form_update=form_update)
+    db_form = await async_crud.update_form_submission(db, submission_id=form_data_id, form_update=form_update)
     if db_form is None:
         raise HTTPException(status_code=404, detail="Form data not found")
     return db_form
 
 @app.delete("/v1/form-data/{form_data_id}", status_code=204, tags=["Form Data"])
-def delete_form(
+async def delete_form(
     form_data_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_user_write_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Deletes a form submission.
     Requires authentication.
     """
-    db_form = crud.delete_form_submission(db, submission_id=form_data_id)
+    db_form = await async_crud.delete_form_submission(db, submission_id=form_data_id)
     if db_form is None:
         raise HTTPException(status_code=404, detail="Form data not found")
     return {"message": "Form data deleted successfully"}
 
+# ================================
+# INTERNAL METRICS
+# ================================
+
+@app.get("/internal/principal-cache", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def principal_cache_stats():
+    """Hit rate and latency saved by the verified-principal cache behind get_current_user"""
+    return principal_cache.stats()
+
+@app.get("/internal/db-pool", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def db_pool_stats():
+    """Checked-out connections, overflow, checkout wait time and checkout timeouts of both connection pools"""
+    return pool_status()
+
+@app.get("/internal/response-cache", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def response_cache_stats():
+    """Hit rate, 304s and invalidations of the KPA list response cache"""
+    return response_cache.stats()
+
+@app.get("/internal/slow-queries", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def slow_query_log():
+    """Recent statements slower than SLOW_QUERY_MS, newest first, with route, redacted parameters and EXPLAIN plans"""
+    return query_log.stats()
+
+@app.get("/internal/ingest", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def ingest_stats():
+    """Queue depth, batches, group-commit size, rejections and failures of the write-behind ingestion queue"""
+    return ingest.stats()
+
+@app.get("/internal/admission", tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def admission_stats(client: Optional[str] = Query(None, description="Show one client's buckets, e.g. client:10.0.0.7 or user:42")):
+    """Rate limits, rejections, concurrency slots and the token buckets of the clients closest to their limit"""
+    return admission.stats(client)
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Internal"], dependencies=[Depends(require_internal_access)])
+def prometheus_metrics():
+    """Per-route latency, in-flight requests, status codes and SQL per request in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Root endpoint for health check
 @app.get("/", tags=["Health"])
 def read_root():
@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
 """
 Database setup script for KPA Form Data API
-This script creates the database tables and adds a default user for testing.
+This script applies the schema migrations (app/migrations.py), prunes expired sync and idempotency rows,
+and with --default-user adds the well-known test user. --migrate-only applies the migrations and nothing else.
 """
 
+import argparse
 import os
+import sys
+from datetime import date
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.models import Base, User
+from app.models import User
 from app.auth import get_password_hash
+from app import crud, idempotency, migrations, seed, stats, sync
 from dotenv import load_dotenv
 
-def setup_database():
-    """Setup database with tables and default user"""
+def setup_database(seed_config: seed.SeedConfig = None, rebuild_stats: bool = False, migrate_only: bool = False,
+                   default_user: bool = False):
+    """Migrate the database schema, plus synthetic data when seed_config is given and the test user with default_user"""
     
     # Load environment variables
     load_dotenv()
@@ -28,35 +34,47 @@ def setup_database():
         engine = create_engine(DATABASE_URL)
         SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         
-        # Create all tables
-        print("🔄 Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created successfully!")
+        # Apply pending schema migrations; the app itself only checks the version on start-up
+        print("🔄 Applying schema migrations...")
+        for version, description in migrations.migrate(engine):
+            print(f"   {version}: {description}")
+        print(f"✅ Database schema at version {migrations.LATEST_VERSION}!")
+        if migrate_only:
+            return True
         
-        # Create default user with credentials from assignment
-        db = SessionLocal()
-        try:
-            # Check if user already exists
-            existing_user = db.query(User).filter(User.phone_number == "7760873976").first()
-            if not existing_user:
-                default_user = User(
-                    phone_number="7760873976",
-                    hashed_password=get_password_hash("to_share@123"),
-                    is_active=True
-                )
-                db.add(default_user)
-                db.commit()
-                print("✅ Default user created successfully!")
-                print("   Phone: 7760873976")
-                print("   Password: to_share@123")
-            else:
-                print("ℹ️  Default user already exists")
-                
-        except Exception as e:
-            print(f"❌ Error creating default user: {e}")
-            db.rollback()
-        finally:
-            db.close()
+        # Deletes older than the sync history can no longer be asked for
+        with engine.begin() as conn:
+            pruned = sync.prune_tombstones(conn)
+        if pruned:
+            print(f"🧹 Pruned {pruned:,} sync tombstones older than {sync.SYNC_TOMBSTONE_DAYS} days")
+        
+        # Expired Idempotency-Key responses are never replayed
+        with engine.begin() as conn:
+            pruned = idempotency.prune_expired(conn)
+        if pruned:
+            print(f"🧹 Pruned {pruned:,} Idempotency-Key entries older than {idempotency.IDEMPOTENCY_KEY_TTL_HOURS} hours")
+        
+        if seed_config:
+            total = seed_config.wheel_specifications + seed_config.bogie_checksheets
+            print(f"🔄 Seeding {total:,} forms (seed {seed_config.seed})...")
+            timings = seed.seed(engine, seed_config)
+            print(f"✅ Seed data loaded in {sum(timings.values()):.1f}s!")
+            print(f"   Seeded users log in with password: {seed.SEED_PASSWORD}")
+        
+        if seed_config or rebuild_stats:
+            # The bulk load bypasses the row counters behind includeTotal=true and the form statistics
+            print("🔄 Rebuilding form counters and statistics...")
+            db = SessionLocal()
+            try:
+                crud.rebuild_counters(db)
+            finally:
+                db.close()
+            with engine.begin() as conn:
+                stats.rebuild(conn)
+            print("✅ Form counters and statistics rebuilt!")
+        
+        if default_user:
+            create_default_user(SessionLocal)
             
         print("\n🎉 Database setup completed!")
         print("🚀 You can now start the API server with: uvicorn main:app --reload")
@@ -67,5 +85,74 @@ def setup_database():
         print("Please check your DATABASE_URL in .env file")
         return False
 
+def create_default_user(SessionLocal):
+    """Add the test user with the assignment's credentials; its password is public, so never in production"""
+    db = SessionLocal()
+    try:
+        # Check if user already exists
+        existing_user = db.query(User).filter(User.phone_number == "7760873976").first()
+        if not existing_user:
+            default_user = User(
+                phone_number="7760873976",
+                hashed_password=get_password_hash("to_share@123"),
+                is_active=True
+            )
+            db.add(default_user)
+            db.commit()
+            print("✅ Default user created successfully!")
+            print("   Phone: 7760873976")
+            print("   Password: to_share@123")
+        else:
+            print("ℹ️  Default user already exists")
+            
+    except Exception as e:
+        print(f"❌ Error creating default user: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def parse_args():
+    defaults = seed.SeedConfig()
+    parser = argparse.ArgumentParser(description="Migrate the schema and optionally add the test user or synthetic data")
+    parser.add_argument("--migrate-only", action="store_true",
+                        help="Apply pending schema migrations and exit (what the Docker image runs on start)")
+    parser.add_argument("--default-user", action="store_true",
+                        help="Add the test user 7760873976 / to_share@123 (local development only)")
+    parser.add_argument("--seed", action="store_true", help="Bulk-load synthetic forms, submissions and users")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="Recompute form counters and statistics from the forms tables (e.g. nightly, after raw SQL changes)")
+    parser.add_argument("--random-seed", type=int, default=defaults.seed, help="Same value, same rows")
+    parser.add_argument("--wheel-specifications", type=int, default=defaults.wheel_specifications)
+    parser.add_argument("--bogie-checksheets", type=int, default=defaults.bogie_checksheets)
+    parser.add_argument("--form-submissions", type=int, default=defaults.form_submissions)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--inspectors", type=int, default=defaults.inspectors, help="Distinct submittedBy/inspectionBy values")
+    parser.add_argument("--inspector-skew", type=float, default=defaults.inspector_skew,
+                        help="Zipf exponent of forms per inspector (0 = uniform)")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=defaults.start_date)
+    parser.add_argument("--days", type=int, default=defaults.days, help="Form dates are spread over this many days")
+    parser.add_argument("--defect-rate", type=float, default=defaults.defect_rate,
+                        help="Share of checks not in good condition and of measurements out of range")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    setup_database() 
\ No newline at end of file
+    args = parse_args()
+    seed_config = None
+    if args.seed:
+        seed_config = seed.SeedConfig(
+            seed=args.random_seed,
+            wheel_specifications=args.wheel_specifications,
+            bogie_checksheets=args.bogie_checksheets,
+            form_submissions=args.form_submissions,
+            users=args.users,
+            inspectors=args.inspectors,
+            inspector_skew=args.inspector_skew,
+            start_date=args.start_date,
+            days=args.days,
+            defect_rate=args.defect_rate,
+        )
+    if args.migrate_only and (seed_config or args.rebuild_stats or args.default_user):
+        sys.exit("--migrate-only cannot be combined with --seed, --rebuild-stats or --default-user")
+    ok = setup_database(seed_config, rebuild_stats=args.rebuild_stats, migrate_only=args.migrate_only,
+                        default_user=args.default_user)
+    sys.exit(0 if ok else 1) 
\ No newline at end of file
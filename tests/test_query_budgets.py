@@ -0,0 +1,15 @@
+# Runs benchmarks/query_budgets.py under pytest, so a route that goes over its SQL statement
+# budget (an N+1 regression) fails the test suite. Uses a fresh SQLite database, or
+# TEST_DATABASE_URL when set.
+
+import asyncio
+import os
+
+from benchmarks import query_budgets
+from benchmarks.common import configure_database
+
+def test_routes_stay_within_query_budgets(tmp_path):
+    # Must run before main and the app modules are imported: they read DATABASE_URL at import
+    configure_database(os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'budgets.db'}")
+    failures = asyncio.run(query_budgets.check_budgets())
+    assert not failures, "\n\n".join(failures)